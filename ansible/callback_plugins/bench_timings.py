@@ -0,0 +1,67 @@
+"""
+Per-host timings for scripts/bench_frameworks.py.
+
+Appends one JSON line per host to the file in BENCH_TIMINGS_PATH, in the format of app.benchmark.DeviceTiming.
+The duration of a host is the sum of its own task durations, from each task start to its result. Time the host
+spends waiting for other hosts between tasks, as under the linear strategy, is not counted.
+Persistent network_cli connections are set up inside the first task, so connect and command times are not split.
+"""
+import json
+import os
+import time
+
+from ansible.plugins.callback import CallbackBase
+
+
+class CallbackModule(CallbackBase):
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = "aggregate"
+    CALLBACK_NAME = "bench_timings"
+    CALLBACK_NEEDS_ENABLED = True
+    CALLBACK_NEEDS_WHITELIST = True
+
+    def __init__(self):
+        super().__init__()
+        self.task_to_start = {}
+        self.host_to_duration = {}
+        self.failed_hosts = set()
+
+    def v2_runner_on_start(self, host, task):
+        host_name = host.get_name()
+        self.task_to_start[(host_name, task._uuid)] = time.monotonic()
+        self.host_to_duration.setdefault(host_name, 0.0)
+
+    def _on_end(self, result, ok):
+        host_name = result._host.get_name()
+        start = self.task_to_start.pop((host_name, result._task._uuid), None)
+        if start is not None:
+            self.host_to_duration[host_name] = self.host_to_duration.get(host_name, 0.0) + time.monotonic() - start
+        if not ok:
+            self.failed_hosts.add(host_name)
+
+    def v2_runner_on_ok(self, result):
+        self._on_end(result, ok=True)
+
+    def v2_runner_on_skipped(self, result):
+        self._on_end(result, ok=True)
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self._on_end(result, ok=ignore_errors)
+
+    def v2_runner_on_unreachable(self, result):
+        self._on_end(result, ok=False)
+
+    def v2_playbook_on_stats(self, stats):
+        path = os.getenv("BENCH_TIMINGS_PATH")
+        if not path:
+            return
+        with open(path, "a") as f:
+            for host_name, duration in self.host_to_duration.items():
+                timing = {
+                    "device": host_name,
+                    "duration": duration,
+                    "connect_duration": None,
+                    "command_duration": None,
+                    "ok": host_name not in self.failed_hosts,
+                }
+                f.write(json.dumps(timing) + "\n")
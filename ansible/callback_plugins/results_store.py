@@ -0,0 +1,77 @@
+"""
+Writes the output of ios_command tasks to a new run of the results store, like scripts/gather_commands_asyncio.py.
+
+ios_command runs all its commands in one module call, so each command is credited an equal share of the task duration.
+Enabled in ansible.cfg, the stored run can be exported with scripts/export_results.py.
+"""
+import sys
+import time
+from pathlib import Path
+
+from ansible.plugins.callback import CallbackBase
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app.collector import CommandResult, DeviceResult
+from app.results_store import RunBatchWriter
+
+COMMAND_ACTIONS = {"ios_command", "cisco.ios.ios_command"}
+
+
+class CallbackModule(CallbackBase):
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = "aggregate"
+    CALLBACK_NAME = "results_store"
+    CALLBACK_NEEDS_ENABLED = True
+    CALLBACK_NEEDS_WHITELIST = True
+
+    def __init__(self):
+        super().__init__()
+        # Created on the first command result, so playbooks without ios_command tasks add no empty runs
+        self.writer = None
+        self.task_to_start = {}
+
+    def v2_runner_on_start(self, host, task):
+        if task.action in COMMAND_ACTIONS:
+            self.task_to_start[(host.get_name(), task._uuid)] = time.monotonic()
+
+    def _record(self, result, error=None):
+        task = result._task
+        if task.action not in COMMAND_ACTIONS:
+            return
+        host_name = result._host.get_name()
+        start = self.task_to_start.pop((host_name, task._uuid), None)
+        duration = time.monotonic() - start if start is not None else 0.0
+        module_args = result._result.get("invocation", {}).get("module_args") or task.args
+        commands = [command["command"] if isinstance(command, dict) else command for command in module_args.get("commands") or []]
+        outputs = result._result.get("stdout") or []
+        command_duration = duration / len(commands) if commands else 0.0
+        results = []
+        for num, command in enumerate(commands):
+            if error is None and num < len(outputs):
+                results.append(CommandResult(command=command, output=outputs[num], duration=command_duration))
+            else:
+                results.append(CommandResult(command=command, duration=command_duration, error=error or "no output"))
+        if self.writer is None:
+            self.writer = RunBatchWriter()
+        self.writer.write(DeviceResult(
+            name=host_name,
+            host=result._host.vars.get("ansible_host", host_name),
+            results=results,
+            num_attempts=1,
+            duration=duration
+        ))
+
+    def v2_runner_on_ok(self, result):
+        self._record(result)
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self._record(result, error=result._result.get("msg") or "failed")
+
+    def v2_runner_on_unreachable(self, result):
+        self._record(result, error=result._result.get("msg") or "unreachable")
+
+    def v2_playbook_on_stats(self, stats):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+"""
+Ansible dynamic inventory built from Lab.create().
+
+Prints the all -> CORE -> Switch -> host hierarchy with every host's variables under _meta.hostvars.
+The output is cached and reused while the app sources and the LAB_* variables it depends on are unchanged,
+in which case the lab model is not imported at all.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from app.constants import ANSIBLE_INVENTORY_CACHE_PATH
+
+
+def cache_key() -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for env_var in ("LAB_RANDOM_DATA", "LAB_NUM_DEVICES", "LAB_FAKE_FLEET"):
+        digest.update(f"{env_var}={os.getenv(env_var, '')}:".encode())
+    for path in sorted((ROOT_DIR / "app").glob("*.py")):
+        stat = path.stat()
+        digest.update(f"{path.name}:{stat.st_mtime_ns}:{stat.st_size}".encode())
+    return digest.hexdigest()
+
+
+def build_inventory() -> str:
+    from app.lab import Lab
+    from app import utils
+
+    lab = Lab.create()
+    inventory = lab.create_ansible_inventory(random_data=utils.is_env_var("LAB_RANDOM_DATA"))
+    return json.dumps(inventory.dump_dynamic())
+
+
+def load_inventory() -> str:
+    cache_path = ROOT_DIR / ANSIBLE_INVENTORY_CACHE_PATH
+    key = cache_key()
+    try:
+        with open(cache_path) as f:
+            if f.readline().rstrip("\n") == key:
+                return f.read()
+    except OSError:
+        pass
+    inventory = build_inventory()
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_name(cache_path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        f.write(f"{key}\n{inventory}")
+    os.replace(tmp_path, cache_path)
+    return inventory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--list", action="store_true")
+    group.add_argument("--host")
+    args = parser.parse_args()
+
+    if args.host:
+        # Host variables are all returned by --list in _meta
+        print("{}")
+    else:
+        sys.stdout.write(load_inventory())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+import logging
+from abc import ABC, abstractmethod
+from ipaddress import IPv4Address, IPv4Interface, IPv4Network, ip_network
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from app.constants import MGMT_SUPERNET, MGMT_GROUP_PREFIXLEN, NUM_DEVICES_PER_SWITCH
+
+logger = logging.getLogger(__name__)
+
+Address = Union[str, int, IPv4Address, IPv4Interface]
+
+
+def address_to_int(address: Address) -> int:
+    if isinstance(address, int):
+        return address
+    if isinstance(address, IPv4Interface):
+        return int(address.ip)
+    if isinstance(address, str):
+        address = address.split("/")[0]
+    return int(IPv4Address(address))
+
+
+class AddressPool:
+    """Free host offsets of one subnet, kept as a bitmap where set bits are taken."""
+    def __init__(self, network: IPv4Network, reserve_gateway: bool = True) -> None:
+        self.network = network
+        self.network_int = int(network.network_address)
+        self.size = network.num_addresses
+        self._taken = 0
+        if network.prefixlen < 31:
+            self._taken |= 1 | 1 << (self.size - 1)
+            if reserve_gateway:
+                # Last usable address, the one Device.default_gw_ip points at
+                self._taken |= 1 << (self.size - 2)
+        self._full = (1 << self.size) - 1
+
+    @property
+    def num_free(self) -> int:
+        return self.size - bin(self._taken).count("1")
+
+    def is_free(self, offset: int) -> bool:
+        return 0 <= offset < self.size and not self._taken >> offset & 1
+
+    def take(self, preferred_offset: Optional[int] = None) -> int:
+        """Take `preferred_offset` if it is free, otherwise the lowest free offset, and return the address."""
+        if preferred_offset is not None and self.is_free(preferred_offset):
+            offset = preferred_offset
+        else:
+            if self._taken == self._full:
+                raise ValueError(f"No free addresses left in {self.network}")
+            # Lowest clear bit
+            offset = ((self._taken + 1) & ~self._taken).bit_length() - 1
+        self._taken |= 1 << offset
+        return self.network_int + offset
+
+    def release(self, address: int) -> None:
+        self._taken &= ~(1 << (address - self.network_int))
+
+
+class AddressAllocator(ABC):
+    """Assigns management addresses to device numbers and answers lookups in both directions."""
+    @abstractmethod
+    def allocate(self, num: int) -> IPv4Interface:
+        ...
+
+    @abstractmethod
+    def release(self, num: int) -> None:
+        ...
+
+    @abstractmethod
+    def address_of(self, num: int) -> Optional[IPv4Interface]:
+        ...
+
+    @abstractmethod
+    def device_at(self, address: Address) -> Optional[int]:
+        ...
+
+    @abstractmethod
+    def devices_in(self, subnet: Union[str, IPv4Network]) -> List[int]:
+        ...
+
+
+class GroupAddressAllocator(AddressAllocator):
+    """
+    One subnet per switch group, carved from `supernet` in group order.
+
+    Every group gets a /`prefixlen` unless `group_prefixlens` overrides it. Carving starts `first_subnet_num`
+    default-sized subnets into the supernet, and a device takes the host offset equal to its number in the group
+    when that is free. With the defaults device 7 gets 10.15.1.7/24, the same as MGMT_IP_TEMPLATE.
+    Device to address, address to device and subnet to devices lookups are dict lookups.
+    """
+    def __init__(
+        self,
+        supernet: str = MGMT_SUPERNET,
+        prefixlen: int = MGMT_GROUP_PREFIXLEN,
+        group_prefixlens: Optional[Dict[int, int]] = None,
+        devices_per_group: int = NUM_DEVICES_PER_SWITCH,
+        first_subnet_num: int = 1,
+        reserve_gateway: bool = True
+        ) -> None:
+        self.supernet = ip_network(supernet)
+        self.prefixlen = prefixlen
+        self.group_prefixlens = group_prefixlens or {}
+        self.devices_per_group = devices_per_group
+        self.reserve_gateway = reserve_gateway
+        for group_prefixlen in (prefixlen, *self.group_prefixlens.values()):
+            if not self.supernet.prefixlen <= group_prefixlen <= 30:
+                raise ValueError(f"Group prefix length /{group_prefixlen} does not fit in {self.supernet}")
+        self.group_to_pool: Dict[int, AddressPool] = {}
+        self.group_to_nums: Dict[int, Set[int]] = {}
+        self.subnet_to_group: Dict[Tuple[int, int], int] = {}
+        self.num_to_address: Dict[int, int] = {}
+        self.address_to_num: Dict[int, int] = {}
+        self._next_subnet_start = int(self.supernet.network_address) + first_subnet_num * 2 ** (32 - prefixlen)
+
+    def group_of(self, num: int) -> int:
+        return (num - 1) // self.devices_per_group + 1
+
+    def pool(self, group_num: int) -> AddressPool:
+        pool = self.group_to_pool.get(group_num)
+        if pool is None:
+            # Carve every group up to this one, so a group's subnet never depends on allocation order
+            for next_group_num in range(len(self.group_to_pool) + 1, group_num + 1):
+                pool = self._carve(next_group_num)
+        return pool
+
+    def _carve(self, group_num: int) -> AddressPool:
+        prefixlen = self.group_prefixlens.get(group_num, self.prefixlen)
+        size = 2 ** (32 - prefixlen)
+        start = -(-self._next_subnet_start // size) * size
+        if start + size > int(self.supernet.broadcast_address) + 1:
+            raise ValueError(f"{self.supernet} has no room for the /{prefixlen} subnet of group {group_num}")
+        pool = AddressPool(IPv4Network((start, prefixlen)), reserve_gateway=self.reserve_gateway)
+        if pool.num_free < self.devices_per_group:
+            raise ValueError(f"/{prefixlen} subnet of group {group_num} has {pool.num_free} free addresses, {self.devices_per_group} are needed")
+        self._next_subnet_start = start + size
+        self.group_to_pool[group_num] = pool
+        self.group_to_nums[group_num] = set()
+        self.subnet_to_group[(start, prefixlen)] = group_num
+        return pool
+
+    def allocate_int(self, num: int) -> Tuple[int, int]:
+        """Same as allocate, as an (address, prefix length) pair."""
+        group_num = self.group_of(num)
+        pool = self.pool(group_num)
+        address = self.num_to_address.get(num)
+        if address is None:
+            address = pool.take(preferred_offset=(num - 1) % self.devices_per_group + 1)
+            self.num_to_address[num] = address
+            self.address_to_num[address] = num
+            self.group_to_nums[group_num].add(num)
+        return address, pool.network.prefixlen
+
+    def allocate(self, num: int) -> IPv4Interface:
+        return IPv4Interface(self.allocate_int(num))
+
+    def release(self, num: int) -> None:
+        address = self.num_to_address.pop(num, None)
+        if address is None:
+            return
+        group_num = self.group_of(num)
+        del self.address_to_num[address]
+        self.group_to_nums[group_num].discard(num)
+        self.group_to_pool[group_num].release(address)
+
+    def address_of(self, num: int) -> Optional[IPv4Interface]:
+        address = self.num_to_address.get(num)
+        if address is None:
+            return None
+        return IPv4Interface((address, self.group_to_pool[self.group_of(num)].network.prefixlen))
+
+    def device_at(self, address: Address) -> Optional[int]:
+        return self.address_to_num.get(address_to_int(address))
+
+    def subnet_of_group(self, group_num: int) -> IPv4Network:
+        return self.pool(group_num).network
+
+    def devices_in(self, subnet: Union[str, IPv4Network]) -> List[int]:
+        subnet = ip_network(subnet)
+        group_num = self.subnet_to_group.get((int(subnet.network_address), subnet.prefixlen))
+        if group_num is not None:
+            return sorted(self.group_to_nums[group_num])
+        # Not a group subnet, check every group that overlaps it
+        nums = []
+        for group_num, pool in self.group_to_pool.items():
+            if pool.network.subnet_of(subnet):
+                nums.extend(self.group_to_nums[group_num])
+            elif subnet.subnet_of(pool.network):
+                nums.extend(num for num in self.group_to_nums[group_num] if self.num_to_address[num] in range(int(subnet.network_address), int(subnet.broadcast_address) + 1))
+        return sorted(nums)
@@ -1,19 +1,36 @@
 from typing import Dict, Optional, Any, Union, ValuesView
+from app.constants import DEVICE_SSH_PORT
 from app.device import Device
+from app.inventory_writer import InventoryWriter
 from pathlib import Path
 from ruamel.yaml import YAML
 import uuid
 import random
 import string
 
+yaml = YAML(typ="safe")
+yaml.default_flow_style = False
+
 class AnsibleHost:
-    def __init__(self, name: str, device: Optional[Device] = None, vars: Optional[Dict[str, Any]] = None) -> None:
+    def __init__(
+        self,
+        name: str,
+        device: Optional[Device] = None,
+        vars: Optional[Dict[str, Any]] = None,
+        host: Optional[str] = None,
+        port: int = DEVICE_SSH_PORT
+        ) -> None:
         self.name = name
         self.device = device
         self.host_vars = vars
+        # Hosts built from DeviceTable columns have no device
+        self.host = device.host if device is not None else host
+        self.port = device.ssh_port if device is not None else port
         
     def dump(self) -> Dict[str, Any]:
-        return {"ansible_host": self.device.mgmt_int_ip}
+        if self.port != DEVICE_SSH_PORT:
+            return {"ansible_host": self.host, "ansible_port": self.port}
+        return {"ansible_host": self.host}
     
     @classmethod
     def from_device(cls, device: Device, vars: Optional[Dict[str, Any]] = None) -> "AnsibleHost":
@@ -23,8 +40,6 @@ class AnsibleHost:
     
     def write_vars(self, inventory_dir: str) -> None:
         path = Path(inventory_dir) / f"host_vars/{self.name}.yaml"
-        yaml = YAML(typ="safe")
-        yaml.default_flow_style = False
         with open(path, "w") as f:
             yaml.dump(self.host_vars, f)
 
@@ -44,7 +59,7 @@ class AnsibleGroup:
         
     def add_group(self, group: Union["AnsibleGroup", str]) -> "AnsibleGroup":
         if isinstance(group, str):
-            group = AnsibleHost(group)
+            group = AnsibleGroup(group)
         self.name_to_group[group.name] = group
         return group
     
@@ -65,13 +80,13 @@ class AnsibleGroup:
     def hosts(self) -> ValuesView[AnsibleHost]:
         return self.name_to_host.values()
     
-    def dump(self) -> Dict[str, Any]:
+    def dump(self, child_vars: bool = True) -> Dict[str, Any]:
         hosts_data = {
             host.name: host.dump() for host in self.hosts
         }
         
         groups_data = {
-            group.name: group.dump() for group in self.groups
+            group.name: group.dump(child_vars=child_vars) if child_vars else group.dump_structure() for group in self.groups
         }
         
         result = {}
@@ -83,6 +98,12 @@ class AnsibleGroup:
             result["vars"] = self.vars
 
         return result
+    
+    def dump_structure(self) -> Dict[str, Any]:
+        """Hosts and children of the group without any vars, for groups whose vars live in group_vars files."""
+        result = self.dump(child_vars=False)
+        result.pop("vars", None)
+        return result
         
 class AnsibleInventory:
     def __init__(self):
@@ -98,7 +119,7 @@ class AnsibleInventory:
         
     def add_group(self, group: Union[AnsibleGroup, str]) -> AnsibleGroup:
         if isinstance(group, str):
-            group = AnsibleHost(group)
+            group = AnsibleGroup(group)
         self.name_to_group[group.name] = group
         return group
     
@@ -115,10 +136,45 @@ class AnsibleInventory:
     def root(self) -> AnsibleGroup:
         return self.name_to_group['all']
     
-    def write_to_dir(self, dir_path: str) -> None:
-        hosts = {"all": self.root.dump()}
-        path = Path(dir_path) / "hosts.yaml"
-        yaml = YAML()
-        yaml.default_flow_style = False
-        with open(path, 'w') as f:
-            yaml.dump(hosts, f)
+    @property
+    def hosts(self) -> ValuesView[AnsibleHost]:
+        return self.name_to_host.values()
+    
+    def dump_dynamic(self) -> Dict[str, Any]:
+        """Inventory in the dynamic inventory script format, with every host's variables under _meta.hostvars."""
+        result: Dict[str, Any] = {}
+        hostvars: Dict[str, Dict[str, Any]] = {}
+        groups = [self.root]
+        while groups:
+            group = groups.pop()
+            group_data: Dict[str, Any] = {}
+            if group.hosts:
+                group_data["hosts"] = [host.name for host in group.hosts]
+            if group.groups:
+                group_data["children"] = [child.name for child in group.groups]
+                groups.extend(group.groups)
+            if group.vars:
+                group_data["vars"] = group.vars
+            result[group.name] = group_data
+            for host in group.hosts:
+                hostvars[host.name] = {**host.dump(), **(host.host_vars or {})}
+        result["_meta"] = {"hostvars": hostvars}
+        return result
+    
+    def write_to_dir(self, dir_path: str, writer: Optional[InventoryWriter] = None) -> None:
+        """Write hosts.yaml with the global vars, a group_vars file per group with vars and the host_vars of every host that has them."""
+        if writer is None:
+            with InventoryWriter(dir_path) as writer:
+                self.write_to_dir(dir_path, writer=writer)
+            return
+        writer.write("hosts.yaml", {"all": self.root.dump(child_vars=False)})
+        writer.write_many(
+            (f"group_vars/{group.name}.yaml", group.vars)
+            for group in self.name_to_group.values()
+            if group is not self.root and group.vars
+        )
+        writer.write_many(
+            (f"host_vars/{host.name}.yaml", host.host_vars)
+            for host in self.hosts
+            if host.host_vars
+        )
@@ -0,0 +1,72 @@
+import json
+import os
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence
+
+import attr
+
+from app.collector import DeviceResult, ResultSink
+
+# Set by scripts/bench_frameworks.py, every framework appends one JSON line per device to this file
+BENCH_TIMINGS_ENV = "BENCH_TIMINGS_PATH"
+
+
+@attr.s(auto_attribs=True, kw_only=True)
+class DeviceTiming:
+    """Time spent on one device, connect and command durations are None when a framework cannot tell them apart."""
+    device: str
+    duration: float
+    connect_duration: Optional[float] = None
+    command_duration: Optional[float] = None
+    ok: bool = True
+
+    @classmethod
+    def from_device_result(cls, device_result: DeviceResult) -> "DeviceTiming":
+        return cls(
+            device=device_result.name,
+            duration=device_result.duration,
+            connect_duration=device_result.connect_duration,
+            command_duration=sum(result.duration for result in device_result.results),
+            ok=device_result.ok
+        )
+
+
+def timings_path_from_env() -> Optional[str]:
+    return os.getenv(BENCH_TIMINGS_ENV) or None
+
+
+def write_timings(path: str, timings: Iterable[DeviceTiming]) -> None:
+    with open(path, "a") as f:
+        f.writelines(json.dumps(attr.asdict(timing)) + "\n" for timing in timings)
+
+
+def load_timings(path: str) -> List[DeviceTiming]:
+    if not Path(path).exists():
+        return []
+    with open(path) as f:
+        return [DeviceTiming(**json.loads(line)) for line in f if line.strip()]
+
+
+def percentile(values: Sequence[float], percent: float) -> Optional[float]:
+    if not values:
+        return None
+    sorted_values = sorted(values)
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * percent / 100))
+    return sorted_values[index]
+
+
+class TimingSink(ResultSink):
+    """Collector sink writing the DeviceTiming of every device to `path`, in batches."""
+    def __init__(self, path: str, batch_size: int = 1000) -> None:
+        self.path = path
+        self.batch_size = batch_size
+        self._timings: List[DeviceTiming] = []
+
+    async def write(self, device_result: DeviceResult) -> None:
+        self._timings.append(DeviceTiming.from_device_result(device_result))
+        if len(self._timings) >= self.batch_size:
+            await self.close()
+
+    async def close(self) -> None:
+        write_timings(self.path, self._timings)
+        self._timings.clear()
@@ -0,0 +1,368 @@
+import asyncio
+import json
+import logging
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, TYPE_CHECKING
+
+import aiofiles
+import attr
+
+from app.constants import DEVICE_USERNAME, DEVICE_PASSWORD, COLLECTOR_MAX_IN_FLIGHT, COLLECTOR_COMMAND_TIMEOUT
+from app.resilience import RetryPolicy
+from app import tracing
+from app import metrics
+
+if TYPE_CHECKING:
+    from app.device import Device
+
+logger = logging.getLogger(__name__)
+
+# A session needs `async send_command(command) -> str` and `async disconnect()`, like a netdev connection
+Session = Any
+Connector = Callable[["Device"], Awaitable[Session]]
+
+COLLECTOR_RETRY_POLICY = RetryPolicy(max_retries=2, base_delay=5.0, retry_exceptions=(OSError, asyncio.TimeoutError))
+
+
+@attr.s(auto_attribs=True, kw_only=True, slots=True)
+class CommandResult:
+    command: str
+    output: Optional[str] = None
+    duration: float = 0.0
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@attr.s(auto_attribs=True, kw_only=True, slots=True)
+class DeviceResult:
+    name: str
+    host: str
+    results: List[CommandResult] = attr.ib(factory=list)
+    num_attempts: int = 0
+    connect_duration: float = 0.0
+    duration: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return all(result.ok for result in self.results)
+
+
+@attr.s(auto_attribs=True, kw_only=True)
+class CollectStats:
+    devices_ok: int = 0
+    devices_failed: int = 0
+    commands_ok: int = 0
+    commands_failed: int = 0
+    duration: float = 0.0
+
+    def add(self, device_result: DeviceResult) -> None:
+        if device_result.ok:
+            self.devices_ok += 1
+        else:
+            self.devices_failed += 1
+        for result in device_result.results:
+            if result.ok:
+                self.commands_ok += 1
+            else:
+                self.commands_failed += 1
+
+    def __str__(self) -> str:
+        return (
+            f"{self.devices_ok} devices ok, {self.devices_failed} failed, "
+            f"{self.commands_ok} commands ok, {self.commands_failed} failed in {self.duration:.1f} seconds"
+        )
+
+
+class ResultSink(ABC):
+    """Receives the results of every device once all its commands have run."""
+    @abstractmethod
+    async def write(self, device_result: DeviceResult) -> None:
+        ...
+
+    async def close(self) -> None:
+        pass
+
+
+class NullSink(ResultSink):
+    async def write(self, device_result: DeviceResult) -> None:
+        pass
+
+
+class TextFileSink(ResultSink):
+    """One <name>.txt file per device with the output of every command, the format of the old gather scripts."""
+    def __init__(self, dir_path: str) -> None:
+        self.dir_path = Path(dir_path)
+        self.dir_path.mkdir(parents=True, exist_ok=True)
+
+    async def write(self, device_result: DeviceResult) -> None:
+        text = "".join(
+            f"=== {result.command} ===\n{result.output if result.ok else f'ERROR: {result.error}'}\n\n"
+            for result in device_result.results
+        )
+        async with aiofiles.open(self.dir_path / f"{device_result.name}.txt", "w") as f:
+            await f.write(text)
+
+
+class JsonLinesSink(ResultSink):
+    """One JSON object per command in a single file, written in batches of about `buffer_size` characters."""
+    def __init__(self, path: str, buffer_size: int = 64 * 1024) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.buffer_size = buffer_size
+        self._file = None
+        self._buffer: List[str] = []
+        self._buffered = 0
+
+    async def write(self, device_result: DeviceResult) -> None:
+        for result in device_result.results:
+            line = json.dumps({"device": device_result.name, "host": device_result.host, **attr.asdict(result)}) + "\n"
+            self._buffer.append(line)
+            self._buffered += len(line)
+        if self._buffered >= self.buffer_size:
+            await self._flush()
+
+    async def _flush(self) -> None:
+        if self._file is None:
+            self._file = await aiofiles.open(self.path, "w")
+        await self._file.write("".join(self._buffer))
+        self._buffer.clear()
+        self._buffered = 0
+
+    async def close(self) -> None:
+        await self._flush()
+        await self._file.close()
+        self._file = None
+
+
+class TeeSink(ResultSink):
+    """Hands every result to all of `sinks`."""
+    def __init__(self, *sinks: ResultSink) -> None:
+        self.sinks = sinks
+
+    async def write(self, device_result: DeviceResult) -> None:
+        for sink in self.sinks:
+            await sink.write(device_result)
+
+    async def close(self) -> None:
+        for sink in self.sinks:
+            await sink.close()
+
+
+class NetdevConnector:
+    def __init__(
+        self,
+        username: str = DEVICE_USERNAME,
+        password: str = DEVICE_PASSWORD,
+        device_type: str = "cisco_ios",
+        timeout: float = COLLECTOR_COMMAND_TIMEOUT
+        ) -> None:
+        self.params = {"username": username, "password": password, "device_type": device_type, "timeout": timeout}
+
+    async def __call__(self, device: "Device") -> Session:
+        import netdev
+
+        conn = netdev.create(host=device.host, port=device.ssh_port, **self.params)
+        await conn.connect()
+        return conn
+
+
+async def disconnect(session: Session) -> None:
+    metrics.SSH_SESSIONS.labels().dec()
+    try:
+        await session.disconnect()
+    except Exception as exc:
+        logger.debug("Failed to disconnect %r: %r", session, exc)
+
+
+class ConnectionPool:
+    """
+    Sessions per host, at most `max_per_host` in use for a host at a time.
+
+    A session that finished without error is kept idle for reuse, up to `max_idle` idle sessions over all hosts,
+    the least recently used ones are disconnected first.
+    """
+    def __init__(self, connector: Connector, max_per_host: int = 1, max_idle: int = COLLECTOR_MAX_IN_FLIGHT) -> None:
+        self.connector = connector
+        self.max_per_host = max_per_host
+        self.max_idle = max_idle
+        self.num_connects = 0
+        self._idle: "OrderedDict[Tuple[str, int], Session]" = OrderedDict()
+        self._host_limits: Dict[str, Tuple[asyncio.Semaphore, List[int]]] = {}
+        self._idle_seq = 0
+
+    @asynccontextmanager
+    async def session(self, device: "Device", span: tracing.AnySpan = tracing.NULL_SPAN) -> AsyncIterator[Session]:
+        """A session to `device`, the waits for a host slot and for connecting are added to `span`."""
+        host = device.host
+        semaphore, users = self._host_limits.setdefault(host, (asyncio.Semaphore(self.max_per_host), [0]))
+        users[0] += 1
+        try:
+            queued_at = time.perf_counter()
+            async with semaphore:
+                span.add_phase("queue_wait", queued_at, time.perf_counter())
+                session = self._take_idle(host)
+                if session is None:
+                    connect_start = time.perf_counter()
+                    try:
+                        with span.phase("connect"):
+                            session = await self.connector(device)
+                    except BaseException:
+                        metrics.observe("ssh", "connect", time.perf_counter() - connect_start, ok=False)
+                        raise
+                    metrics.observe("ssh", "connect", time.perf_counter() - connect_start)
+                    metrics.SSH_SESSIONS.labels().inc()
+                    self.num_connects += 1
+                try:
+                    yield session
+                except BaseException:
+                    await disconnect(session)
+                    raise
+                await self._put_idle(host, session)
+        finally:
+            users[0] -= 1
+            # Forget hosts nobody is waiting for, so the pool does not grow with the number of devices
+            if not users[0]:
+                del self._host_limits[host]
+
+    def _take_idle(self, host: str) -> Optional[Session]:
+        for key in self._idle:
+            if key[0] == host:
+                return self._idle.pop(key)
+        return None
+
+    async def _put_idle(self, host: str, session: Session) -> None:
+        self._idle_seq += 1
+        self._idle[(host, self._idle_seq)] = session
+        while len(self._idle) > self.max_idle:
+            _, oldest = self._idle.popitem(last=False)
+            await disconnect(oldest)
+
+    async def close(self) -> None:
+        sessions = list(self._idle.values())
+        self._idle.clear()
+        await asyncio.gather(*(disconnect(session) for session in sessions))
+
+
+class CommandCollector:
+    """
+    Runs the same commands on many devices and hands every device's results to a sink.
+
+    At most `max_in_flight` devices are worked on at once and devices are pulled from the iterable only as
+    workers free up. Results pass to the sink through a bounded queue, so a slow sink slows collection down
+    instead of piling results up in memory. Connection errors are retried according to `retry_policy`, resuming
+    at the command that failed.
+    """
+    def __init__(
+        self,
+        connector: Optional[Connector] = None,
+        sink: Optional[ResultSink] = None,
+        max_in_flight: int = COLLECTOR_MAX_IN_FLIGHT,
+        max_per_host: int = 1,
+        command_timeout: float = COLLECTOR_COMMAND_TIMEOUT,
+        retry_policy: RetryPolicy = COLLECTOR_RETRY_POLICY,
+        sink_queue_size: Optional[int] = None
+        ) -> None:
+        self.pool = ConnectionPool(connector or NetdevConnector(), max_per_host=max_per_host, max_idle=max_in_flight)
+        self.sink = sink or NullSink()
+        self.max_in_flight = max_in_flight
+        self.command_timeout = command_timeout
+        self.retry_policy = retry_policy
+        self.sink_queue_size = sink_queue_size or max_in_flight
+
+    async def run(self, devices: Iterable["Device"], commands: Sequence[str]) -> CollectStats:
+        stats = CollectStats()
+        start_time = time.monotonic()
+        device_iter = iter(devices)
+        results: "asyncio.Queue[Optional[DeviceResult]]" = asyncio.Queue(self.sink_queue_size)
+        # Results waiting for the sink
+        metrics.QUEUE_DEPTH.labels("collector").set_function(results.qsize)
+
+        async def work() -> None:
+            # Iterating in every worker is safe, the event loop runs one worker at a time between awaits
+            for device in device_iter:
+                device_result = await self.collect(device, commands)
+                # Only slow sinks make workers wait here
+                with tracing.span("sink_wait", "ssh", track=device.name):
+                    await results.put(device_result)
+
+        async def drain() -> None:
+            while True:
+                device_result = await results.get()
+                if device_result is None:
+                    return
+                stats.add(device_result)
+                try:
+                    await self.sink.write(device_result)
+                except Exception as exc:
+                    logger.error("Sink failed to write results of %r: %r", device_result.name, exc)
+
+        drain_task = asyncio.create_task(drain())
+        try:
+            await asyncio.gather(*(work() for _ in range(self.max_in_flight)))
+        finally:
+            await results.put(None)
+            await drain_task
+            await self.pool.close()
+            await self.sink.close()
+        stats.duration = time.monotonic() - start_time
+        logger.info("Command collection finished: %s", stats)
+        return stats
+
+    async def collect(self, device: "Device", commands: Sequence[str]) -> DeviceResult:
+        in_flight = metrics.IN_FLIGHT.labels("collector")
+        in_flight.inc()
+        try:
+            with tracing.span("collect", "ssh", track=device.name, host=device.host) as span:
+                device_result = await self._collect(device, commands, span)
+                span.tag(attempts=device_result.num_attempts, ok=device_result.ok)
+        finally:
+            in_flight.dec()
+        metrics.observe("collector", "device", device_result.duration, ok=device_result.ok)
+        return device_result
+
+    async def _collect(self, device: "Device", commands: Sequence[str], span: tracing.AnySpan) -> DeviceResult:
+        device_result = DeviceResult(name=device.name, host=device.host)
+        remaining = list(commands)
+        start_time = time.monotonic()
+        while remaining:
+            device_result.num_attempts += 1
+            connect_start = time.monotonic()
+            try:
+                async with self.pool.session(device, span) as session:
+                    device_result.connect_duration += time.monotonic() - connect_start
+                    while remaining:
+                        command = remaining[0]
+                        start = time.monotonic()
+                        with span.phase("service", label=command):
+                            output = await asyncio.wait_for(session.send_command(command), timeout=self.command_timeout)
+                        device_result.results.append(CommandResult(command=command, output=output, duration=time.monotonic() - start))
+                        metrics.observe("ssh", "command", device_result.results[-1].duration)
+                        remaining.pop(0)
+            except self.retry_policy.retry_exceptions as exc:
+                attempt_num = device_result.num_attempts - 1
+                if attempt_num >= self.retry_policy.max_retries:
+                    self._fail(device_result, remaining, exc)
+                    break
+                delay = self.retry_policy.backoff(attempt_num)
+                metrics.retried("collector", "device")
+                logger.warning("%r failed with %r, retry attempt #%d/%d in %.1f seconds", device.name, exc, attempt_num + 1, self.retry_policy.max_retries, delay)
+                with span.phase("retry_wait"):
+                    await asyncio.sleep(delay)
+            except Exception as exc:
+                self._fail(device_result, remaining, exc)
+                break
+        device_result.duration = time.monotonic() - start_time
+        return device_result
+
+    @staticmethod
+    def _fail(device_result: DeviceResult, commands: Sequence[str], exc: Exception) -> None:
+        logger.error("Collection from %r failed: %r", device_result.name, exc)
+        metrics.OPERATIONS.labels("ssh", "command", "failed").inc(len(commands))
+        device_result.results.extend(CommandResult(command=command, error=repr(exc)) for command in commands)
@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+from contextlib import asynccontextmanager
+
+from app.constants import GNS3_CONTROLLER_NUM_MAX_CONN, GNS3_CONTROLLER_MIN_CONN, GNS3_CONTROLLER_MAX_CONN
+
+logger = logging.getLogger(__name__)
+
+
+class Slot:
+    def __init__(self) -> None:
+        self.is_failed = False
+        self.record_latency = True
+        self.acquired_at = 0.0
+
+    def failed(self) -> None:
+        self.is_failed = True
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limiter with an additive-increase / multiplicative-decrease window.
+
+    The window grows by roughly one slot per window's worth of successful calls while latency stays near
+    its baseline, and is cut by `decrease_factor` on failures (timeouts, 5xx) or when the recent latency
+    exceeds `latency_spike_ratio` times the baseline. The baseline follows the lowest observed latency and
+    only drifts up slowly, so queueing on the controller side shows up as a spike instead of a new normal.
+    """
+    def __init__(
+        self,
+        initial_limit: int = GNS3_CONTROLLER_NUM_MAX_CONN,
+        min_limit: int = GNS3_CONTROLLER_MIN_CONN,
+        max_limit: int = GNS3_CONTROLLER_MAX_CONN,
+        decrease_factor: float = 0.7,
+        latency_spike_ratio: float = 2.5,
+        baseline_drift: float = 0.01,
+        recent_smoothing: float = 0.2,
+        name: str = "limiter"
+        ) -> None:
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.latency_spike_ratio = latency_spike_ratio
+        self.baseline_drift = baseline_drift
+        self.recent_smoothing = recent_smoothing
+        self._limit = float(initial_limit)
+        self.in_flight = 0
+        self.baseline_latency: Optional[float] = None
+        self.recent_latency: Optional[float] = None
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._last_decrease = 0.0
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "baseline_latency": self.baseline_latency,
+            "recent_latency": self.recent_latency
+        }
+
+    async def acquire(self) -> None:
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just before cancellation, pass it on
+                self.in_flight -= 1
+                self._wake_waiters()
+            elif waiter in self._waiters:
+                # A release may already have dropped the cancelled waiter from the queue
+                self._waiters.remove(waiter)
+            raise
+
+    def release(self, latency: Optional[float] = None, failed: bool = False) -> None:
+        self.in_flight -= 1
+        if failed:
+            self._decrease("failure")
+        elif latency is not None:
+            self._on_success(latency)
+        self._wake_waiters()
+
+    def _wake_waiters(self) -> None:
+        while self._waiters and self.in_flight < self.limit:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def _on_success(self, latency: float) -> None:
+        if self.baseline_latency is None or self.recent_latency is None:
+            self.baseline_latency = self.recent_latency = latency
+            return
+        self.recent_latency += self.recent_smoothing * (latency - self.recent_latency)
+        if latency < self.baseline_latency:
+            self.baseline_latency = latency
+        else:
+            self.baseline_latency += self.baseline_drift * (latency - self.baseline_latency)
+        if self.recent_latency > self.baseline_latency * self.latency_spike_ratio:
+            self._decrease("latency spike")
+        elif self.in_flight + 1 >= self.limit:
+            # Only grow while the window is actually used
+            self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+
+    def _decrease(self, reason: str) -> None:
+        now = time.monotonic()
+        # Calls that were already in flight report the same congestion, react to it once
+        if now - self._last_decrease < (self.baseline_latency or 0.0):
+            return
+        self._last_decrease = now
+        old_limit = self.limit
+        self._limit = max(self.min_limit, self._limit * self.decrease_factor)
+        logger.debug("%s window %d -> %d on %s", self.name, old_limit, self.limit, reason)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[Slot]:
+        slot = Slot()
+        await self.acquire()
+        start = slot.acquired_at = time.perf_counter()
+        try:
+            yield slot
+        except Exception:
+            self.release(failed=True)
+            raise
+        except BaseException:
+            self.release()
+            raise
+        latency = time.perf_counter() - start if slot.record_latency else None
+        self.release(latency=latency, failed=slot.is_failed)
+
+
+_controller_limiters: Dict[str, AdaptiveLimiter] = {}
+
+
+def get_controller_limiter(root_api: str) -> AdaptiveLimiter:
+    """Limiter shared by every GNS3Project talking to the same controller."""
+    if root_api not in _controller_limiters:
+        _controller_limiters[root_api] = AdaptiveLimiter(name=f"GNS3 controller {root_api}")
+    return _controller_limiters[root_api]
@@ -0,0 +1,156 @@
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Union, TYPE_CHECKING
+import attr
+
+from app.constants import GNS3_SNAPSHOT_CACHE_PATH, GNS3_CONFIG_PUSH_MAX_IN_FLIGHT
+from app.render import RenderEngine, stream_rendered
+from app import tracing
+from app import metrics
+
+if TYPE_CHECKING:
+    from app.device import Device
+    from app.gns3_node import GNS3Node
+    from app.gns3_project import GNS3Project
+    from jinja2.environment import Template
+
+logger = logging.getLogger(__name__)
+
+
+class ConfigHashStore:
+    """Hashes of the last startup-config successfully pushed to each node, kept next to the project snapshot."""
+    def __init__(self, path: str = GNS3_SNAPSHOT_CACHE_PATH) -> None:
+        self.path = Path(path)
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.path))
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS config_hashes ("
+            "project_id TEXT NOT NULL, node_id TEXT NOT NULL, sha256 TEXT NOT NULL, pushed_at REAL NOT NULL, "
+            "PRIMARY KEY (project_id, node_id)) WITHOUT ROWID"
+        )
+        return conn
+
+    def load(self, project_id: str) -> Dict[str, str]:
+        if not self.path.exists():
+            return {}
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT node_id, sha256 FROM config_hashes WHERE project_id = ?", (project_id,))
+            return dict(rows.fetchall())
+        finally:
+            conn.close()
+
+    def save(self, project_id: str, node_id_to_hash: Dict[str, str]) -> None:
+        if not node_id_to_hash:
+            return
+        pushed_at = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO config_hashes (project_id, node_id, sha256, pushed_at) VALUES (?, ?, ?, ?)",
+                    [(project_id, node_id, sha256, pushed_at) for node_id, sha256 in node_id_to_hash.items()]
+                )
+        finally:
+            conn.close()
+
+
+@attr.s(auto_attribs=True, kw_only=True)
+class SyncReport:
+    changed: List[str] = attr.ib(factory=list)
+    skipped: List[str] = attr.ib(factory=list)
+    failed: Dict[str, Exception] = attr.ib(factory=dict)
+    missing: List[str] = attr.ib(factory=list)
+
+    def __str__(self) -> str:
+        return f"{len(self.changed)} changed, {len(self.skipped)} unchanged, {len(self.failed)} failed, {len(self.missing)} missing"
+
+
+def hash_config(config: str) -> str:
+    return hashlib.sha256(config.encode()).hexdigest()
+
+
+async def sync_configs(
+    project: "GNS3Project",
+    devices: Iterable["Device"],
+    template: Union["Template", RenderEngine],
+    store: Optional[ConfigHashStore] = None,
+    max_in_flight: int = GNS3_CONFIG_PUSH_MAX_IN_FLIGHT,
+    force: bool = False
+    ) -> SyncReport:
+    """
+    Push startup-configs whose rendered content differs from the last successful push.
+
+    Configs are rendered in a worker thread, fanned out to a process pool when `template` is a RenderEngine, and each
+    one is uploaded as soon as it is rendered with at most `max_in_flight` uploads in parallel. Rendering waits while
+    every upload slot is busy, so only a few chunks of configs are held in memory whatever the fleet size. The hashes
+    of successful uploads are recorded for the next run. `force` pushes every config.
+    """
+    if store is None:
+        store = ConfigHashStore()
+    report = SyncReport()
+    pushed_hashes = {} if force else store.load(project.id)
+    new_hashes: Dict[str, str] = {}
+
+    semaphore = asyncio.BoundedSemaphore(max_in_flight)
+    push_tasks: Set["asyncio.Task[None]"] = set()
+
+    queue_depth = metrics.QUEUE_DEPTH.labels("config_push")
+    in_flight = metrics.IN_FLIGHT.labels("config_push")
+
+    async def push(node: "GNS3Node", config: str, config_hash: str, queue_wait: float) -> None:
+        try:
+            with tracing.span("push_config", "gns3", track=node.name, queue_wait=queue_wait):
+                in_flight.inc()
+                start = time.perf_counter()
+                try:
+                    await project.update_node_config(node, config=config)
+                except Exception as exc:
+                    report.failed[node.name] = exc
+                    return
+                finally:
+                    in_flight.dec()
+                    metrics.observe("config_push", "upload", time.perf_counter() - start, ok=node.name not in report.failed)
+            report.changed.append(node.name)
+            new_hashes[node.id] = config_hash
+        finally:
+            semaphore.release()
+
+    rendered = stream_rendered(template, devices)
+    try:
+        async for hostname, config in rendered:
+            node = project.get_node(hostname)
+            if node is None:
+                report.missing.append(hostname)
+                continue
+            config_hash = hash_config(config)
+            if pushed_hashes.get(node.id) == config_hash:
+                report.skipped.append(hostname)
+                continue
+            queued_at = time.perf_counter()
+            queue_depth.inc()
+            try:
+                await semaphore.acquire()
+            finally:
+                queue_depth.dec()
+            task = asyncio.create_task(push(node, config, config_hash, time.perf_counter() - queued_at))
+            push_tasks.add(task)
+            task.add_done_callback(push_tasks.discard)
+        await asyncio.gather(*push_tasks)
+    finally:
+        await rendered.aclose()
+        for task in push_tasks:
+            task.cancel()
+        await asyncio.gather(*push_tasks, return_exceptions=True)
+        store.save(project.id, new_hashes)
+
+    if report.missing:
+        logger.warning("Nodes are missing from project %r: %s", project.id, ", ".join(report.missing))
+    logger.info("Config sync finished: %s", report)
+    return report
@@ -2,20 +2,45 @@ IOS_TEMPLATE_ID = "DYNAMIPS-TEMPLATE-ID"
 PROJECT_ID = "GNS3-PROJECT-ID"
 GNS3_ROOT_API = "GNS3-API"
 GNS3_CONTROLLER_NUM_MAX_CONN = 15
+GNS3_CONTROLLER_MIN_CONN = 2
+GNS3_CONTROLLER_MAX_CONN = 100
+GNS3_PROVISION_MAX_IN_FLIGHT = 100
+GNS3_START_MAX_IN_FLIGHT = 25
+GNS3_CONFIG_PUSH_MAX_IN_FLIGHT = 50
+GNS3_START_MAX_CPU_PERCENT = 80.0
+GNS3_COMPUTE_ID = "local"
+GNS3_SNAPSHOT_CACHE_PATH = "output/gns3_snapshot.sqlite"
+ANSIBLE_INVENTORY_CACHE_PATH = "output/ansible_inventory.json"
+RESULTS_STORE_PATH = "output/results"
+PARSE_CACHE_PATH = "output/parse_cache.sqlite"
+COLLECTOR_MAX_IN_FLIGHT = 100
+COLLECTOR_COMMAND_TIMEOUT = 90.0
 NUM_DEVICES_PER_SWITCH = 50
 NUM_SWITCHES_PER_CORE_ROUTER = 100
 NUM_DEVICES_PER_ROW = 10
+MGMT_SUPERNET = "10.15.0.0/16"
+MGMT_GROUP_PREFIXLEN = 24
 PIXELS_BETWEEN_DEVICES = 85
 DOMAIN_NAME = "lab.anidumu.me"
 DNS_SERVERS = ["DNS-SERVERS"]
 ENS_NETWORK = "AUTOMATION-VM-IP"
 ENS_NET_MASK = "/24 MASK"
 DHCP_CONFIG_TEMPLATE = "dhcp.j2"
+DHCP_SUBNET_TEMPLATE = "dhcp_subnet.j2"
+DHCP_CONFIG_PATH = "output/dhcpd.conf"
 ROUTER_CONFIG_TEMPLATE = "router.j2"
 START_ROUTER_NUM = 1
 END_ROUTER_NUM = 500
 DEVICE_USERNAME = "cisco"
 DEVICE_PASSWORD = "cisco"
+DEVICE_SSH_PORT = 22
+DEVICE_TELNET_PORT = 23
+# Fake IOS fleet, devices get addresses of FAKE_FLEET_LOOPBACK_NET or ports from FAKE_FLEET_BASE_PORT on
+FAKE_FLEET_LOOPBACK_NET = "127.100.0.0/16"
+FAKE_FLEET_SSH_PORT = 2022
+FAKE_FLEET_TELNET_PORT = 2023
+FAKE_FLEET_BASE_PORT = 10000
+FAKE_FLEET_HOST_KEY_PATH = "output/fake_fleet_host_key"
 # GNS3_VERSION = 2.2
 
 ANSIBLE_GLOBAL_VARS = {
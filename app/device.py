@@ -1,31 +1,60 @@
 from ipaddress import IPv4Address, ip_address, IPv4Interface, ip_interface, IPv4Network
 from typing import Optional, TYPE_CHECKING, Dict, Tuple, NamedTuple
 from app import utils
-from app.constants import NUM_DEVICES_PER_SWITCH, NUM_SWITCHES_PER_CORE_ROUTER, NUM_DEVICES_PER_ROW, PIXELS_BETWEEN_DEVICES, START_ROUTER_NUM, END_ROUTER_NUM
+from app.constants import NUM_DEVICES_PER_SWITCH, NUM_SWITCHES_PER_CORE_ROUTER, NUM_DEVICES_PER_ROW, PIXELS_BETWEEN_DEVICES, START_ROUTER_NUM, END_ROUTER_NUM, DEVICE_SSH_PORT, DEVICE_TELNET_PORT
 
 MGMT_IP_TEMPLATE = "10.15.{group}.{num}/24"
+# Locally administered unicast range, FastEthernet0/0 of device N gets MGMT_MAC_BASE + N
+MGMT_MAC_BASE = 0x02_00_00_00_00_00
 
 if TYPE_CHECKING:
     from app.gns3_node import GNS3Node
+    from app.addressing import AddressAllocator
     
     
 class Vector(NamedTuple):
     x: int
     y: int
+
+
+class Endpoint(NamedTuple):
+    host: str
+    ssh_port: int
+    telnet_port: int
+
+
+def mgmt_mac(num: int) -> str:
+    """The deterministic FastEthernet0/0 MAC of device `num`, colon separated as dhcpd expects."""
+    return ":".join(f"{octet:02x}" for octet in (MGMT_MAC_BASE + num).to_bytes(6, "big"))
+
+
+def switch_offset(seq_num_in_group: int) -> Vector:
+    """Position of a router relative to its switch, `seq_num_in_group` counts from 0."""
+    row_number = seq_num_in_group // NUM_DEVICES_PER_ROW # 0 .. 3
+    pos_within_row = seq_num_in_group % 25 # 0 .. 24
     
+    rel_pos_within_row = pos_within_row - NUM_DEVICES_PER_ROW // 2
+    num_rows = NUM_DEVICES_PER_SWITCH // NUM_DEVICES_PER_ROW
+    return Vector(PIXELS_BETWEEN_DEVICES * rel_pos_within_row, -(num_rows - row_number) * PIXELS_BETWEEN_DEVICES)
+
+
 class Device:
     def __init__(
         self, 
         num: int, 
         mgmt_int: IPv4Interface, 
         host: Optional[str] = None, 
-        hostname: Optional[str] = None
+        hostname: Optional[str] = None,
+        ssh_port: Optional[int] = None,
+        telnet_port: Optional[int] = None
         ) -> None:
         
         self.num = num
         self.mgmt_int = mgmt_int
         self._host = host
         self._hostname = hostname
+        self._ssh_port = ssh_port
+        self._telnet_port = telnet_port
         self.gns3_node = None
 
     def __repr__(self) -> str:
@@ -38,6 +67,18 @@ class Device:
         else:
             return self.mgmt_int_ip
         
+    @property
+    def ssh_port(self) -> int:
+        return self._ssh_port or DEVICE_SSH_PORT
+
+    @property
+    def telnet_port(self) -> int:
+        return self._telnet_port or DEVICE_TELNET_PORT
+
+    def set_endpoint(self, endpoint: Endpoint) -> None:
+        """Reach the device at `endpoint` instead of its management address, a fake device for example."""
+        self._host, self._ssh_port, self._telnet_port = endpoint
+
     @property
     def hostname(self) -> str:
         if self._hostname: 
@@ -64,7 +105,9 @@ class Device:
         return f"CORE{core_router_num }"
 
     @classmethod
-    def from_sequence_num(cls, num: int) -> "Device":
+    def from_sequence_num(cls, num: int, allocator: Optional["AddressAllocator"] = None) -> "Device":
+        if allocator is not None:
+            return cls(num=num, mgmt_int=allocator.allocate(num))
         group_num = (num-1) // NUM_DEVICES_PER_SWITCH + 1
         num_in_group = (num-1) % NUM_DEVICES_PER_SWITCH + 1
         mgmt_int = ip_interface(MGMT_IP_TEMPLATE.format(group = group_num, num = num_in_group))
@@ -81,8 +124,11 @@ class Device:
 
     @property
     def default_gw_ip(self) -> str:
-        result = str(list(self.mgmt_int_net.hosts())[-1])
-        return result
+        # Last usable address, /31 and /32 networks have no broadcast address to skip
+        net = self.mgmt_int_net
+        if net.prefixlen >= 31:
+            return str(net.broadcast_address)
+        return str(net.broadcast_address - 1)
 
     @ property
     def mgmt_int_network_addr(self) -> str:
@@ -94,17 +140,19 @@ class Device:
         result = str(self.mgmt_int_net.netmask)
         return result
 
+    @property
+    def mgmt_mac(self) -> str:
+        return mgmt_mac(self.num)
+
+    @property
+    def mgmt_mac_dotted(self) -> str:
+        """mgmt_mac the way IOS writes it, 0200.0000.0001"""
+        digits = self.mgmt_mac.replace(":", "")
+        return ".".join(digits[start:start + 4] for start in range(0, 12, 4))
+
     def calculate_coordinates(self, switch: "GNS3Node") -> Vector:
-        seq_num_in_group = (self.num - 1) % NUM_DEVICES_PER_SWITCH # 0 .. 99
-        row_number = seq_num_in_group // NUM_DEVICES_PER_ROW # 0 .. 3
-        pos_within_row = seq_num_in_group % 25 # 0 .. 24
-        
-        rel_pos_within_row = pos_within_row - NUM_DEVICES_PER_ROW // 2
-        num_rows = NUM_DEVICES_PER_SWITCH // NUM_DEVICES_PER_ROW
-        router_x = switch.x + PIXELS_BETWEEN_DEVICES * rel_pos_within_row
-        router_y = switch.y - (num_rows - row_number) * PIXELS_BETWEEN_DEVICES
-        vector = Vector(router_x, router_y)
-        return vector
+        offset = switch_offset((self.num - 1) % NUM_DEVICES_PER_SWITCH)
+        return Vector(switch.x + offset.x, switch.y + offset.y)
     
     def find_switch(self, name_to_node: Dict[str, "GNS3Node"]) -> "GNS3Node":
         switch_name = f"Switch{self.group_num}"
@@ -117,9 +165,9 @@ class Device:
         return (self.num - 1) % NUM_DEVICES_PER_SWITCH + 1
     
     @classmethod
-    def create_devices(cls) -> Dict[str, "Device"]:
+    def create_devices(cls, allocator: Optional["AddressAllocator"] = None) -> Dict[str, "Device"]:
         name_to_device : Dict[str, "Device"] = {}
         for i in range(START_ROUTER_NUM, END_ROUTER_NUM + 1):
-            device = cls.from_sequence_num(i)
+            device = cls.from_sequence_num(i, allocator=allocator)
             name_to_device[device.name] = device
         return name_to_device
\ No newline at end of file
@@ -0,0 +1,325 @@
+import socket
+import struct
+from array import array
+from bisect import bisect_left
+from ipaddress import IPv4Interface, IPv4Network, ip_interface
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple, ValuesView, TYPE_CHECKING
+
+from app.constants import DEVICE_SSH_PORT, NUM_DEVICES_PER_SWITCH, NUM_SWITCHES_PER_CORE_ROUTER
+from app.device import Device, Endpoint, MGMT_IP_TEMPLATE, Vector, mgmt_mac, switch_offset
+
+if TYPE_CHECKING:
+    from app.addressing import GroupAddressAllocator
+    from app.gns3_node import GNS3Node
+
+
+def int_to_ip(address: int) -> str:
+    return socket.inet_ntoa(struct.pack("!I", address))
+
+
+def prefixlen_to_mask(prefixlen: int) -> int:
+    return (0xFFFFFFFF << (32 - prefixlen)) & 0xFFFFFFFF
+
+
+class DeviceView(Device):
+    """Device backed by one row of a DeviceTable, it holds nothing but the table and the row index."""
+    def __init__(self, table: "DeviceTable", index: int) -> None:
+        self._table = table
+        self._index = index
+
+    @property
+    def num(self) -> int:
+        return self._table.nums[self._index]
+
+    @property
+    def mgmt_int(self) -> IPv4Interface:
+        return IPv4Interface((self._table.mgmt_ips[self._index], self._table.prefixlens[self._index]))
+
+    @property
+    def _host(self) -> Optional[str]:
+        return self._table.index_to_host.get(self._index)
+
+    @property
+    def _hostname(self) -> Optional[str]:
+        return self._table.index_to_hostname.get(self._index)
+
+    @property
+    def _ssh_port(self) -> Optional[int]:
+        return self._table.index_to_ports.get(self._index, (None, None))[0]
+
+    @property
+    def _telnet_port(self) -> Optional[int]:
+        return self._table.index_to_ports.get(self._index, (None, None))[1]
+
+    def set_endpoint(self, endpoint: Endpoint) -> None:
+        self._table.set_endpoint(self._index, endpoint)
+
+    @property
+    def gns3_node(self) -> Optional["GNS3Node"]:
+        return self._table.index_to_gns3_node.get(self._index)
+
+    @gns3_node.setter
+    def gns3_node(self, node: Optional["GNS3Node"]) -> None:
+        self._table.index_to_gns3_node[self._index] = node
+
+    @property
+    def group_num(self) -> int:
+        return self._table.group_nums[self._index]
+
+    @property
+    def connected_core_router_name(self) -> str:
+        return f"CORE{self._table.core_nums[self._index]}"
+
+    @property
+    def mgmt_int_ip(self) -> str:
+        return int_to_ip(self._table.mgmt_ips[self._index])
+
+    @property
+    def mgmt_int_net(self) -> IPv4Network:
+        return IPv4Network((self._table.network_addr(self._index), self._table.prefixlens[self._index]))
+
+    @property
+    def default_gw_ip(self) -> str:
+        return int_to_ip(self._table.default_gw(self._index))
+
+    @property
+    def mgmt_int_network_addr(self) -> str:
+        return int_to_ip(self._table.network_addr(self._index))
+
+    @property
+    def mgmt_int_mask(self) -> str:
+        return int_to_ip(prefixlen_to_mask(self._table.prefixlens[self._index]))
+
+    def __reduce__(self) -> Any:
+        # Pickle as a standalone Device, otherwise sending a view to a worker process would send the whole table
+        return Device, (self.num, self.mgmt_int, self._host, self._hostname, self._ssh_port, self._telnet_port)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, DeviceView):
+            return self._table is other._table and self._index == other._index
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash((id(self._table), self._index))
+
+
+class DeviceTableValues(ValuesView):
+    """Iterates the rows directly instead of looking every name up again."""
+    _mapping: "DeviceTable"
+
+    def __iter__(self) -> Iterator[Device]:
+        table = self._mapping
+        return (DeviceView(table, index) for index in range(len(table)))
+
+
+class DeviceTable(Mapping[str, Device]):
+    """
+    Devices stored column by column in typed arrays, rows sorted by device number.
+
+    It is a mapping of device name to Device, where the values are DeviceView objects created on access.
+    The batch methods compute a derived value for every row at once and are what inventory and config
+    generation should use for large labs.
+    """
+    def __init__(self) -> None:
+        self.nums = array("I")
+        self.mgmt_ips = array("I")
+        self.prefixlens = array("B")
+        self.group_nums = array("I")
+        self.core_nums = array("I")
+        # Rarely set values stay out of the columns
+        self.index_to_host: Dict[int, str] = {}
+        self.index_to_hostname: Dict[int, str] = {}
+        self.index_to_ports: Dict[int, Tuple[int, int]] = {}
+        self.index_to_gns3_node: Dict[int, "GNS3Node"] = {}
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(num_devices={len(self)})"
+
+    def append(
+        self,
+        num: int,
+        mgmt_int: IPv4Interface,
+        host: Optional[str] = None,
+        hostname: Optional[str] = None
+        ) -> Device:
+        index = self._append_row(num, int(mgmt_int.ip), mgmt_int.network.prefixlen)
+        if host:
+            self.index_to_host[index] = host
+        if hostname:
+            self.index_to_hostname[index] = hostname
+        return DeviceView(self, index)
+
+    def _append_row(self, num: int, mgmt_ip: int, prefixlen: int) -> int:
+        if self.nums and num <= self.nums[-1]:
+            raise ValueError(f"Device numbers must be added in increasing order, {num} follows {self.nums[-1]}")
+        group_num = (num - 1) // NUM_DEVICES_PER_SWITCH + 1
+        self.nums.append(num)
+        self.mgmt_ips.append(mgmt_ip)
+        self.prefixlens.append(prefixlen)
+        self.group_nums.append(group_num)
+        self.core_nums.append((group_num - 1) // NUM_SWITCHES_PER_CORE_ROUTER + 1)
+        return len(self.nums) - 1
+
+    @classmethod
+    def from_sequence_nums(cls, nums: Iterable[int], allocator: Optional["GroupAddressAllocator"] = None) -> "DeviceTable":
+        """Same addressing as Device.from_sequence_num, with the template parsed once per switch group."""
+        table = cls()
+        if allocator is not None:
+            for num in sorted(nums):
+                table._append_row(num, *allocator.allocate_int(num))
+            return table
+        group_to_base: Dict[int, IPv4Interface] = {}
+        for num in sorted(nums):
+            group_num = (num - 1) // NUM_DEVICES_PER_SWITCH + 1
+            base = group_to_base.get(group_num)
+            if base is None:
+                base = group_to_base[group_num] = ip_interface(MGMT_IP_TEMPLATE.format(group=group_num, num=0))
+            num_in_group = (num - 1) % NUM_DEVICES_PER_SWITCH + 1
+            table._append_row(num, int(base.ip) + num_in_group, base.network.prefixlen)
+        return table
+
+    @classmethod
+    def from_devices(cls, devices: Iterable[Device]) -> "DeviceTable":
+        table = cls()
+        for device in sorted(devices, key=lambda device: device.num):
+            view = table.append(device.num, device.mgmt_int, host=device._host, hostname=device._hostname)
+            if device._ssh_port or device._telnet_port:
+                view.set_endpoint(Endpoint(device.host, device.ssh_port, device.telnet_port))
+        return table
+
+    def index_of(self, num: int) -> Optional[int]:
+        nums = self.nums
+        if not nums:
+            return None
+        # Rows are usually consecutive numbers, so try the direct offset before searching
+        index = num - nums[0]
+        if not 0 <= index < len(nums) or nums[index] != num:
+            index = bisect_left(nums, num)
+        if index < len(nums) and nums[index] == num:
+            return index
+        return None
+
+    def set_endpoint(self, index: int, endpoint: Endpoint) -> None:
+        self.index_to_host[index] = endpoint.host
+        self.index_to_ports[index] = (endpoint.ssh_port, endpoint.telnet_port)
+
+    def row(self, index: int) -> DeviceView:
+        return DeviceView(self, index)
+
+    def __getitem__(self, name: str) -> Device:
+        try:
+            num = int(name)
+        except (TypeError, ValueError):
+            raise KeyError(name) from None
+        index = self.index_of(num)
+        if index is None or str(num) != name:
+            raise KeyError(name)
+        return DeviceView(self, index)
+
+    def __iter__(self) -> Iterator[str]:
+        return (str(num) for num in self.nums)
+
+    def __len__(self) -> int:
+        return len(self.nums)
+
+    def values(self) -> DeviceTableValues:
+        return DeviceTableValues(self)
+
+    def __contains__(self, name: Any) -> bool:
+        try:
+            self[name]
+        except KeyError:
+            return False
+        return True
+
+    def network_addr(self, index: int) -> int:
+        return self.mgmt_ips[index] & prefixlen_to_mask(self.prefixlens[index])
+
+    def default_gw(self, index: int) -> int:
+        prefixlen = self.prefixlens[index]
+        broadcast = self.mgmt_ips[index] | (~prefixlen_to_mask(prefixlen) & 0xFFFFFFFF)
+        return broadcast if prefixlen >= 31 else broadcast - 1
+
+    # Batch accessors, one value per row in row order
+
+    def names(self) -> List[str]:
+        return [str(num) for num in self.nums]
+
+    def hostnames(self) -> List[str]:
+        names = self.names()
+        for index, hostname in self.index_to_hostname.items():
+            names[index] = hostname
+        return names
+
+    def mgmt_int_ips(self) -> List[str]:
+        return [int_to_ip(address) for address in self.mgmt_ips]
+
+    def hosts(self) -> List[str]:
+        hosts = self.mgmt_int_ips()
+        for index, host in self.index_to_host.items():
+            hosts[index] = host
+        return hosts
+
+    def mgmt_macs(self) -> List[str]:
+        return [mgmt_mac(num) for num in self.nums]
+
+    def ssh_ports(self) -> List[int]:
+        ports = [DEVICE_SSH_PORT] * len(self)
+        for index, (ssh_port, _) in self.index_to_ports.items():
+            if ssh_port:
+                ports[index] = ssh_port
+        return ports
+
+    def mgmt_int_nets(self) -> List[IPv4Network]:
+        key_to_net: Dict[Tuple[int, int], IPv4Network] = {}
+        nets = []
+        for index, prefixlen in enumerate(self.prefixlens):
+            key = (self.network_addr(index), prefixlen)
+            net = key_to_net.get(key)
+            if net is None:
+                net = key_to_net[key] = IPv4Network(key)
+            nets.append(net)
+        return nets
+
+    def default_gw_ips(self) -> List[str]:
+        return [int_to_ip(self.default_gw(index)) for index in range(len(self))]
+
+    def mgmt_int_masks(self) -> List[str]:
+        prefixlen_to_str = {prefixlen: int_to_ip(prefixlen_to_mask(prefixlen)) for prefixlen in set(self.prefixlens)}
+        return [prefixlen_to_str[prefixlen] for prefixlen in self.prefixlens]
+
+    def connected_switch_names(self) -> List[str]:
+        group_to_name = {group_num: f"Switch{group_num}" for group_num in set(self.group_nums)}
+        return [group_to_name[group_num] for group_num in self.group_nums]
+
+    def connected_core_router_names(self) -> List[str]:
+        core_to_name = {core_num: f"CORE{core_num}" for core_num in set(self.core_nums)}
+        return [core_to_name[core_num] for core_num in self.core_nums]
+
+    def coordinates(self, name_to_node: Mapping[str, "GNS3Node"]) -> List[Vector]:
+        """Same positions as Device.calculate_coordinates, relative to each device's switch node."""
+        offsets = [switch_offset(seq_num_in_group) for seq_num_in_group in range(NUM_DEVICES_PER_SWITCH)]
+        group_to_switch = {group_num: name_to_node[f"Switch{group_num}"] for group_num in set(self.group_nums)}
+        vectors = []
+        for num, group_num in zip(self.nums, self.group_nums):
+            switch = group_to_switch[group_num]
+            offset = offsets[(num - 1) % NUM_DEVICES_PER_SWITCH]
+            vectors.append(Vector(switch.x + offset.x, switch.y + offset.y))
+        return vectors
+
+
+def as_device_table(devices: Iterable[Device]) -> DeviceTable:
+    """The table behind `devices` when they are its rows, otherwise a table built from them, in device number order."""
+    if isinstance(devices, DeviceTable):
+        return devices
+    if isinstance(devices, DeviceTableValues):
+        return devices._mapping
+    return DeviceTable.from_devices(devices)
+
+
+def with_hostnames(devices: Iterable[Device]) -> List[Tuple[str, Device]]:
+    """(hostname, device) pairs in the order of `devices`, hostnames read from the table column when they are its rows."""
+    if isinstance(devices, (DeviceTable, DeviceTableValues)):
+        table = as_device_table(devices)
+        return list(zip(table.hostnames(), table.values()))
+    return [(device.hostname, device) for device in devices]
@@ -2,47 +2,168 @@ import asyncio
 import aiofiles
 import logging
 import logging.config
-from itertools import groupby
-from operator import attrgetter
+import os
+from enum import Enum
 from ipaddress import IPv4Network
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, TYPE_CHECKING
+import attr
+
+from app import utils
 from app.device import Device
-from jinja2 import Environment, PackageLoader
-from typing import List, Tuple, TYPE_CHECKING
-from app.constants import DOMAIN_NAME, DNS_SERVERS, ENS_NETWORK, ENS_NET_MASK, LOGGING_DICT, ROUTER_CONFIG_TEMPLATE, START_ROUTER_NUM, END_ROUTER_NUM
+from app.device_table import as_device_table
+from app.lab import Lab
+from app.render import get_template
+from app.constants import (
+    DOMAIN_NAME, DNS_SERVERS, ENS_NETWORK, ENS_NET_MASK, LOGGING_DICT,
+    DHCP_CONFIG_TEMPLATE, DHCP_SUBNET_TEMPLATE, DHCP_CONFIG_PATH
+)
 
 if TYPE_CHECKING:
     from jinja2.environment import Template
-    
+
 logger = logging.getLogger(__name__)
 
-async def generate_dhcp_config(devices: List[Device], template: "Template"):
-    sorted_devices = sorted(devices, key=attrgetter("mgmt_int_net"))
-    networks_with_devices: List[Tuple[IPv4Network, List[Device]]] = []
-    for network, _devices in groupby(sorted_devices, key=attrgetter("mgmt_int_net")):
-        networks_with_devices.append((network, list(_devices)))
-    
+WRITE_BUFFER_SIZE = 64 * 1024
+
+
+class DhcpMatch(Enum):
+    # host blocks with a fixed-address, looked up by the deterministic MAC router.j2 sets on FastEthernet0/0 in constant time
+    HOST = "host"
+    # one class and one pool per device matched on the host-name option routers send, every class is evaluated for each DHCPDISCOVER
+    CLASS = "class"
+
+
+@attr.s(auto_attribs=True, kw_only=True)
+class DhcpReport:
+    written: List[str] = attr.ib(factory=list)
+    unchanged: List[str] = attr.ib(factory=list)
+    removed: List[str] = attr.ib(factory=list)
+
+    def __str__(self) -> str:
+        return f"{len(self.written)} written, {len(self.unchanged)} unchanged, {len(self.removed)} removed"
+
+
+@attr.s(auto_attribs=True, kw_only=True, frozen=True)
+class DhcpSubnet:
+    network: IPv4Network
+    gateway: str
+    # (hostname, ip, mac) of every device in the subnet
+    hosts: List[Tuple[str, str, str]]
+
+    @property
+    def fragment_name(self) -> str:
+        return f"{self.network.network_address}_{self.network.prefixlen}.conf"
+
+
+def group_by_subnet(devices: Iterable[Device]) -> List[DhcpSubnet]:
+    table = as_device_table(devices)
+    network_to_subnet: Dict[IPv4Network, DhcpSubnet] = {}
+    for network, gateway, hostname, ip, mac in zip(
+        table.mgmt_int_nets(), table.default_gw_ips(), table.hostnames(), table.mgmt_int_ips(), table.mgmt_macs()
+    ):
+        subnet = network_to_subnet.get(network)
+        if subnet is None:
+            subnet = network_to_subnet[network] = DhcpSubnet(network=network, gateway=gateway, hosts=[])
+        subnet.hosts.append((hostname, ip, mac))
+    return [network_to_subnet[network] for network in sorted(network_to_subnet)]
+
 
-    dhcp_conf = template.render(
+def render_subnet(subnet: DhcpSubnet, template: "Template", match: DhcpMatch) -> str:
+    return template.render(network=subnet.network, gateway=subnet.gateway, hosts=subnet.hosts, match=match.value)
+
+
+async def write_chunks(path: Path, chunks: Iterable[str]) -> None:
+    """Write `chunks` as they are produced, through a temporary file that replaces `path` when complete."""
+    tmp_path = path.with_name(path.name + ".tmp")
+    buffer: List[str] = []
+    buffer_size = 0
+    async with aiofiles.open(tmp_path, "w") as f:
+        for chunk in chunks:
+            buffer.append(chunk)
+            buffer_size += len(chunk)
+            if buffer_size >= WRITE_BUFFER_SIZE:
+                await f.write("".join(buffer))
+                buffer.clear()
+                buffer_size = 0
+        await f.write("".join(buffer))
+    os.replace(tmp_path, path)
+
+
+async def write_if_changed(path: Path, content: str) -> bool:
+    if path.exists():
+        async with aiofiles.open(path) as f:
+            if await f.read() == content:
+                return False
+    await write_chunks(path, [content])
+    return True
+
+
+async def generate_dhcp_config(
+    devices: Iterable[Device],
+    template: Optional["Template"] = None,
+    subnet_template: Optional["Template"] = None,
+    path: str = DHCP_CONFIG_PATH,
+    match: DhcpMatch = DhcpMatch.HOST,
+    fragments_dir: Optional[str] = None
+    ) -> DhcpReport:
+    """
+    Write dhcpd.conf to `path`, rendering and writing one subnet at a time.
+
+    With `fragments_dir` every subnet goes to its own file, included from the main one,
+    and only files whose content changed are rewritten.
+    """
+    template = template or get_template(DHCP_CONFIG_TEMPLATE)
+    subnet_template = subnet_template or get_template(DHCP_SUBNET_TEMPLATE)
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    subnets = group_by_subnet(devices)
+    report = DhcpReport()
+
+    if fragments_dir is None:
+        subnet_blocks: Iterator[str] = (render_subnet(subnet, subnet_template, match) for subnet in subnets)
+    else:
+        fragments_path = Path(fragments_dir)
+        fragments_path.mkdir(parents=True, exist_ok=True)
+        fragment_names = set()
+        for subnet in subnets:
+            fragment_names.add(subnet.fragment_name)
+            if await write_if_changed(fragments_path / subnet.fragment_name, render_subnet(subnet, subnet_template, match)):
+                report.written.append(subnet.fragment_name)
+            else:
+                report.unchanged.append(subnet.fragment_name)
+        for fragment_path in fragments_path.glob("*.conf"):
+            if fragment_path.name not in fragment_names:
+                fragment_path.unlink()
+                report.removed.append(fragment_path.name)
+        subnet_blocks = iter([
+            f'include "{(fragments_path / subnet.fragment_name).resolve()}";'
+            for subnet in subnets
+        ])
+
+    chunks = template.generate(
         domain_name=DOMAIN_NAME,
         dns_servers=DNS_SERVERS,
-        ens_network = ENS_NETWORK,
-        ens_net_mask = ENS_NET_MASK,
-        devices=devices,
-        networks_with_devices=networks_with_devices
+        ens_network=ENS_NETWORK,
+        ens_net_mask=ENS_NET_MASK,
+        subnet_blocks=subnet_blocks
     )
-    async with aiofiles.open("output/dhcpd.conf", "w") as f:
-        await f.write(dhcp_conf)
-        
-async def main():
-    jinja_env = Environment(
-        loader=PackageLoader('app', 'templates')
-    )
-    devices = [Device.from_sequence_num(i) for i in range (START_ROUTER_NUM, END_ROUTER_NUM + 1)]   
+    if fragments_dir is None:
+        await write_chunks(path, chunks)
+        report.written.append(path.name)
+    elif await write_if_changed(path, "".join(chunks)):
+        report.written.append(path.name)
+    else:
+        report.unchanged.append(path.name)
+    logger.info("DHCP config for %d subnets generated: %s", len(subnets), report)
+    return report
 
-    dhcp_template = jinja_env.get_template(ROUTER_CONFIG_TEMPLATE)
-    await generate_dhcp_config(devices, template=dhcp_template)
+async def main():
+    lab = Lab.create()
+    match = DhcpMatch.CLASS if utils.is_env_var("DHCP_CLASS_MATCH") else DhcpMatch.HOST
+    await generate_dhcp_config(lab.devices, match=match, fragments_dir=os.getenv("DHCP_FRAGMENTS_DIR"))
 
 
 if __name__ == '__main__':
     logging.config.dictConfig(LOGGING_DICT)
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
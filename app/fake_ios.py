@@ -0,0 +1,502 @@
+import asyncio
+import enum
+import functools
+import logging
+import random
+import re
+import time
+from ipaddress import ip_network
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import attr
+
+from app.constants import (
+    DEVICE_USERNAME, DEVICE_PASSWORD, START_ROUTER_NUM, FAKE_FLEET_LOOPBACK_NET, FAKE_FLEET_SSH_PORT,
+    FAKE_FLEET_TELNET_PORT, FAKE_FLEET_BASE_PORT, FAKE_FLEET_HOST_KEY_PATH
+)
+from app.device import Device, Endpoint
+from app.render import get_template
+
+logger = logging.getLogger(__name__)
+
+Address = Tuple[str, int]
+
+IAC_RE = re.compile(rb"\xff\xfa.*?\xff\xf0|\xff[\xfb-\xfe].|\xff[\xf0-\xf9]", re.S)
+# IAC WILL ECHO, IAC WILL SUPPRESS-GO-AHEAD, like IOS sends on a new telnet session
+TELNET_NEGOTIATION = b"\xff\xfb\x01\xff\xfb\x03"
+LINE_END_RE = re.compile(r"\r\n|\r\0|\r|\n")
+INVALID_INPUT = "% Invalid input detected at '^' marker.\r\n"
+CTRL_Z = "\x1a"
+
+
+class FleetMode(enum.Enum):
+    # Every device on its own loopback address, all on the same ports, served by one listener per protocol
+    LOOPBACK = "loopback"
+    # Every device on its own pair of ports of 127.0.0.1, for systems that only route 127.0.0.1 to loopback
+    PORTS = "ports"
+
+
+@attr.s(auto_attribs=True, kw_only=True)
+class FleetProfile:
+    login_latency: float = 0.0
+    command_latency: float = 0.0
+    jitter: float = 0.0
+    # Connections closed right after they are accepted
+    connect_error_rate: float = 0.0
+    # Commands answered by dropping the connection
+    disconnect_rate: float = 0.0
+    # Commands never answered
+    hang_rate: float = 0.0
+    # Concurrent sessions per device, like the vty lines of a router
+    max_sessions_per_device: Optional[int] = 5
+    ssh_enabled: bool = True
+
+
+@attr.s(auto_attribs=True, kw_only=True)
+class FleetStats:
+    sessions: int = 0
+    commands: int = 0
+    auth_failures: int = 0
+    refused: int = 0
+    connect_errors: int = 0
+    disconnects: int = 0
+    hangs: int = 0
+
+
+def fleet_endpoint(num: int, mode: FleetMode) -> Endpoint:
+    """Where the fake fleet serves device `num`, derived from the number alone so every process agrees on it."""
+    offset = num - START_ROUTER_NUM
+    if mode is FleetMode.LOOPBACK:
+        network = ip_network(FAKE_FLEET_LOOPBACK_NET)
+        return Endpoint(str(network[offset + 1]), FAKE_FLEET_SSH_PORT, FAKE_FLEET_TELNET_PORT)
+    return Endpoint("127.0.0.1", FAKE_FLEET_BASE_PORT + 2 * offset, FAKE_FLEET_BASE_PORT + 2 * offset + 1)
+
+
+def fleet_endpoints(devices: Iterable[Device], mode: FleetMode) -> Dict[str, Endpoint]:
+    return {device.name: fleet_endpoint(device.num, mode) for device in devices}
+
+
+def _words(line: str) -> Tuple[str, ...]:
+    return tuple(line.lower().split())
+
+
+def _matches(words: Sequence[str], canonical: Sequence[str]) -> bool:
+    """IOS style abbreviations, every word a prefix of the canonical one."""
+    return len(words) == len(canonical) and all(canonical_word.startswith(word) for word, canonical_word in zip(words, canonical))
+
+
+EXEC_COMMANDS: Sequence[Tuple[Tuple[str, ...], str]] = (
+    (("show", "version"), "show_version"),
+    (("show", "ip", "interface", "brief"), "show_ip_interface_brief"),
+    (("show", "memory", "statistics"), "show_memory_statistics"),
+    (("show", "arp"), "show_arp"),
+    (("show", "ip", "route"), "show_ip_route"),
+    (("show", "interfaces"), "show_interfaces"),
+    (("show", "ip", "ssh"), "show_ip_ssh"),
+    (("show", "running-config"), "show_running_config"),
+)
+SILENT_EXEC_COMMANDS: Sequence[Tuple[str, ...]] = (
+    ("terminal", "length", "0"),
+    ("terminal", "no", "monitor"),
+    ("enable",),
+)
+CONFIG_SUBMODES: Sequence[Tuple[Tuple[str, ...], str]] = (
+    (("interface",), "config-if"),
+    (("line",), "config-line"),
+    (("router",), "config-router"),
+    (("ip", "access-list", "extended"), "config-ext-nacl"),
+    (("ip", "access-list", "standard"), "config-std-nacl"),
+)
+# First words a submode accepts, anything else falls back to global configuration like on IOS
+SUBMODE_WORDS: Dict[str, Tuple[str, ...]] = {
+    "config-if": ("ip", "no", "description", "shutdown", "duplex", "speed", "mtu", "bandwidth"),
+    "config-line": ("login", "transport", "exec-timeout", "password", "privilege", "logging", "no"),
+    "config-router": ("network", "router-id", "passive-interface", "redistribute", "no"),
+    "config-ext-nacl": ("permit", "deny", "remark", "no"),
+    "config-std-nacl": ("permit", "deny", "remark", "no"),
+}
+
+
+class FakeIosDevice:
+    """State of one fake router shared by all its sessions."""
+    def __init__(self, device: Device, ssh_enabled: bool, started_at: float) -> None:
+        self.device = device
+        self.ssh_enabled = ssh_enabled
+        self.started_at = started_at
+        self.config_lines: List[str] = []
+        self.num_sessions = 0
+        self.num_commands = 0
+        # Set by `hostname` in config mode
+        self.hostname: Optional[str] = None
+
+    @property
+    def prompt_name(self) -> str:
+        return self.hostname or self.device.hostname
+
+    def render(self, template_name: str) -> str:
+        num = self.device.num
+        minutes = int((time.time() - self.started_at) // 60)
+        text = get_template(f"fake_ios/{template_name}.j2").render(
+            device=self.device,
+            hostname=self.prompt_name,
+            uptime=f"{minutes} minute{'' if minutes == 1 else 's'}",
+            serial=f"4279{num:06d}",
+            mac=f"ca{(num >> 16) & 0xff:02x}.{num & 0xffff:04x}.0008",
+            gw_mac="ca00.0000.0008",
+            used=38734100 + num % 1000 * 64,
+            packets_in=1000 + self.num_commands,
+            packets_out=800 + self.num_commands,
+            ssh_enabled=self.ssh_enabled,
+            config_lines=self.config_lines,
+            username=DEVICE_USERNAME,
+            password=DEVICE_PASSWORD,
+        )
+        return text.replace("\n", "\r\n") + ("" if text.endswith("\n") else "\r\n")
+
+
+class IosSession:
+    """The CLI of one session, turns every input line into the text a router would send back."""
+    def __init__(self, fake_device: FakeIosDevice) -> None:
+        self.fake_device = fake_device
+        self.mode = "exec"
+        self.banner_delimiter: Optional[str] = None
+
+    @property
+    def prompt(self) -> str:
+        name = self.fake_device.prompt_name
+        if self.banner_delimiter is not None:
+            return ""
+        return f"{name}#" if self.mode == "exec" else f"{name}({self.mode})#"
+
+    def respond(self, line: str) -> str:
+        """Echo of the line, its output and the next prompt."""
+        return f"{line}\r\n{self.execute(line)}{self.prompt}"
+
+    def execute(self, line: str) -> str:
+        if self.banner_delimiter is not None:
+            if self.banner_delimiter in line:
+                self.banner_delimiter = None
+            return ""
+        stripped = line.strip()
+        if not stripped:
+            return ""
+        self.fake_device.num_commands += 1
+        if self.mode == "exec":
+            return self._exec(stripped)
+        if stripped == CTRL_Z or _matches(_words(stripped), ("end",)):
+            self.mode = "exec"
+            return ""
+        return self._config(stripped)
+
+    def _exec(self, line: str) -> str:
+        command, _, pipe = line.partition("|")
+        words = _words(command)
+        for canonical, template_name in EXEC_COMMANDS:
+            if _matches(words, canonical):
+                return self._filter(self.fake_device.render(template_name), pipe)
+        if any(_matches(words, canonical) for canonical in SILENT_EXEC_COMMANDS) or words[:2] == ("terminal", "width"):
+            return ""
+        if _matches(words, ("show", "privilege")):
+            return "Current privilege level is 15\r\n"
+        if _matches(words, ("configure", "terminal")):
+            self.mode = "config"
+            return "Enter configuration commands, one per line.  End with CNTL/Z.\r\n"
+        if _matches(words, ("write", "memory")) or _matches(words, ("write",)):
+            return "Building configuration...\r\n[OK]\r\n"
+        return f"{' ' * (len(self.prompt) + len(line))}^\r\n{INVALID_INPUT}"
+
+    @staticmethod
+    def _filter(output: str, pipe: str) -> str:
+        pipe_words = pipe.split(None, 1)
+        if len(pipe_words) < 2 or not any(word.startswith(pipe_words[0].lower()) for word in ("include", "section")):
+            return output
+        pattern = re.compile(pipe_words[1].strip())
+        return "".join(line for line in output.splitlines(keepends=True) if pattern.search(line))
+
+    def _config(self, line: str) -> str:
+        words = _words(line)
+        if words[0] == "do":
+            return self._exec(line.split(None, 1)[1] if len(words) > 1 else "")
+        if _matches(words, ("exit",)):
+            self.mode = "exec" if self.mode == "config" else "config"
+            return ""
+        if self.mode != "config" and words[0] not in SUBMODE_WORDS.get(self.mode, ()) and not words[0].isdigit():
+            self.mode = "config"
+        self.fake_device.config_lines.append(line)
+        if self.mode != "config":
+            return ""
+        for canonical, submode in CONFIG_SUBMODES:
+            if len(words) > len(canonical) and _matches(words[:len(canonical)], canonical):
+                self.mode = submode
+                return ""
+        if words[0] == "banner" and len(words) > 2:
+            delimiter = line.split()[2][0]
+            text = line.split(None, 2)[2]
+            if text.count(delimiter) < 2:
+                self.banner_delimiter = delimiter
+                return f"Enter TEXT message.  End with the character '{delimiter}'.\r\n"
+            return ""
+        if words[0] == "hostname" and len(words) == 2:
+            self.fake_device.hostname = line.split()[1]
+            return ""
+        if words[:2] == ("no", "hostname"):
+            self.fake_device.hostname = "Router"
+            return ""
+        if words[:3] == ("crypto", "key", "generate") or words[:3] == ("crypto", "key", "gen"):
+            self.fake_device.ssh_enabled = True
+            return (
+                f"The name for the keys will be: {self.fake_device.prompt_name}.lab\r\n"
+                "% The key modulus size is 2048 bits\r\n"
+                "% Generating 2048 bit RSA keys, keys will be non-exportable...\r\n[OK] (elapsed time was 1 seconds)\r\n"
+            )
+        return ""
+
+
+class SessionClosed(Exception):
+    pass
+
+
+class FakeIosFleet:
+    """
+    IOS-like SSH and telnet endpoints for many devices in one asyncio process.
+
+    In loopback mode one listener per protocol serves every device, the device of a connection is told apart by
+    the local address it was made to. SSH needs asyncssh, which netdev depends on, telnet needs nothing.
+    """
+    def __init__(
+        self,
+        devices: Iterable[Device],
+        mode: FleetMode = FleetMode.LOOPBACK,
+        profile: Optional[FleetProfile] = None,
+        username: str = DEVICE_USERNAME,
+        password: str = DEVICE_PASSWORD,
+        seed: Optional[int] = None,
+        host_key_path: str = FAKE_FLEET_HOST_KEY_PATH
+        ) -> None:
+        self.mode = mode
+        self.profile = profile or FleetProfile()
+        self.username = username
+        self.password = password
+        self.random = random.Random(seed)
+        self.host_key_path = host_key_path
+        self.stats = FleetStats()
+        self.ssh_address_to_device: Dict[Address, FakeIosDevice] = {}
+        self.telnet_address_to_device: Dict[Address, FakeIosDevice] = {}
+        started_at = time.time()
+        for device in devices:
+            endpoint = fleet_endpoint(device.num, mode)
+            fake_device = FakeIosDevice(device, ssh_enabled=self.profile.ssh_enabled, started_at=started_at)
+            self.ssh_address_to_device[(endpoint.host, endpoint.ssh_port)] = fake_device
+            self.telnet_address_to_device[(endpoint.host, endpoint.telnet_port)] = fake_device
+        self._servers: List[Any] = []
+        self._handler_tasks: Set["asyncio.Task[None]"] = set()
+        self._closing = False
+
+    def __len__(self) -> int:
+        return len(self.ssh_address_to_device)
+
+    async def __aenter__(self) -> "FakeIosFleet":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.close()
+
+    def _listen_addresses(self, address_to_device: Dict[Address, FakeIosDevice]) -> List[Address]:
+        if self.mode is FleetMode.LOOPBACK:
+            # Only a wildcard listener accepts connections to every loopback address, others are refused per connection
+            return sorted({("0.0.0.0", port) for _, port in address_to_device})
+        return list(address_to_device)
+
+    async def start(self, ssh: bool = True, telnet: bool = True) -> None:
+        self._closing = False
+        if telnet:
+            for host, port in self._listen_addresses(self.telnet_address_to_device):
+                self._servers.append(await asyncio.start_server(self._handle_telnet, host, port, backlog=1024))
+        if ssh:
+            import asyncssh
+
+            server_class = _ssh_server_class()
+            host_key = self._load_host_key()
+            for host, port in self._listen_addresses(self.ssh_address_to_device):
+                self._servers.append(await asyncssh.create_server(
+                    functools.partial(server_class, self), host, port,
+                    server_host_keys=[host_key], process_factory=self._handle_ssh, line_editor=False, backlog=1024
+                ))
+        logger.info("Fake IOS fleet of %d devices listening in %s mode", len(self), self.mode.value)
+
+    async def close(self) -> None:
+        self._closing = True
+        for server in self._servers:
+            server.close()
+        # Sessions may be waiting on a client or on an injected hang, their handlers close the connections as they exit
+        handler_tasks = list(self._handler_tasks)
+        for task in handler_tasks:
+            task.cancel()
+        await asyncio.gather(*handler_tasks, return_exceptions=True)
+        for server in self._servers:
+            await server.wait_closed()
+        self._servers.clear()
+
+    def _load_host_key(self) -> Any:
+        import asyncssh
+
+        path = Path(self.host_key_path)
+        if path.exists():
+            return asyncssh.read_private_key(str(path))
+        # Generated once and kept, so clients do not see a new host key on every start
+        key = asyncssh.generate_private_key("ssh-rsa", key_size=2048)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        key.write_private_key(str(path))
+        return key
+
+    def _open_session(self, fake_device: Optional[FakeIosDevice]) -> Optional[IosSession]:
+        if fake_device is None:
+            return None
+        if self.profile.connect_error_rate and self.random.random() < self.profile.connect_error_rate:
+            self.stats.connect_errors += 1
+            return None
+        max_sessions = self.profile.max_sessions_per_device
+        if max_sessions is not None and fake_device.num_sessions >= max_sessions:
+            self.stats.refused += 1
+            return None
+        fake_device.num_sessions += 1
+        self.stats.sessions += 1
+        return IosSession(fake_device)
+
+    async def _delay(self, latency: float) -> None:
+        delay = latency + (self.random.uniform(0, self.profile.jitter) if self.profile.jitter else 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+
+    async def _answer(self, session: IosSession, line: str) -> str:
+        """Response to one line after the injected latency, raises SessionClosed for injected disconnects."""
+        profile = self.profile
+        if line.strip() and session.banner_delimiter is None:
+            self.stats.commands += 1
+            if profile.disconnect_rate and self.random.random() < profile.disconnect_rate:
+                self.stats.disconnects += 1
+                raise SessionClosed()
+            if profile.hang_rate and self.random.random() < profile.hang_rate:
+                self.stats.hangs += 1
+                # Until the client gives up and closes the connection
+                await asyncio.Event().wait()
+            await self._delay(profile.command_latency)
+        return session.respond(line)
+
+    async def _handle_telnet(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        sockname = writer.get_extra_info("sockname")
+        session = self._open_session(self.telnet_address_to_device.get(tuple(sockname[:2])))
+        if session is None:
+            writer.close()
+            return
+        lines = _TelnetLines(reader)
+        task = asyncio.current_task()
+        self._handler_tasks.add(task)
+        try:
+            writer.write(TELNET_NEGOTIATION + b"\r\n\r\nUser Access Verification\r\n\r\n")
+            for _ in range(3):
+                writer.write(b"Username: ")
+                username = await lines.read_line()
+                writer.write(username.encode("latin-1") + b"\r\nPassword: ")
+                password = await lines.read_line()
+                if (username, password) == (self.username, self.password):
+                    break
+                self.stats.auth_failures += 1
+                writer.write(b"\r\n% Login invalid\r\n\r\n")
+            else:
+                return
+            await self._delay(self.profile.login_latency)
+            writer.write(f"\r\n{session.prompt}".encode("latin-1"))
+            while True:
+                line = await lines.read_line()
+                writer.write((await self._answer(session, line)).encode("latin-1"))
+                await writer.drain()
+        except (SessionClosed, ConnectionError, EOFError):
+            pass
+        except asyncio.CancelledError:
+            # Cancelled by close(), ending normally keeps asyncio from logging the cancelled connection task
+            if not self._closing:
+                raise
+        finally:
+            self._handler_tasks.discard(task)
+            session.fake_device.num_sessions -= 1
+            writer.close()
+
+    async def _handle_ssh(self, process: Any) -> None:
+        import asyncssh
+
+        sockname = process.get_extra_info("sockname")
+        session = self._open_session(self.ssh_address_to_device.get(tuple(sockname[:2])))
+        if session is None:
+            process.exit(1)
+            return
+        task = asyncio.current_task()
+        self._handler_tasks.add(task)
+        try:
+            if process.command:
+                # Exec channel, one command without prompts
+                process.stdout.write(session.execute(process.command))
+                return
+            await self._delay(self.profile.login_latency)
+            process.stdout.write(f"\r\n{session.prompt}")
+            buffer = ""
+            while True:
+                data = await process.stdin.read(4096)
+                if not data:
+                    return
+                buffer += data
+                *complete, buffer = LINE_END_RE.split(buffer)
+                for line in complete:
+                    process.stdout.write(await self._answer(session, line))
+        except (SessionClosed, ConnectionError, asyncssh.Error):
+            pass
+        except asyncio.CancelledError:
+            if not self._closing:
+                raise
+        finally:
+            self._handler_tasks.discard(task)
+            session.fake_device.num_sessions -= 1
+            process.exit(0)
+
+
+class _TelnetLines:
+    """Lines of a telnet client with the option negotiation stripped."""
+    def __init__(self, reader: asyncio.StreamReader) -> None:
+        self.reader = reader
+        self.lines: List[str] = []
+        self.buffer = ""
+
+    async def read_line(self) -> str:
+        while not self.lines:
+            data = await self.reader.read(4096)
+            if not data:
+                raise EOFError()
+            self.buffer += IAC_RE.sub(b"", data).decode("latin-1")
+            *complete, self.buffer = LINE_END_RE.split(self.buffer)
+            self.lines.extend(complete)
+        return self.lines.pop(0)
+
+
+@functools.lru_cache(maxsize=None)
+def _ssh_server_class() -> type:
+    import asyncssh
+
+    class FleetSSHServer(asyncssh.SSHServer):
+        def __init__(self, fleet: FakeIosFleet) -> None:
+            self.fleet = fleet
+
+        def begin_auth(self, username: str) -> bool:
+            return True
+
+        def password_auth_supported(self) -> bool:
+            return True
+
+        def validate_password(self, username: str, password: str) -> bool:
+            if (username, password) == (self.fleet.username, self.fleet.password):
+                return True
+            self.fleet.stats.auth_failures += 1
+            return False
+
+    return FleetSSHServer
@@ -0,0 +1,274 @@
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import re
+import time
+import uuid
+from copy import deepcopy
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import attr
+import httpx
+
+from app.constants import NODE_DICT
+
+logger = logging.getLogger(__name__)
+
+FAKE_ROOT_API = "http://gns3-fake/v2"
+
+Response = Tuple[int, Any]
+
+
+@attr.s(auto_attribs=True, kw_only=True)
+class EndpointProfile:
+    latency: float = 0.0
+    jitter: float = 0.0
+    max_concurrency: Optional[int] = None
+    error_rate: float = 0.0
+    error_status: int = 503
+
+
+class EndpointStats:
+    def __init__(self) -> None:
+        self.durations: List[float] = []
+        self.num_errors = 0
+
+    def percentile(self, percent: float) -> float:
+        if not self.durations:
+            return 0.0
+        sorted_durations = sorted(self.durations)
+        index = min(len(sorted_durations) - 1, int(len(sorted_durations) * percent / 100))
+        return sorted_durations[index]
+
+
+class FakeGNS3Controller:
+    """
+    In-process stand-in for the GNS3 controller endpoints used by GNS3Project.
+
+    It is an ASGI application, so an httpx client can talk to it without any network.
+    Each endpoint can be given its own latency, concurrency cap and error rate via EndpointProfile.
+    """
+    ROUTES: List[Tuple[str, str, str]] = [
+        ("GET", r"/computes/(?P<compute_id>[^/]+)", "get_compute"),
+        ("GET", r"/projects/(?P<project_id>[^/]+)/nodes", "list_nodes"),
+        ("GET", r"/projects/(?P<project_id>[^/]+)/links", "list_links"),
+        ("POST", r"/projects/(?P<project_id>[^/]+)/templates/(?P<template_id>[^/]+)", "create_from_template"),
+        ("POST", r"/projects/(?P<project_id>[^/]+)/nodes/start", "start_all"),
+        ("POST", r"/projects/(?P<project_id>[^/]+)/nodes/stop", "stop_all"),
+        ("POST", r"/projects/(?P<project_id>[^/]+)/(?:nodes/)?links", "add_link"),
+        ("DELETE", r"/projects/(?P<project_id>[^/]+)/links/(?P<link_id>[^/]+)", "delete_link"),
+        ("GET", r"/projects/(?P<project_id>[^/]+)/nodes/(?P<node_id>[^/]+)", "get_node"),
+        ("PUT", r"/projects/(?P<project_id>[^/]+)/nodes/(?P<node_id>[^/]+)", "update_node"),
+        ("DELETE", r"/projects/(?P<project_id>[^/]+)/nodes/(?P<node_id>[^/]+)", "delete_node"),
+        ("POST", r"/projects/(?P<project_id>[^/]+)/nodes/(?P<node_id>[^/]+)/files/startup-config.cfg", "upload_config"),
+        ("POST", r"/projects/(?P<project_id>[^/]+)/nodes/(?P<node_id>[^/]+)/start", "start_node"),
+        ("POST", r"/projects/(?P<project_id>[^/]+)/nodes/(?P<node_id>[^/]+)/stop", "stop_node"),
+    ]
+
+    def __init__(
+        self,
+        project_id: str,
+        profiles: Optional[Dict[str, EndpointProfile]] = None,
+        default_profile: Optional[EndpointProfile] = None,
+        seed: Optional[int] = None
+        ) -> None:
+        self.project_id = project_id
+        self.profiles = profiles or {}
+        self.default_profile = default_profile or EndpointProfile()
+        self.random = random.Random(seed)
+        self.id_to_node: Dict[str, Dict[str, Any]] = {}
+        self.id_to_link: Dict[str, Dict[str, Any]] = {}
+        self.configs: Dict[str, str] = {}
+        self.cpu_usage_percent = 0.0
+        self.stats: Dict[str, EndpointStats] = {}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._next_template_num = 1
+        self._routes = [
+            (method, re.compile(rf".*{pattern}$"), getattr(self, f"_{endpoint}"), endpoint)
+            for method, pattern, endpoint in self.ROUTES
+        ]
+
+    def create_http_client(self, **kwargs: Any) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=self), **kwargs)
+
+    def profile(self, endpoint: str) -> EndpointProfile:
+        return self.profiles.get(endpoint, self.default_profile)
+
+    def reset_stats(self) -> None:
+        self.stats.clear()
+
+    def add_node(self, name: str, node_type: str = "dynamips", x: int = 0, y: int = 0, status: str = "stopped") -> Dict[str, Any]:
+        node = deepcopy(NODE_DICT)
+        node.update({
+            "name": name,
+            "node_type": node_type,
+            "node_id": str(uuid.uuid4()),
+            "x": x,
+            "y": y,
+            "status": status,
+            "project_id": self.project_id
+        })
+        node["label"]["text"] = name
+        self.id_to_node[node["node_id"]] = node
+        return node
+
+    def add_link(self, first: Tuple[str, int, int], second: Tuple[str, int, int]) -> Dict[str, Any]:
+        link = {
+            "link_id": str(uuid.uuid4()),
+            "link_type": "ethernet",
+            "project_id": self.project_id,
+            "nodes": [
+                {"node_id": node_id, "adapter_number": adapter_num, "port_number": port_num}
+                for node_id, adapter_num, port_num in (first, second)
+            ]
+        }
+        self.id_to_link[link["link_id"]] = link
+        return link
+
+    def _used_ports(self) -> Dict[Tuple[str, int, int], str]:
+        return {
+            (port["node_id"], port["adapter_number"], port["port_number"]): link_id
+            for link_id, link in self.id_to_link.items()
+            for port in link["nodes"]
+        }
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+        status, payload = await self.dispatch(scope["method"], scope["path"], body)
+        data = b"" if payload is None else json.dumps(payload).encode()
+        headers = [(b"content-type", b"application/json")]
+        if scope["method"] == "GET" and status == 200:
+            # Lets clients revalidate cached listings with If-None-Match
+            etag = f'"{hashlib.sha1(data).hexdigest()}"'.encode()
+            headers.append((b"etag", etag))
+            if dict(scope["headers"]).get(b"if-none-match") == etag:
+                status, data = 304, b""
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": data})
+
+    async def dispatch(self, method: str, path: str, body: bytes) -> Response:
+        for route_method, pattern, handler, endpoint in self._routes:
+            match = pattern.match(path)
+            if route_method != method or match is None:
+                continue
+            project_id = match.groupdict().get("project_id", self.project_id)
+            if project_id != self.project_id:
+                return 404, {"message": f"Project {project_id} doesn't exist"}
+            params = {key: value for key, value in match.groupdict().items() if key != "project_id"}
+            return await self._call_endpoint(endpoint, handler, body, params)
+        return 404, {"message": f"{method} {path} is not implemented by the fake controller"}
+
+    async def _call_endpoint(self, endpoint: str, handler: Callable[..., Response], body: bytes, params: Dict[str, str]) -> Response:
+        profile = self.profile(endpoint)
+        stats = self.stats.setdefault(endpoint, EndpointStats())
+        start = time.perf_counter()
+        semaphore = None
+        if profile.max_concurrency:
+            semaphore = self._semaphores.setdefault(endpoint, asyncio.Semaphore(profile.max_concurrency))
+            await semaphore.acquire()
+        try:
+            delay = profile.latency + self.random.uniform(0, profile.jitter)
+            if delay:
+                await asyncio.sleep(delay)
+            if profile.error_rate and self.random.random() < profile.error_rate:
+                stats.num_errors += 1
+                result: Response = profile.error_status, {"message": "Injected failure"}
+            else:
+                data = json.loads(body) if body and endpoint != "upload_config" else body
+                result = handler(data, **params)
+        finally:
+            if semaphore is not None:
+                semaphore.release()
+        stats.durations.append(time.perf_counter() - start)
+        return result
+
+    def _get_compute(self, data: Any, compute_id: str) -> Response:
+        return 200, {"compute_id": compute_id, "connected": True, "cpu_usage_percent": self.cpu_usage_percent}
+
+    def _list_nodes(self, data: Any) -> Response:
+        return 200, list(self.id_to_node.values())
+
+    def _list_links(self, data: Any) -> Response:
+        return 200, list(self.id_to_link.values())
+
+    def _create_from_template(self, data: Dict[str, Any], template_id: str) -> Response:
+        name = f"R{self._next_template_num}"
+        self._next_template_num += 1
+        node = self.add_node(name, x=data.get("x", 0), y=data.get("y", 0))
+        return 201, node
+
+    def _get_node(self, data: Any, node_id: str) -> Response:
+        if node_id not in self.id_to_node:
+            return 404, {"message": f"Node {node_id} doesn't exist"}
+        return 200, self.id_to_node[node_id]
+
+    def _update_node(self, data: Dict[str, Any], node_id: str) -> Response:
+        if node_id not in self.id_to_node:
+            return 404, {"message": f"Node {node_id} doesn't exist"}
+        node = self.id_to_node[node_id]
+        for key in ("name", "x", "y", "z", "label"):
+            if key in data:
+                node[key] = data[key]
+        return 200, node
+
+    def _delete_node(self, data: Any, node_id: str) -> Response:
+        if self.id_to_node.pop(node_id, None) is None:
+            return 404, {"message": f"Node {node_id} doesn't exist"}
+        self.configs.pop(node_id, None)
+        for link_id, link in list(self.id_to_link.items()):
+            if any(port["node_id"] == node_id for port in link["nodes"]):
+                del self.id_to_link[link_id]
+        return 204, None
+
+    def _add_link(self, data: Dict[str, Any]) -> Response:
+        used_ports = self._used_ports()
+        ports = [(port["node_id"], port["adapter_number"], port["port_number"]) for port in data["nodes"]]
+        for port in ports:
+            if port[0] not in self.id_to_node:
+                return 404, {"message": f"Node {port[0]} doesn't exist"}
+            if port in used_ports:
+                return 409, {"message": f"Port {port[1]}/{port[2]} is already used"}
+        link = self.add_link(*ports)
+        return 201, link
+
+    def _delete_link(self, data: Any, link_id: str) -> Response:
+        if self.id_to_link.pop(link_id, None) is None:
+            return 404, {"message": f"Link {link_id} doesn't exist"}
+        return 204, None
+
+    def _upload_config(self, data: bytes, node_id: str) -> Response:
+        if node_id not in self.id_to_node:
+            return 404, {"message": f"Node {node_id} doesn't exist"}
+        self.configs[node_id] = data.decode()
+        return 201, None
+
+    def _set_status(self, node_id: str, status: str) -> Response:
+        if node_id not in self.id_to_node:
+            return 404, {"message": f"Node {node_id} doesn't exist"}
+        node = self.id_to_node[node_id]
+        node["status"] = status
+        return 200, node
+
+    def _start_node(self, data: Any, node_id: str) -> Response:
+        return self._set_status(node_id, "started")
+
+    def _stop_node(self, data: Any, node_id: str) -> Response:
+        return self._set_status(node_id, "stopped")
+
+    def _start_all(self, data: Any) -> Response:
+        for node in self.id_to_node.values():
+            node["status"] = "started"
+        return 204, None
+
+    def _stop_all(self, data: Any) -> Response:
+        for node in self.id_to_node.values():
+            node["status"] = "stopped"
+        return 204, None
@@ -0,0 +1,91 @@
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.gns3_link import GNS3Link
+
+PortKey = Tuple[str, int, int]
+SwitchPort = Tuple[int, int]
+
+
+def is_same_link(first: GNS3Link, second: GNS3Link) -> bool:
+    # Links built locally have no ID until the controller returns one
+    if first.id and second.id:
+        return first.id == second.id
+    return first.alt_id == second.alt_id
+
+
+class LinkIndex:
+    """
+    Adjacency index over the links of a project.
+    
+    Keeps (node_id, adapter, port) -> link, node_id -> links and switch_id -> {(adapter, port) -> node_id}
+    so port occupancy and neighbour questions do not require a scan over every link.
+    """
+    def __init__(self, links: Iterable[GNS3Link] = (), switch_ids: Iterable[str] = ()) -> None:
+        self.switch_ids: Set[str] = set(switch_ids)
+        self.port_to_link: Dict[PortKey, GNS3Link] = {}
+        self.node_to_links: Dict[str, Dict[Tuple[Any, ...], GNS3Link]] = {}
+        self.switch_to_ports: Dict[str, Dict[SwitchPort, str]] = {switch_id: {} for switch_id in self.switch_ids}
+        for link in links:
+            self.add_link(link)
+            
+    def add_switch(self, switch_id: str) -> None:
+        self.switch_ids.add(switch_id)
+        self.switch_to_ports.setdefault(switch_id, {})
+    
+    def add_link(self, link: GNS3Link) -> None:
+        for port, peer_port in ((link.first_port, link.second_port), (link.second_port, link.first_port)):
+            self.port_to_link[(port.node_id, port.adapter_num, port.port_num)] = link
+            self.node_to_links.setdefault(port.node_id, {})[link.alt_id] = link
+            if port.node_id in self.switch_ids:
+                self.switch_to_ports[port.node_id][(port.adapter_num, port.port_num)] = peer_port.node_id
+                
+    def remove_link(self, link: GNS3Link) -> None:
+        for port in link.ports:
+            key = (port.node_id, port.adapter_num, port.port_num)
+            # The port may have been re-cabled since, only drop entries that still belong to this link
+            if key in self.port_to_link and is_same_link(self.port_to_link[key], link):
+                del self.port_to_link[key]
+                if port.node_id in self.switch_ids:
+                    self.switch_to_ports[port.node_id].pop((port.adapter_num, port.port_num), None)
+            node_links = self.node_to_links.get(port.node_id)
+            if node_links is not None:
+                node_links.pop(link.alt_id, None)
+                if not node_links:
+                    del self.node_to_links[port.node_id]
+                
+    def remove_node(self, node_id: str) -> List[GNS3Link]:
+        """Drop the node and every link attached to it, returning the removed links."""
+        links = list(self.node_to_links.get(node_id, {}).values())
+        for link in links:
+            self.remove_link(link)
+        self.switch_ids.discard(node_id)
+        self.switch_to_ports.pop(node_id, None)
+        return links
+    
+    def link_at(self, node_id: str, adapter_num: int, port_num: int) -> Optional[GNS3Link]:
+        return self.port_to_link.get((node_id, adapter_num, port_num))
+    
+    def is_cabled(self, node_id: str, adapter_num: int = 0, port_num: int = 0) -> bool:
+        return (node_id, adapter_num, port_num) in self.port_to_link
+    
+    def links_of(self, node_id: str) -> List[GNS3Link]:
+        return list(self.node_to_links.get(node_id, {}).values())
+    
+    def neighbors(self, node_id: str) -> Set[str]:
+        result: Set[str] = set()
+        for link in self.node_to_links.get(node_id, {}).values():
+            for port in link.ports:
+                if port.node_id != node_id:
+                    result.add(port.node_id)
+        return result
+    
+    def switch_ports(self, switch_id: str) -> Dict[SwitchPort, str]:
+        """(adapter number, port number) -> ID of the node cabled to it"""
+        return self.switch_to_ports.get(switch_id, {})
+    
+    def node_at_switch_port(self, switch_id: str, port_num: int, adapter_num: int = 0) -> Optional[str]:
+        return self.switch_to_ports.get(switch_id, {}).get((adapter_num, port_num))
+    
+    def free_switch_ports(self, switch_id: str, num_ports: int, adapter_num: int = 0) -> List[int]:
+        used_ports = self.switch_to_ports.get(switch_id, {})
+        return [port_num for port_num in range(num_ports) if (adapter_num, port_num) not in used_ports]
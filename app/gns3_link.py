@@ -1,3 +1,4 @@
+import sys
 from typing import Dict, Any, List, TYPE_CHECKING, NamedTuple, Tuple, Optional
 import attr
 from app import utils
@@ -19,25 +20,29 @@ class GNS3Port(NamedTuple):
         }
 
 
-@attr.s(auto_attribs=True, kw_only=True)
+@attr.s(auto_attribs=True, kw_only=True, slots=True)
 class GNS3Link:
     id: Optional[str] = None
     type: str = "ethernet"
     ports: List["GNS3Port"]
+    _alt_id: Tuple[Any, ...] = attr.ib(init=False, repr=False, eq=False)
     
-    @property
-    def alt_id(self) -> Tuple[Any, ...]:
+    def __attrs_post_init__(self) -> None:
         sorted_ports = sorted(self.ports)
         first_port = sorted_ports[0]
         second_port = sorted_ports[1]
-        return (first_port.node_id, first_port.adapter_num, first_port.port_num, second_port.node_id, second_port.adapter_num, second_port.port_num)
+        self._alt_id = (first_port.node_id, first_port.adapter_num, first_port.port_num, second_port.node_id, second_port.adapter_num, second_port.port_num)
+    
+    @property
+    def alt_id(self) -> Tuple[Any, ...]:
+        return self._alt_id
 
     @classmethod
     def load(cls, data: Dict[str, Any], 
             # id_to_node: Dict[str, "GNS3Node"]
              ) -> "GNS3Link":
         ports = [
-            GNS3Port(adapter_num=port_conn_data["adapter_number"], port_num=port_conn_data["port_number"], node_id=port_conn_data["node_id"])
+            GNS3Port(adapter_num=port_conn_data["adapter_number"], port_num=port_conn_data["port_number"], node_id=sys.intern(port_conn_data["node_id"]))
             for port_conn_data in data["nodes"]
         ]
         link_data = {
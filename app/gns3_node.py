@@ -1,3 +1,4 @@
+import sys
 from enum import Enum
 from typing import Dict, Any
 import attr
@@ -5,9 +6,9 @@ import attr
 class NodeStatus(Enum):
     STARTED = "started"
     STOPPED = "stopped"
-    SUSPENDED = "suspeneded"
+    SUSPENDED = "suspended"
 
-@attr.s(auto_attribs=True, kw_only=True, frozen=True)
+@attr.s(auto_attribs=True, kw_only=True, frozen=True, slots=True)
 class GNS3Node:
     id: str
     type: str
@@ -20,8 +21,9 @@ class GNS3Node:
     @classmethod
     def load(cls, data: Dict[str, Any]) -> "GNS3Node":
         node_data = {
-            "id": data["node_id"],
-            "type": data["node_type"],
+            # Node IDs are repeated by every link referencing the node, share a single string
+            "id": sys.intern(data["node_id"]),
+            "type": sys.intern(data["node_type"]),
             "name": data["name"],
             "x": data["x"],
             "y": data["y"],
@@ -33,4 +35,8 @@ class GNS3Node:
 
     @property
     def is_started(self) -> bool:
-        return self.status is NodeStatus.STARTED
\ No newline at end of file
+        return self.status is NodeStatus.STARTED
+    
+    @property
+    def is_switch(self) -> bool:
+        return self.name.startswith("Switch")
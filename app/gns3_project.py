@@ -1,41 +1,99 @@
 import asyncio
+import attr
 import httpx
 from httpx import Limits
 import logging
 import random
+import time
 from copy import deepcopy
-from typing import List, Dict, Any, Iterable, Tuple, ValuesView, TYPE_CHECKING, NamedTuple, Optional
-from app.constants import GNS3_ROOT_API, PROJECT_ID, NUM_DEVICES_PER_ROW, NUM_DEVICES_PER_SWITCH, PIXELS_BETWEEN_DEVICES, IOS_TEMPLATE_ID, NODE_DICT, GNS3_CONTROLLER_NUM_MAX_CONN
+from typing import List, Dict, Any, Iterable, Tuple, ValuesView, TYPE_CHECKING, NamedTuple, Optional, Callable, Awaitable, TypeVar, Set
+from app.constants import GNS3_ROOT_API, PROJECT_ID, NUM_DEVICES_PER_ROW, NUM_DEVICES_PER_SWITCH, PIXELS_BETWEEN_DEVICES, IOS_TEMPLATE_ID, NODE_DICT, GNS3_CONTROLLER_MAX_CONN, GNS3_PROVISION_MAX_IN_FLIGHT, GNS3_START_MAX_IN_FLIGHT, GNS3_COMPUTE_ID
 from app.gns3_node import GNS3Node, NodeStatus
 from app.gns3_link import GNS3Link, GNS3Port
+from app.gns3_index import LinkIndex
+from app.concurrency import AdaptiveLimiter, get_controller_limiter
+from app.resilience import RetryPolicy, CircuitBreakers
+from app.start_scheduler import StartScheduler
+from app.snapshot_cache import SnapshotCache
 from app.device import Vector
 from app import utils
+from app import tracing
+from app import metrics
+from app import gns3_stream
+from app.gns3_stream import Validator
 
 if TYPE_CHECKING:
     from asyncio import Semaphore 
     from app.device import Device
     from jinja2.environment import Template
     
+T = TypeVar("T")
+
+GNS3_RETRY_POLICY = RetryPolicy(retry_exceptions=(httpx.TransportError,))
+# Requests that create something are only retried when the controller cannot have acted on them,
+# a timed out or 5xx node creation may still have added the node
+NON_IDEMPOTENT_RETRY_POLICY = attr.evolve(
+    GNS3_RETRY_POLICY,
+    retry_statuses=frozenset({409, 429, 503}),
+    retry_exceptions=(httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+)
+
 logger = logging.getLogger(__name__)
 
 
 class GNS3Project:
-    def __init__(self, id: str, name_to_node: Dict[str, GNS3Node], alt_id_to_link: Dict[Tuple[Any, ...], GNS3Link]) -> None:
+    def __init__(
+        self, 
+        id: str, 
+        name_to_node: Dict[str, GNS3Node], 
+        alt_id_to_link: Dict[Tuple[Any, ...], GNS3Link], 
+        http_client: Optional[httpx.AsyncClient] = None, 
+        root_api: str = GNS3_ROOT_API,
+        limiter: Optional[AdaptiveLimiter] = None
+        ) -> None:
         self.id = id
+        self.root_api = root_api
+        self.load(name_to_node, alt_id_to_link)
+        if http_client is None:
+            http_client = GNS3Project.create_http_client()
+        self.http_client = http_client
+        if limiter is None:
+            limiter = get_controller_limiter(root_api)
+        self.limiter = limiter
+        metrics.IN_FLIGHT.labels("gns3").set_function(lambda: limiter.in_flight)
+        metrics.QUEUE_DEPTH.labels("gns3").set_function(lambda: limiter.queue_depth)
+        self.retry_policy = GNS3_RETRY_POLICY
+        self.breakers = CircuitBreakers()
+        self.snapshot_cache: Optional[SnapshotCache] = None
+        self.refresh_task: Optional["asyncio.Task[None]"] = None
+        # Listing name -> validator of its last fetch, saved with the snapshot
+        self.validators: Dict[str, Validator] = {}
+        # IDs of the nodes and alt IDs of the links changed locally while a refresh is fetching
+        self._changed_node_ids: Optional[Set[str]] = None
+        self._changed_link_ids: Optional[Set[Tuple[Any, ...]]] = None
+        
+    def load(self, name_to_node: Dict[str, GNS3Node], alt_id_to_link: Dict[Tuple[Any, ...], GNS3Link]) -> None:
         self.name_to_node = name_to_node
+        self.id_to_node = {node.id: node for node in name_to_node.values()}
         self.alt_id_to_link = alt_id_to_link
-        self.http_client = httpx.AsyncClient(
-            # limits=Limits(max_keepalive_connections=25, max_connections=100)
-            timeout=httpx.Timeout(read=30.0)
-            )
-        # self.http_client = httpx.AsyncClient()
+        self.link_index = LinkIndex(alt_id_to_link.values(), switch_ids=(node.id for node in self.nodes if node.is_switch))
         
         
-    async def __aenter__(self) -> None:
+    async def __aenter__(self) -> "GNS3Project":
         return self
 
     async def __aexit__(self, exc_type, exc, tb):
-        await self.http_client.aclose()
+        try:
+            if self.refresh_task is not None and not self.refresh_task.done():
+                if exc_type is None:
+                    # The background refresh also brings the on-disk snapshot up to date
+                    await self.refresh_task
+                else:
+                    self.refresh_task.cancel()
+            elif self.snapshot_cache is not None and exc_type is None:
+                self.snapshot_cache.save(self)
+        finally:
+            await self.http_client.aclose()
     
     @property
     def nodes(self) -> ValuesView[GNS3Node]:
@@ -46,39 +104,279 @@ class GNS3Project:
         return self.alt_id_to_link.values()
     
     @staticmethod
-    def project_api_url(project_id: str) -> str:
-        return f"{GNS3_ROOT_API}/projects/{project_id}"
+    def project_api_url(project_id: str, root_api: str = GNS3_ROOT_API) -> str:
+        return f"{root_api}/projects/{project_id}"
     
     @property
     def api_url(self) -> str:
-        return GNS3Project.project_api_url(self.id)
+        return GNS3Project.project_api_url(self.id, root_api=self.root_api)
     
     @classmethod
-    async def fetch_from_id(cls, project_id: str) -> "GNS3Project":
-        project_url = GNS3Project.project_api_url(project_id)
-        nodes_url = f'{project_url}/nodes'
-        links_url = f'{project_url}/links'
-        async with httpx.AsyncClient() as http_client:
-            get_nodes_task = asyncio.create_task(http_client.get(nodes_url))
-            get_links_task = asyncio.create_task(http_client.get(links_url))
-            await asyncio.gather(get_nodes_task, get_links_task)
-            nodes_data = get_nodes_task.result().json()
-            links_data = get_links_task.result().json()
-            name_to_node, id_to_node = GNS3Project.parse_nodes_data(nodes_data)
-            alt_id_to_link = GNS3Project.parse_links_data(links_data) #  id_to_node
+    async def fetch_from_id(
+        cls, 
+        project_id: str, 
+        http_client: Optional[httpx.AsyncClient] = None, 
+        root_api: str = GNS3_ROOT_API, 
+        limiter: Optional[AdaptiveLimiter] = None
+        ) -> "GNS3Project":
+        result = cls(id=project_id, name_to_node={}, alt_id_to_link={}, http_client=http_client, root_api=root_api, limiter=limiter)
+        await result.refresh()
+        return result
+    
+    @classmethod
+    async def load_cached(
+        cls, 
+        project_id: str, 
+        cache: Optional[SnapshotCache] = None, 
+        refresh: bool = True, 
+        **kwargs: Any
+        ) -> "GNS3Project":
+        """
+        Build the project from the on-disk snapshot when there is one, otherwise fetch it.
+        
+        With `refresh`, the project is re-fetched in the background and the cache is updated with the differences.
+        Await `wait_refreshed()` before relying on the snapshot being current.
+        """
+        if cache is None:
+            cache = SnapshotCache()
+        snapshot = cache.load(project_id)
+        if snapshot is None:
+            result = await cls.fetch_from_id(project_id, **kwargs)
+            cache.save(result)
+            result.snapshot_cache = cache
+        else:
+            name_to_node, alt_id_to_link = snapshot
+            result = cls(id=project_id, name_to_node=name_to_node, alt_id_to_link=alt_id_to_link, **kwargs)
+            result.validators = cache.load_validators(project_id)
+            result.snapshot_cache = cache
+            if refresh:
+                result.refresh_task = asyncio.create_task(result.refresh())
+        return result
+    
+    async def wait_refreshed(self) -> None:
+        if self.refresh_task is not None:
+            await self.refresh_task
+    
+    async def refresh(self) -> None:
+        """
+        Bring the nodes and links up to date with the controller.
+        
+        A listing the controller answers 304 for, or whose body hashes the same as last time, is left as it is.
+        Changed ones are merged in, keeping the nodes and links this project changed while they were being fetched.
+        """
+        nodes_url = f'{self.api_url}/nodes'
+        links_url = f'{self.api_url}/links'
+        self._changed_node_ids = changed_node_ids = set()
+        self._changed_link_ids = changed_link_ids = set()
+        try:
+            # Responses are decoded element by element as they arrive, so the raw JSON is never held in memory
+            (nodes, nodes_validator), (alt_id_to_link, links_validator) = await asyncio.gather(
+                self._stream(gns3_stream.stream_nodes, nodes_url, self.validators.get("nodes")),
+                self._stream(gns3_stream.stream_links, links_url, self.validators.get("links"))
+            )
+        finally:
+            self._changed_node_ids = self._changed_link_ids = None
+        for name, validator in (("nodes", nodes_validator), ("links", links_validator)):
+            if validator is not None:
+                self.validators[name] = validator
+        if nodes is None and alt_id_to_link is None:
+            logger.info("Project %r is unchanged since the last refresh", self.id)
+        else:
+            self.merge(
+                name_to_node=None if nodes is None else nodes[0],
+                alt_id_to_link=alt_id_to_link,
+                keep_node_ids=changed_node_ids,
+                keep_link_ids=changed_link_ids
+            )
+        if self.snapshot_cache is not None:
+            self.snapshot_cache.save(self)
             
-        result = cls(id=project_id, name_to_node=name_to_node, alt_id_to_link=alt_id_to_link)
-        return result  
+    def merge(
+        self, 
+        name_to_node: Optional[Dict[str, GNS3Node]] = None, 
+        alt_id_to_link: Optional[Dict[Tuple[Any, ...], GNS3Link]] = None,
+        keep_node_ids: Iterable[str] = (),
+        keep_link_ids: Iterable[Tuple[Any, ...]] = ()
+        ) -> None:
+        """Apply fetched nodes and links, those in `keep_node_ids` and `keep_link_ids` keep their local state."""
+        keep_node_ids = set(keep_node_ids)
+        keep_link_ids = set(keep_link_ids)
+        num_nodes_changed = num_links_changed = 0
+        if name_to_node is not None:
+            fetched_id_to_node = {node.id: node for node in name_to_node.values()}
+            for node_id in [node_id for node_id in self.id_to_node if node_id not in fetched_id_to_node and node_id not in keep_node_ids]:
+                self._remove_node(node_id)
+                num_nodes_changed += 1
+            for node_id, node in fetched_id_to_node.items():
+                current = self.id_to_node.get(node_id)
+                if node_id in keep_node_ids or current == node:
+                    continue
+                if current is not None and self.name_to_node.get(current.name) is current:
+                    del self.name_to_node[current.name]
+                self._add_node(node)
+                num_nodes_changed += 1
+        if alt_id_to_link is not None:
+            for alt_id, link in list(self.alt_id_to_link.items()):
+                if alt_id not in alt_id_to_link and alt_id not in keep_link_ids:
+                    self._remove_link(link)
+                    num_links_changed += 1
+            for alt_id, link in alt_id_to_link.items():
+                current = self.alt_id_to_link.get(alt_id)
+                if alt_id in keep_link_ids or (current is not None and current.id == link.id):
+                    continue
+                if current is not None:
+                    self._remove_link(current)
+                # A link to a node deleted locally during the fetch is gone too
+                if all(port.node_id in self.id_to_node for port in link.ports):
+                    self._add_link(link)
+                    num_links_changed += 1
+        logger.info("Merged project %r: %d nodes and %d links changed", self.id, num_nodes_changed, num_links_changed)
+        
+    async def _stream(
+        self, 
+        loader: Callable[[httpx.AsyncClient, str, Optional[Validator]], Awaitable[T]], 
+        url: str, 
+        validator: Optional[Validator] = None
+        ) -> T:
+        with tracing.span(loader.__name__, "gns3", url=url) as span:
+            queued_at = time.perf_counter()
+            ok = False
+            try:
+                async with self.limiter.slot() as slot:
+                    span.add_phase("queue_wait", queued_at, slot.acquired_at)
+                    # Listing time grows with the project size, it says nothing about controller congestion
+                    slot.record_latency = False
+                    with span.phase("service"):
+                        result = await loader(self.http_client, url, validator)
+                ok = True
+                return result
+            finally:
+                metrics.observe("gns3", loader.__name__, time.perf_counter() - queued_at, ok=ok)
+            
+    async def _request(self, endpoint: str, method: str, url: str, retry_policy: Optional[RetryPolicy] = None, **kwargs: Any) -> httpx.Response:
+        """
+        Send a request through the shared limiter, retrying transient failures.
+        
+        Transport errors and `retry_policy.retry_statuses` are retried with jittered exponential backoff,
+        honouring Retry-After. Requests to an endpoint whose circuit breaker is open wait outside the limiter,
+        so they do not hold slots that other endpoints could use. `retry_policy` overrides the project one.
+        
+        The traced span splits the time into `queue_wait` (breaker and limiter), `service` and `retry_wait`.
+        """
+        breaker = self.breakers.get(endpoint)
+        policy = retry_policy or self.retry_policy
+        attempt_num = 0
+        start = time.perf_counter()
+        with tracing.span(endpoint, "gns3", method=method) as span:
+            while True:
+                queued_at = time.perf_counter()
+                is_probe = await breaker.wait()
+                try:
+                    async with self.limiter.slot() as slot:
+                        span.add_phase("queue_wait", queued_at, slot.acquired_at)
+                        with span.phase("service"):
+                            response = await self.http_client.request(method, url, **kwargs)
+                        if response.status_code >= 500:
+                            slot.failed()
+                except policy.retry_exceptions as exc:
+                    breaker.record_failure()
+                    if attempt_num >= policy.max_retries:
+                        metrics.observe("gns3", endpoint, time.perf_counter() - start, ok=False)
+                        raise
+                    reason = repr(exc)
+                    delay = policy.backoff(attempt_num)
+                else:
+                    span.tag(status=response.status_code, attempts=attempt_num + 1)
+                    is_unhealthy = response.status_code >= 500 or response.status_code == 429
+                    if is_unhealthy:
+                        breaker.record_failure()
+                    else:
+                        breaker.record_success()
+                    if response.status_code not in policy.retry_statuses or attempt_num >= policy.max_retries:
+                        metrics.observe("gns3", endpoint, time.perf_counter() - start, ok=not response.is_error)
+                        return response
+                    reason = f"status {response.status_code}"
+                    retry_after = policy.retry_after(response.headers)
+                    delay = policy.backoff(attempt_num) if retry_after is None else retry_after
+                finally:
+                    # Cancelled or failed outside the policy, let another request probe the endpoint
+                    if is_probe:
+                        breaker.release_probe()
+                attempt_num += 1
+                metrics.retried("gns3", endpoint)
+                logger.warning("%s %s failed with %s, retry attempt #%d/%d in %.1f seconds", method, url, reason, attempt_num, policy.max_retries, delay)
+                with span.phase("retry_wait"):
+                    await asyncio.sleep(delay)
             
     @staticmethod
     def create_http_client() -> httpx.AsyncClient:
-        timeout = httpx.Timeout(read=300, pool=200)
-        pool_limits = httpx.Limits(max_connections=10, max_keepalive_connections=GNS3_CONTROLLER_NUM_MAX_CONN)
-        client = httpx.AsyncClient(pool_limits=pool_limits, timeout=timeout)
+        timeout = httpx.Timeout(5.0, read=30.0)
+        # Request concurrency is governed by the adaptive limiter, the pool only has to keep up with its largest window
+        limits = httpx.Limits(max_connections=GNS3_CONTROLLER_MAX_CONN, max_keepalive_connections=GNS3_CONTROLLER_MAX_CONN)
+        client = httpx.AsyncClient(limits=limits, timeout=timeout)
         return client
     
+    @property
+    def concurrency_stats(self) -> Dict[str, Any]:
+        return self.limiter.snapshot()
+    
     def get_node(self, node_name: str) -> Optional[GNS3Node]:
-        return self.name_to_node.get[node_name]
+        return self.name_to_node.get(node_name)
+    
+    def _add_node(self, node: GNS3Node) -> None:
+        self.name_to_node[node.name] = node
+        self.id_to_node[node.id] = node
+        if node.is_switch:
+            self.link_index.add_switch(node.id)
+        if self._changed_node_ids is not None:
+            self._changed_node_ids.add(node.id)
+            
+    def _remove_node(self, node_id: str) -> None:
+        node = self.id_to_node.pop(node_id, None)
+        if node is not None and self.name_to_node.get(node.name) is node:
+            del self.name_to_node[node.name]
+        if self._changed_node_ids is not None:
+            self._changed_node_ids.add(node_id)
+        # The controller removes the links of a deleted node along with it
+        for link in self.link_index.remove_node(node_id):
+            self.alt_id_to_link.pop(link.alt_id, None)
+            if self._changed_link_ids is not None:
+                self._changed_link_ids.add(link.alt_id)
+            
+    def _set_status(self, node: GNS3Node, status: NodeStatus) -> None:
+        if node.status is not status:
+            self._add_node(attr.evolve(node, status=status))
+            
+    def _add_link(self, link: GNS3Link) -> None:
+        self.alt_id_to_link[link.alt_id] = link
+        self.link_index.add_link(link)
+        if self._changed_link_ids is not None:
+            self._changed_link_ids.add(link.alt_id)
+        
+    def _remove_link(self, link: GNS3Link) -> None:
+        self.alt_id_to_link.pop(link.alt_id, None)
+        self.link_index.remove_link(link)
+        if self._changed_link_ids is not None:
+            self._changed_link_ids.add(link.alt_id)
+    
+    def get_link_at(self, node: GNS3Node, adapter_num: int = 0, port_num: int = 0) -> Optional[GNS3Link]:
+        return self.link_index.link_at(node.id, adapter_num, port_num)
+    
+    def is_cabled(self, node: GNS3Node, adapter_num: int = 0, port_num: int = 0) -> bool:
+        return self.link_index.is_cabled(node.id, adapter_num, port_num)
+    
+    def get_neighbors(self, node: GNS3Node) -> List[GNS3Node]:
+        return [self.id_to_node[node_id] for node_id in self.link_index.neighbors(node.id) if node_id in self.id_to_node]
+    
+    def get_switch_port_to_node(self, switch: GNS3Node, adapter_num: int = 0) -> Dict[int, GNS3Node]:
+        return {
+            port_num: self.id_to_node[node_id]
+            for (port_adapter_num, port_num), node_id in self.link_index.switch_ports(switch.id).items()
+            if port_adapter_num == adapter_num and node_id in self.id_to_node
+        }
+        
+    def get_free_switch_ports(self, switch: GNS3Node, num_ports: int = NUM_DEVICES_PER_SWITCH + 1) -> List[int]:
+        return self.link_index.free_switch_ports(switch.id, num_ports)
     
     @staticmethod
     def parse_nodes_data(data: List[Dict[str, Any]]) -> Tuple[Dict[str, GNS3Node], Dict[str, GNS3Node]]:
@@ -98,7 +396,7 @@ class GNS3Project:
         for link_data in data:
             link = GNS3Link.load(link_data) # , id_to_node
             alt_id_to_link[link.alt_id] = link
-            return alt_id_to_link
+        return alt_id_to_link
         
     async def add_router_from_template(self, coordinates: Vector, hostname: str) -> GNS3Node:
         url = f"{self.api_url}/templates/{IOS_TEMPLATE_ID}"
@@ -106,13 +404,13 @@ class GNS3Project:
             "x": coordinates.x,
             "y": coordinates.y
         }
-        response = await self.http_client.post(url, json=data)
+        response = await self._request("create_from_template", "POST", url, retry_policy=NON_IDEMPOTENT_RETRY_POLICY, json=data)
         
         if 200 <= response.status_code < 300:
             logger.info("Device %r was successfully created from template", hostname)
             
             node = GNS3Node.load(response.json())
-            self.name_to_node[node.name] = node
+            self._add_node(node)
             return node
         
         else:
@@ -134,7 +432,7 @@ class GNS3Project:
         data["y"] = coordinates.y
 
         url = f"{self.api_url}/nodes/{node.id}"
-        response = await self.http_client.put(url, json=data)
+        response = await self._request("update_node", "PUT", url, json=data)
         
         if response.is_error:
             logger.error("Device %r - hostname update has failed, error: %s", hostname, response.text)
@@ -145,7 +443,7 @@ class GNS3Project:
             old_node_name = node.name
             node = GNS3Node.load(response.json())
             logger.info("Device %r has been renamed to %r, expected %r", old_node_name, node.name, hostname)
-            self.name_to_node[node.name] = node
+            self._add_node(node)
             return node
     
     def create_link_between_router_and_switch(self, router: GNS3Node, switch: GNS3Node, router_seq_in_group: int) -> GNS3Link:
@@ -158,12 +456,12 @@ class GNS3Project:
     async def add_link_to_switch(self, link: GNS3Link) -> None:             
         # link = self.create_link_between_router_and_switch(router, switch, switch_port_num)
         url = f"{self.api_url}/nodes/links"
-        response = await self.http_client.post(url, json=link.dump())
+        response = await self._request("add_link", "POST", url, json=link.dump())
         if 200 <= response.status_code < 300:
             logger.info("Link %s has been added", link)
             
             res_link = GNS3Link.load(response.json())
-            self.alt_id_to_link[res_link.alt_id] = res_link
+            self._add_link(res_link)
             return
         
         else:
@@ -172,7 +470,7 @@ class GNS3Project:
     
     async def update_node_config(self, node: GNS3Node, config: str) -> None:
         url = f"{self.api_url}/nodes/{node.id}/files/startup-config.cfg"
-        response = await self.http_client.post(url, data=config)
+        response = await self._request("upload_config", "POST", url, data=config)
         
         if 200 <= response.status_code < 300:
             logger.info("Node %r config has been updated", node.name)
@@ -180,9 +478,31 @@ class GNS3Project:
             logger.error("Node %r config update has failed, error: %s", node.name, response.text)
             response.raise_for_status()
             
+    async def get_node_status(self, node: GNS3Node) -> NodeStatus:
+        url = f"{self.api_url}/nodes/{node.id}"
+        response = await self._request("get_node", "GET", url)
+        
+        if response.is_error:
+            logger.error("Node %r status is unavailable, error: %s", node.name, response.text)
+            response.raise_for_status()
+        
+        node = GNS3Node.load(response.json())
+        self._add_node(node)
+        return node.status
+    
+    async def get_compute_cpu_usage(self, compute_id: str = GNS3_COMPUTE_ID) -> float:
+        url = f"{self.root_api}/computes/{compute_id}"
+        response = await self._request("get_compute", "GET", url)
+        
+        if response.is_error:
+            logger.error("Compute %r is unavailable, error: %s", compute_id, response.text)
+            response.raise_for_status()
+        
+        return float(response.json().get("cpu_usage_percent") or 0.0)
+            
     async def start_node(self, node: GNS3Node) -> None: #, timeout: Optional[float] = None
         url = f"{self.api_url}/nodes/{node.id}/start"
-        response = await self.http_client.post(url)
+        response = await self._request("start_node", "POST", url)
         
         if 200 <= response.status_code < 300:
             logger.info("Node %r has started", node.name)
@@ -196,12 +516,13 @@ class GNS3Project:
     async def delete_node(self, node_name: Optional[str] = None, node_id: Optional[str] = None) -> None:
         if node_id:
             url = f"{self.api_url}/nodes/{node_id}"
-            response = await self.http_client.delete(url)
+            response = await self._request("delete_node", "DELETE", url)
             node_str = node_name or node_id
             if response.is_error:
                 logger.error("Failed to delete a node %r", node_str)
                 response.raise_for_status()
             else:
+                self._remove_node(node_id)
                 logger.info("Node %r has been deleted", node_str)
         elif node_name:
                 node = self.name_to_node[node_name]
@@ -209,9 +530,24 @@ class GNS3Project:
         else:
             raise ValueError("Either node name or ID should be provisioned")
         
+    async def delete_link(self, link: GNS3Link) -> None:
+        url = f"{self.api_url}/links/{link.id}"
+        response = await self._request("delete_link", "DELETE", url)
+        
+        if response.is_error:
+            logger.error("Failed to delete link %s, error: %s", link, response.text)
+            response.raise_for_status()
+        else:
+            self._remove_link(link)
+            logger.info("Link %s has been deleted", link)
+        
     async def provision_router(self, device: "Device", template: "Template") -> None: 
         #, sema: "Semaphore" (Don't need semaphore as httpx is using it internally)
         #async with sema:
+        with tracing.span("provision", "gns3", track=device.hostname):
+            await self._provision_router(device, template)
+            
+    async def _provision_router(self, device: "Device", template: "Template") -> None:
         router_name = device.hostname
         switch = device.find_switch(self.name_to_node)
         coordinates = device.calculate_coordinates(switch)
@@ -236,7 +572,8 @@ class GNS3Project:
         
         # If the router has already been created then, update the configuration of the router
         if router_created or utils.is_env_var("ALWAYS_UPDATE_ROUTER_CFG"):
-            router_config = template.render(device=device)
+            with tracing.span("render", "render"):
+                router_config = template.render(device=device)
             await self.update_node_config(node=router, config=router_config)
             
             # When do we want to start the node?
@@ -246,9 +583,12 @@ class GNS3Project:
 
     async def start_all_nodes(self) -> None:
         url = f"{self.api_url}/nodes/start"
-        response = await self.http_client.post(url)
+        response = await self._request("start_all", "POST", url)
         
         if 200 <= response.status_code < 300:
+            for node in list(self.nodes):
+                if not node.is_switch:
+                    self._set_status(node, NodeStatus.STARTED)
             logger.info("All nodes have been started")
         else:
             logger.error("Failed to start all nodes: %s", response.text)
@@ -256,23 +596,51 @@ class GNS3Project:
             
     async def stop_all_nodes(self) -> None:
         url = f"{self.api_url}/nodes/stop"
-        response = await self.http_client.post(url)
+        response = await self._request("stop_all", "POST", url)
         
         if response.is_error:
             logger.error("Failed to stop all nodes: %s", response.text)
             response.raise_for_status()
         else:
+            # The next start reads statuses from the snapshot saved on exit
+            for node in list(self.nodes):
+                if not node.is_switch:
+                    self._set_status(node, NodeStatus.STOPPED)
             logger.info("All nodes have been stopped")
             
-    async def add_routers(self, devices: List["Device"], template: "Template") -> None:
-        ## No Need for semaphore as httpx is performing it internally
-        #semaphore = asyncio.BoundedSemaphore(20)
-        #tasks = [asyncio.create_task(self.provision_router(device, template=template, sema=semaphore)) for device in devices]
-        #await asyncio.gather(*tasks)
-        
-        for device in devices:
-            await self.provision_router(device, template=template)
-        logger.info("Finished provisioning %d devices", len(devices))
+    async def add_routers(self, devices: List["Device"], template: "Template", max_in_flight: Optional[int] = GNS3_PROVISION_MAX_IN_FLIGHT) -> Dict[str, Exception]:
+        """
+        Provision routers, keeping up to `max_in_flight` devices in progress at once.
+        
+        Each device still runs its create -> rename -> link -> config chain in order.
+        A failing device does not abort the batch, its exception is returned keyed by hostname.
+        Pass `max_in_flight=None` to provision devices one at a time.
+        """
+        failures: Dict[str, Exception] = {}
+        
+        async def provision(device: "Device") -> None:
+            start = time.perf_counter()
+            metrics.IN_FLIGHT.labels("provision").inc()
+            try:
+                await self.provision_router(device, template=template)
+            except Exception as exc:
+                logger.error("Device %r failed to provision: %r", device.hostname, exc)
+                failures[device.hostname] = exc
+            finally:
+                metrics.IN_FLIGHT.labels("provision").dec()
+                metrics.observe("provision", "router", time.perf_counter() - start, ok=device.hostname not in failures)
+        
+        if max_in_flight is None:
+            for device in devices:
+                await provision(device)
+        else:
+            semaphore = asyncio.BoundedSemaphore(max_in_flight)
+            provision_with_sema = utils.with_semaphore(semaphore)(provision)
+            tasks = [asyncio.create_task(provision_with_sema(device)) for device in devices]
+            await asyncio.gather(*tasks)
+            
+        logger.info("Finished provisioning %d devices, %d failed", len(devices), len(failures))
+        return failures
 
     async def delete_nodes(self, node_names: Iterable[str]) -> None:
         tasks = [asyncio.create_task(self.delete_node(node_name=node_name))
@@ -282,13 +650,30 @@ class GNS3Project:
         await asyncio.gather(*tasks)
         
         
-    async def staggered_start(self) -> None:
-        semaphore = asyncio.BoundedSemaphore(25)
-        start_node_with_sema = utils.with_semaphore(semaphore=semaphore, timeout=30, random_timeout=True)(self.start_node)
-        tasks = []
-        for node in self.nodes:
-            if not node.is_started:
-                task = asyncio.create_task(start_node_with_sema(node))
-                tasks.append(task)
-        await asyncio.gather(*tasks)
-        logger.info("All nodes have been started")
\ No newline at end of file
+    async def staggered_start(
+        self, 
+        max_in_flight: int = GNS3_START_MAX_IN_FLIGHT, 
+        name_to_host: Optional[Dict[str, str]] = None, 
+        expected_boot_time: float = 60.0,
+        max_cpu_percent: Optional[float] = None
+        ) -> Dict[str, Exception]:
+        """
+        Start every stopped node, releasing a slot as soon as a node has booted rather than after a fixed pause.
+        
+        `name_to_host` maps node names to management IPs, nodes found there are only considered booted
+        once they accept SSH or telnet connections.
+        """
+        scheduler = StartScheduler(
+            self, 
+            name_to_host=name_to_host, 
+            max_in_flight=max_in_flight, 
+            expected_boot_time=expected_boot_time, 
+            max_cpu_percent=max_cpu_percent
+        )
+        nodes = [node for node in self.nodes if not node.is_started]
+        failures = await scheduler.run(nodes)
+        if failures:
+            logger.warning("Started %d/%d nodes, %d failed", len(nodes) - len(failures), len(nodes), len(failures))
+        else:
+            logger.info("Started %d nodes", len(nodes))
+        return failures
@@ -0,0 +1,174 @@
+import codecs
+import hashlib
+import json
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple, TYPE_CHECKING
+import attr
+
+from app.gns3_node import GNS3Node
+from app.gns3_link import GNS3Link
+
+if TYPE_CHECKING:
+    import httpx
+
+_WHITESPACE = " \t\n\r"
+# Elements that end with their own closing character, complete as soon as they decode
+_DELIMITED_STARTS = "{[\""
+
+
+class JsonArrayReader:
+    """
+    Incrementally decode the elements of a top-level JSON array from byte chunks.
+    
+    Only the unparsed tail of the stream is buffered, so memory stays bounded by the largest element
+    instead of the whole response body.
+    """
+    def __init__(self) -> None:
+        self._decoder = json.JSONDecoder()
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._chunks: List[str] = []
+        self._size = 0
+        # An incomplete element is only decoded again once the buffer has doubled, so large ones stay linear
+        self._retry_size = 0
+        self._started = False
+        self._finished = False
+        
+    def feed(self, chunk: bytes) -> List[Any]:
+        self._append(self._text_decoder.decode(chunk))
+        if self._size < self._retry_size:
+            return []
+        return self._drain(final=False)
+    
+    def close(self) -> List[Any]:
+        self._append(self._text_decoder.decode(b"", final=True))
+        items = self._drain(final=True)
+        if not self._finished:
+            raise ValueError("JSON array was not terminated")
+        return items
+
+    def _append(self, text: str) -> None:
+        if text:
+            self._chunks.append(text)
+            self._size += len(text)
+    
+    def _drain(self, final: bool) -> List[Any]:
+        items: List[Any] = []
+        buffer = "".join(self._chunks)
+        pos = 0
+        end = len(buffer)
+        self._retry_size = 0
+        while not self._finished:
+            while pos < end and (buffer[pos] in _WHITESPACE or (self._started and buffer[pos] == ",")):
+                pos += 1
+            if pos == end:
+                break
+            if not self._started:
+                if buffer[pos] != "[":
+                    raise ValueError(f"Expected a JSON array, got {buffer[pos]!r}")
+                self._started = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                self._finished = True
+                pos += 1
+                break
+            try:
+                item, item_end = self._decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                item_end = None
+            # A number running up to the end of the buffer may continue in the next chunk
+            if item_end is None or (item_end == end and not final and buffer[pos] not in _DELIMITED_STARTS):
+                self._retry_size = 2 * (end - pos)
+                break
+            items.append(item)
+            pos = item_end
+        tail = buffer[pos:]
+        self._chunks = [tail] if tail else []
+        self._size = len(tail)
+        return items
+
+
+def iter_json_array(chunks: Iterable[bytes]) -> Iterator[Any]:
+    reader = JsonArrayReader()
+    for chunk in chunks:
+        yield from reader.feed(chunk)
+    yield from reader.close()
+
+
+async def aiter_json_array(chunks: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    reader = JsonArrayReader()
+    async for chunk in chunks:
+        for item in reader.feed(chunk):
+            yield item
+    for item in reader.close():
+        yield item
+
+
+@attr.s(auto_attribs=True, kw_only=True, frozen=True)
+class Validator:
+    """What a listing looked like when it was last fetched, to tell whether it has changed since."""
+    etag: Optional[str] = None
+    digest: Optional[str] = None
+
+
+async def _hash_chunks(chunks: AsyncIterator[bytes], digest: "hashlib._Hash") -> AsyncIterator[bytes]:
+    async for chunk in chunks:
+        digest.update(chunk)
+        yield chunk
+
+
+def _conditional_headers(validator: Optional[Validator]) -> Dict[str, str]:
+    if validator is None or validator.etag is None:
+        return {}
+    return {"If-None-Match": validator.etag}
+
+
+def _is_unchanged(validator: Optional[Validator], new_validator: Validator) -> bool:
+    return validator is not None and validator.digest == new_validator.digest
+
+
+async def stream_nodes(
+    http_client: "httpx.AsyncClient",
+    url: str,
+    validator: Optional[Validator] = None
+    ) -> Tuple[Optional[Tuple[Dict[str, GNS3Node], Dict[str, GNS3Node]]], Optional[Validator]]:
+    """
+    Nodes by name and by ID, or None when the listing has not changed since `validator`, along with its new validator.
+
+    The controller can answer 304 to skip the transfer, otherwise the body is compared by digest.
+    """
+    name_to_node: Dict[str, GNS3Node] = {}
+    id_to_node: Dict[str, GNS3Node] = {}
+    digest = hashlib.sha256()
+    async with http_client.stream("GET", url, headers=_conditional_headers(validator)) as response:
+        if response.status_code == 304:
+            return None, validator
+        response.raise_for_status()
+        async for node_data in aiter_json_array(_hash_chunks(response.aiter_bytes(), digest)):
+            node = GNS3Node.load(node_data)
+            name_to_node[node.name] = node
+            id_to_node[node.id] = node
+        new_validator = Validator(etag=response.headers.get("etag"), digest=digest.hexdigest())
+    if _is_unchanged(validator, new_validator):
+        return None, new_validator
+    return (name_to_node, id_to_node), new_validator
+
+
+async def stream_links(
+    http_client: "httpx.AsyncClient",
+    url: str,
+    validator: Optional[Validator] = None
+    ) -> Tuple[Optional[Dict[Tuple[Any, ...], GNS3Link]], Optional[Validator]]:
+    """Links by alt ID, or None when the listing has not changed since `validator`, along with its new validator."""
+    alt_id_to_link: Dict[Tuple[Any, ...], GNS3Link] = {}
+    digest = hashlib.sha256()
+    async with http_client.stream("GET", url, headers=_conditional_headers(validator)) as response:
+        if response.status_code == 304:
+            return None, validator
+        response.raise_for_status()
+        async for link_data in aiter_json_array(_hash_chunks(response.aiter_bytes(), digest)):
+            link = GNS3Link.load(link_data)
+            alt_id_to_link[link.alt_id] = link
+        new_validator = Validator(etag=response.headers.get("etag"), digest=digest.hexdigest())
+    if _is_unchanged(validator, new_validator):
+        return None, new_validator
+    return alt_id_to_link, new_validator
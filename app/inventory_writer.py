@@ -0,0 +1,123 @@
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+import attr
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE_NAME = ".inventory-manifest.json"
+PARALLEL_WRITE_THRESHOLD = 64
+
+
+def dump_yaml(data: Any) -> str:
+    # JSON is a subset of YAML, and the C JSON encoder is orders of magnitude faster than a YAML dumper
+    return json.dumps(data, indent=1, default=str) + "\n"
+
+
+def content_hash(content: str) -> str:
+    return hashlib.blake2b(content.encode(), digest_size=16).hexdigest()
+
+
+@attr.s(auto_attribs=True, kw_only=True)
+class WriteStats:
+    written: int = 0
+    skipped: int = 0
+    removed: int = 0
+
+    def __str__(self) -> str:
+        return f"{self.written} written, {self.skipped} unchanged, {self.removed} removed"
+
+
+class InventoryWriter:
+    """
+    Writes inventory files under `dir_path`, each file once per run.
+
+    The content hash of every file is recorded in a manifest, files whose content has not changed since the
+    previous run are not rewritten, and files written by the previous run but not by this one are removed.
+    Data objects shared by many files, such as common host_vars, are serialised once.
+    """
+    def __init__(self, dir_path: str, max_workers: int = 8, prune: bool = True) -> None:
+        self.dir_path = Path(dir_path)
+        self.max_workers = max_workers
+        self.prune = prune
+        self.stats = WriteStats()
+        self.manifest_path = self.dir_path / MANIFEST_FILE_NAME
+        self.old_manifest: Dict[str, str] = self._load_manifest()
+        self.manifest: Dict[str, str] = {}
+        self._created_dirs: Set[Path] = set()
+
+    def __enter__(self) -> "InventoryWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        if exc_type is None:
+            self.close()
+
+    def _load_manifest(self) -> Dict[str, str]:
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _prepare(self, relative_path: str, content: str, digest: Optional[str] = None) -> Optional[Tuple[Path, str]]:
+        """Record `content` for `relative_path`, return where to write it or None if it is unchanged on disk."""
+        path = self.dir_path / relative_path
+        digest = digest or content_hash(content)
+        self.manifest[relative_path] = digest
+        if self.old_manifest.get(relative_path) == digest and path.exists():
+            self.stats.skipped += 1
+            return None
+        if path.parent not in self._created_dirs:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._created_dirs.add(path.parent)
+        self.stats.written += 1
+        return path, content
+
+    @staticmethod
+    def _write_file(path: Path, content: str) -> None:
+        with open(path, "w") as f:
+            f.write(content)
+
+    def write(self, relative_path: str, data: Any) -> None:
+        pending = self._prepare(relative_path, dump_yaml(data))
+        if pending is not None:
+            self._write_file(*pending)
+
+    def write_many(self, items: Iterable[Tuple[str, Any]]) -> None:
+        id_to_content: Dict[int, Tuple[Any, str, str]] = {}
+        pending = []
+        for relative_path, data in items:
+            # Keep a reference to data so its id cannot be reused by another object while cached
+            cached = id_to_content.get(id(data))
+            if cached is None:
+                content = dump_yaml(data)
+                cached = id_to_content[id(data)] = (data, content, content_hash(content))
+            item = self._prepare(relative_path, cached[1], cached[2])
+            if item is not None:
+                pending.append(item)
+        if len(pending) < PARALLEL_WRITE_THRESHOLD or self.max_workers <= 1:
+            for path, content in pending:
+                self._write_file(path, content)
+            return
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for _ in executor.map(lambda item: self._write_file(*item), pending):
+                pass
+
+    def close(self) -> None:
+        if self.prune:
+            for relative_path in self.old_manifest.keys() - self.manifest.keys():
+                try:
+                    os.remove(self.dir_path / relative_path)
+                except FileNotFoundError:
+                    continue
+                self.stats.removed += 1
+        self.dir_path.mkdir(parents=True, exist_ok=True)
+        with open(self.manifest_path, "w") as f:
+            json.dump(self.manifest, f)
+        logger.info("Inventory %s: %s", self.dir_path, self.stats)
@@ -1,11 +1,17 @@
-from typing import Dict, ValuesView
+import os
+from ipaddress import IPv4Network, ip_network
+from typing import List, Mapping, Optional, Union, ValuesView
 
-from app.device import Device
-from jinja2 import PackageLoader, Environment, Template
+from app.addressing import Address, AddressAllocator, GroupAddressAllocator, address_to_int
+from app.device import Device, Endpoint
+from app.device_table import DeviceTable, as_device_table
+from app.fake_ios import FleetMode, fleet_endpoints
+from jinja2 import Environment, Template
 from app.ansible import AnsibleGroup, AnsibleHost, AnsibleInventory
-from app.constants import ANSIBLE_GLOBAL_VARS, NORNIR_DEFAULT_VARS
+from app.constants import ANSIBLE_GLOBAL_VARS, NORNIR_DEFAULT_VARS, START_ROUTER_NUM, END_ROUTER_NUM, DEVICE_SSH_PORT
 from app.nornir import NornirInventory, NornirHost, NornirGroup, NornirDefaults
-from app.utils import create_random_data
+from app.payloads import HostPayloads, PayloadSpec, generate_payloads, payload_group_name
+from app.render import get_jinja_env, get_template
 from ruamel.yaml import YAML
 from pathlib import Path
 
@@ -14,85 +20,154 @@ yaml = YAML(typ="safe")
 yaml.default_flow_style = False
 
 class Lab:
-    def __init__(self, name_to_device: Dict[str, Device]) -> None:
+    def __init__(self, name_to_device: Mapping[str, Device], allocator: Optional[AddressAllocator] = None) -> None:
         self.name_to_device = name_to_device
+        self.allocator = allocator
         
     def get_device(self, device_name: str) -> Device:
         return self.name_to_device.get(device_name)
+
+    def get_device_by_ip(self, address: Address) -> Optional[Device]:
+        if self.allocator is not None:
+            num = self.allocator.device_at(address)
+            return None if num is None else self.get_device(str(num))
+        address = address_to_int(address)
+        return next((device for device in self.devices if int(device.mgmt_int.ip) == address), None)
+
+    def get_devices_in(self, subnet: Union[str, IPv4Network]) -> List[Device]:
+        if self.allocator is not None:
+            return [self.get_device(str(num)) for num in self.allocator.devices_in(subnet)]
+        subnet = ip_network(subnet)
+        return [device for device in self.devices if device.mgmt_int.ip in subnet]
     
     @property
     def devices(self) -> ValuesView[Device]:
         return self.name_to_device.values()
 
+    @property
+    def device_table(self) -> DeviceTable:
+        """The devices as a DeviceTable, for the batch accessors."""
+        return as_device_table(self.devices)
+
     @classmethod
-    def create(cls) -> "Lab":
-        name_to_device = Device.create_devices()
-        lab = cls(name_to_device=name_to_device)
+    def create(cls, allocator: Optional[GroupAddressAllocator] = None, num_devices: Optional[int] = None) -> "Lab":
+        """
+        The first `num_devices` routers of the lab, all of them by default or the number in LAB_NUM_DEVICES.
+
+        With LAB_FAKE_FLEET set to a FleetMode value the devices point at the fake IOS fleet.
+        """
+        if allocator is None:
+            allocator = GroupAddressAllocator()
+        if num_devices is None and os.getenv("LAB_NUM_DEVICES"):
+            num_devices = int(os.environ["LAB_NUM_DEVICES"])
+        end_num = END_ROUTER_NUM if num_devices is None else min(END_ROUTER_NUM, START_ROUTER_NUM + num_devices - 1)
+        name_to_device = DeviceTable.from_sequence_nums(range(START_ROUTER_NUM, end_num + 1), allocator=allocator)
+        lab = cls(name_to_device=name_to_device, allocator=allocator)
+        fake_fleet_mode = os.getenv("LAB_FAKE_FLEET")
+        if fake_fleet_mode:
+            lab.use_fake_fleet(FleetMode(fake_fleet_mode))
         return lab
+
+    def use_endpoints(self, name_to_endpoint: Mapping[str, Endpoint]) -> None:
+        for name, endpoint in name_to_endpoint.items():
+            self.get_device(name).set_endpoint(endpoint)
+
+    def use_fake_fleet(self, mode: FleetMode = FleetMode.LOOPBACK) -> None:
+        """Point every device at the fake IOS fleet, which is started on its own by scripts/fake_fleet.py."""
+        self.use_endpoints(fleet_endpoints(self.devices, mode))
     
     @property
     def jinja_env(self) -> Environment:
-        return Environment(loader=PackageLoader('app', 'templates'))
+        return get_jinja_env()
     
     def get_template(self, template_path: str) -> Template:
-        return self.jinja_env.get_template(template_path)
+        return get_template(template_path)
     
-    def build_ansible_inventories(self, dir_path: str, random_data: bool = False) -> None:
+    def create_host_payloads(self, payload_spec: PayloadSpec) -> HostPayloads:
+        return generate_payloads(self.device_table.names(), payload_spec)
+
+    def build_ansible_inventories(self, dir_path: str, random_data: bool = False, payload_spec: Optional[PayloadSpec] = None) -> None:
+        self.create_ansible_inventory(random_data=random_data, payload_spec=payload_spec).write_to_dir(dir_path)
+
+    def create_ansible_inventory(self, random_data: bool = False, payload_spec: Optional[PayloadSpec] = None) -> AnsibleInventory:
+        """
+        Build the all -> CORE -> Switch -> host inventory.
+
+        With `random_data` every distinct host payload becomes a group named after its content hash, holding the
+        payload as group vars, and the hosts that share it are its members.
+        """
         inventory = AnsibleInventory()
         inventory.root.add_vars(ANSIBLE_GLOBAL_VARS)
-        if random_data:
-            host_vars = create_random_data()
-        else:
-            host_vars = None
-        for device in self.devices:
-            ansible_host = AnsibleHost.from_device(device=device, vars=host_vars)
+        table = self.device_table
+        for name, host, port, conn_switch_name, core_router_name in zip(
+            table.names(), table.hosts(), table.ssh_ports(), table.connected_switch_names(), table.connected_core_router_names()
+        ):
+            ansible_host = inventory.add_host(AnsibleHost(name=name, host=host, port=port))
             
-            core_router_name = device.connected_core_router_name
             core_router_group = inventory.get_group(core_router_name)
             if core_router_group is None:
                 core_router_group = inventory.add_group(core_router_name)
             if core_router_group not in inventory.root:
                 inventory.root.add_group(core_router_group)
-            # core_router_group.add_host(ansible_host)
             
-            conn_switch_name = device.connected_switch_name
             switch_group = inventory.get_group(conn_switch_name)
             if switch_group is None:
                 switch_group = inventory.add_group(conn_switch_name)
             if switch_group not in core_router_group:
                 core_router_group.add_group(switch_group)
             switch_group.add_host(ansible_host)
-            if ansible_host.host_vars:
-                ansible_host.write_vars(inventory_dir=dir_path)
+
+        if random_data or payload_spec is not None:
+            payloads = self.create_host_payloads(payload_spec or PayloadSpec())
+            for digest, host_names in payloads.digest_to_hosts().items():
+                payload_group = inventory.root.add_group(inventory.add_group(payload_group_name(digest)))
+                payload_group.add_vars(payloads.digest_to_payload[digest])
+                for host_name in host_names:
+                    payload_group.add_host(inventory.name_to_host[host_name])
                 
-        inventory.write_to_dir(dir_path)
+        return inventory
 
-    def build_nornir_inventory(self, dir_path: str, host_data_separate: bool = True) -> None:
+    def build_nornir_inventory(self, dir_path: str, host_data_separate: bool = True, payload_spec: Optional[PayloadSpec] = None) -> None:
+        """
+        Write hosts, groups and defaults.
+
+        With `host_data_separate` each distinct host payload is written once, as the data of a group named after its
+        content hash that the hosts sharing it belong to, otherwise it is inlined in every host.
+        """
         inventory = NornirInventory(defaults=NornirDefaults(**NORNIR_DEFAULT_VARS))
-        random_data = create_random_data()
-        dir_path = Path(dir_path)
-        for device in self.devices:
+        payloads = self.create_host_payloads(payload_spec or PayloadSpec())
+        table = self.device_table
+        for name, host, port, switch_name, core_router_name in zip(
+            table.names(), table.hosts(), table.ssh_ports(), table.connected_switch_names(), table.connected_core_router_names()
+        ):
+            digest = payloads.host_to_digest[name]
+            groups = [switch_name]
+            if host_data_separate:
+                groups.append(payload_group_name(digest))
             nr_host = NornirHost(
-                name=device.name,
-                hostname=device.mgmt_int_ip,
-                groups=[device.connected_switch_name]
+                name=name,
+                hostname=host,
+                port=None if port == DEVICE_SSH_PORT else port,
+                groups=groups,
+                data=None if host_data_separate else payloads.digest_to_payload[digest]
             )
             inventory.add_host(nr_host)
             
-            if not inventory.contains_group(device.connected_core_router_name):
+            if not inventory.contains_group(core_router_name):
                 nr_group = NornirGroup(
-                    name=device.connected_core_router_name
+                    name=core_router_name
                 )
                 inventory.add_group(nr_group)
                 
-            if not inventory.contains_group(device.connected_switch_name):
+            if not inventory.contains_group(switch_name):
                 nr_group = NornirGroup(
-                    name=device.connected_switch_name,
-                    groups=[device.connected_core_router_name]
+                    name=switch_name,
+                    groups=[core_router_name]
                 )
                 inventory.add_group(nr_group)
+
+        if host_data_separate:
+            for digest, payload in payloads.digest_to_payload.items():
+                inventory.add_group(NornirGroup(name=payload_group_name(digest), data=payload))
                 
-                with open(dir_path / f"host_vars/{device.name}.yaml", "w") as f:
-                    yaml.dump(random_data, f)
-                
-            inventory.write_to_dir(dir_path="nornir/inventory")
\ No newline at end of file
+        inventory.write_to_dir(dir_path)
@@ -0,0 +1,343 @@
+"""
+In-process metrics: counters, gauges and latency histograms for controller calls, collectors and config pushes.
+
+Metrics are always recorded, an update costs a couple of microseconds. Set METRICS_PORT to serve
+them at http://127.0.0.1:<port>/metrics in the Prometheus text format, and METRICS_PROGRESS to print a one-line
+summary to stderr every second while a script runs (both via `start_from_env`).
+"""
+import atexit
+import http.server
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, TextIO, Tuple, Union
+
+from app import utils
+
+logger = logging.getLogger(__name__)
+
+METRICS_PORT_ENV = "METRICS_PORT"
+METRICS_PROGRESS_ENV = "METRICS_PROGRESS"
+
+# Histograms count integer microseconds in log-linear buckets: exact below 2 * HISTOGRAM_SUB_BUCKETS,
+# then HISTOGRAM_SUB_BUCKETS buckets per power of two, so any reported value is within 1/32 of the recorded one
+HISTOGRAM_SUB_BUCKETS = 32
+HISTOGRAM_MAX_VALUE = 2 ** 36 - 1  # about 19 hours in microseconds
+SUMMARY_QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+LabelValues = Tuple[str, ...]
+
+
+class Counter:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self) -> None:
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class Gauge:
+    """A value set by the instrumented code, or read from `function` whenever the gauge is exported."""
+    __slots__ = ("_value", "function", "_lock")
+
+    def __init__(self) -> None:
+        self._value = 0.0
+        self.function: Optional[Callable[[], float]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def value(self) -> float:
+        return self.function() if self.function is not None else self._value
+
+    def set(self, value: float) -> None:
+        self._value = value
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        with self._lock:
+            self._value -= amount
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self.function = function
+
+
+class Histogram:
+    """
+    Latency histogram in the style of HdrHistogram, with fixed memory and about 3% precision at any scale.
+
+    Durations are recorded in seconds and stored as microsecond counts, percentiles are read back from the buckets.
+    """
+    __slots__ = ("counts", "count", "sum", "max", "_lock")
+
+    NUM_BUCKETS = HISTOGRAM_SUB_BUCKETS * (HISTOGRAM_MAX_VALUE.bit_length() - HISTOGRAM_SUB_BUCKETS.bit_length() + 2)
+
+    def __init__(self) -> None:
+        self.counts = [0] * self.NUM_BUCKETS
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def bucket_index(micros: int) -> int:
+        shift = micros.bit_length() - HISTOGRAM_SUB_BUCKETS.bit_length()
+        if shift <= 0:
+            return micros
+        return HISTOGRAM_SUB_BUCKETS * shift + (micros >> shift)
+
+    @staticmethod
+    def bucket_upper_bound(index: int) -> int:
+        shift = index // HISTOGRAM_SUB_BUCKETS - 1
+        if shift <= 0:
+            return index
+        return ((index - HISTOGRAM_SUB_BUCKETS * shift + 1) << shift) - 1
+
+    def record(self, seconds: float) -> None:
+        micros = min(HISTOGRAM_MAX_VALUE, max(0, int(seconds * 1e6)))
+        index = self.bucket_index(micros)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def quantiles(self, quantiles: Sequence[float]) -> List[float]:
+        """Upper bounds of the buckets holding the given quantiles, in seconds, in one pass over the buckets."""
+        result: List[float] = []
+        if not self.count:
+            return [0.0] * len(quantiles)
+        targets = iter(sorted(quantiles))
+        target = next(targets)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            while seen >= target * self.count:
+                # The last bucket's bound can exceed what was actually recorded
+                result.append(min(self.bucket_upper_bound(index) / 1e6, self.max))
+                target = next(targets, None)
+                if target is None:
+                    return result
+        return result + [self.max] * (len(quantiles) - len(result))
+
+    def percentile(self, percent: float) -> float:
+        return self.quantiles([percent / 100])[0]
+
+
+Metric = Union[Counter, Gauge, Histogram]
+
+
+class Family:
+    """A metric with one child per combination of label values, created on first use."""
+    def __init__(self, name: str, help: str, kind: str, label_names: Sequence[str], factory: Callable[[], Metric]) -> None:
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.label_names = tuple(label_names)
+        self.factory = factory
+        self.children: Dict[LabelValues, Metric] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str) -> Metric:
+        child = self.children.get(values)
+        if child is None:
+            with self._lock:
+                child = self.children.setdefault(values, self.factory())
+        return child
+
+    def items(self) -> Iterator[Tuple[LabelValues, Metric]]:
+        # Children can be added from other threads while exporting
+        return iter(list(self.children.items()))
+
+    def format_labels(self, values: LabelValues, **extra: str) -> str:
+        pairs = [*zip(self.label_names, values), *extra.items()]
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in pairs) + "}"
+
+
+def escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.families: Dict[str, Family] = {}
+
+    def _family(self, name: str, help: str, kind: str, label_names: Sequence[str], factory: Callable[[], Metric]) -> Family:
+        if name not in self.families:
+            self.families[name] = Family(name, help, kind, label_names, factory)
+        return self.families[name]
+
+    def counter(self, name: str, help: str, label_names: Sequence[str] = ()) -> Family:
+        return self._family(name, help, "counter", label_names, Counter)
+
+    def gauge(self, name: str, help: str, label_names: Sequence[str] = ()) -> Family:
+        return self._family(name, help, "gauge", label_names, Gauge)
+
+    def histogram(self, name: str, help: str, label_names: Sequence[str] = ()) -> Family:
+        # Exported as a summary, quantiles are what HDR buckets are good at
+        return self._family(name, help, "summary", label_names, Histogram)
+
+    def exposition(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines: List[str] = []
+        for family in list(self.families.values()):
+            lines.append(f"# HELP {family.name} {family.help}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            for values, metric in family.items():
+                if isinstance(metric, Histogram):
+                    for quantile, value in zip(SUMMARY_QUANTILES, metric.quantiles(SUMMARY_QUANTILES)):
+                        lines.append(f"{family.name}{family.format_labels(values, quantile=str(quantile))} {value:.6f}")
+                    lines.append(f"{family.name}_sum{family.format_labels(values)} {metric.sum:.6f}")
+                    lines.append(f"{family.name}_count{family.format_labels(values)} {metric.count}")
+                else:
+                    lines.append(f"{family.name}{family.format_labels(values)} {metric.value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+OPERATIONS = REGISTRY.counter("lab_operations_total", "Finished operations by outcome, ok, failed or retried", ("component", "operation", "outcome"))
+DURATIONS = REGISTRY.histogram("lab_operation_duration_seconds", "Duration of finished operations, retries included", ("component", "operation"))
+IN_FLIGHT = REGISTRY.gauge("lab_in_flight", "Operations in progress", ("component",))
+QUEUE_DEPTH = REGISTRY.gauge("lab_queue_depth", "Operations waiting for a slot", ("component",))
+SSH_SESSIONS = REGISTRY.gauge("lab_ssh_sessions_active", "Open device sessions")
+
+
+def observe(component: str, operation: str, duration: float, ok: bool = True) -> None:
+    OPERATIONS.labels(component, operation, "ok" if ok else "failed").inc()
+    DURATIONS.labels(component, operation).record(duration)
+
+
+def retried(component: str, operation: str) -> None:
+    OPERATIONS.labels(component, operation, "retried").inc()
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    registry: Registry = REGISTRY
+
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.registry.exposition().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def start_http_server(port: int, host: str = "127.0.0.1", registry: Registry = REGISTRY) -> http.server.ThreadingHTTPServer:
+    """Serve /metrics from a daemon thread, so scrapes never wait for the event loop or block it."""
+    handler = type("Handler", (_Handler,), {"registry": registry})
+    server = http.server.ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info("Serving metrics at http://%s:%d/metrics", host, server.server_address[1])
+    return server
+
+
+class ProgressLine:
+    """
+    Prints every `interval` seconds, per component: finished, failed and retried operations, the rate since the
+    last line, in-flight and queued operations, and p50/p99 of the component's busiest operation.
+
+    Operations of a component are peers, e.g. the controller endpoints of "gns3", so their counts add up.
+
+    On a terminal the line is redrawn in place.
+    """
+    def __init__(self, registry: Registry = REGISTRY, interval: float = 1.0, stream: Optional[TextIO] = None) -> None:
+        self.registry = registry
+        self.interval = interval
+        self.stream = stream or sys.stderr
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_done: Dict[str, int] = {}
+        self._last_time = time.monotonic()
+
+    def format(self) -> str:
+        now = time.monotonic()
+        elapsed = max(now - self._last_time, 1e-9)
+        self._last_time = now
+        component_to_outcomes: Dict[str, Dict[str, int]] = {}
+        for (component, _, outcome), counter in OPERATIONS.items():
+            outcomes = component_to_outcomes.setdefault(component, {})
+            outcomes[outcome] = outcomes.get(outcome, 0) + counter.value
+        parts = []
+        for component, outcomes in sorted(component_to_outcomes.items()):
+            done = outcomes.get("ok", 0) + outcomes.get("failed", 0)
+            rate = (done - self._last_done.get(component, 0)) / elapsed
+            self._last_done[component] = done
+            part = f"{component} {outcomes.get('ok', 0)} ok {outcomes.get('failed', 0)} failed {outcomes.get('retried', 0)} retried {rate:.0f}/s"
+            in_flight = IN_FLIGHT.children.get((component,))
+            if in_flight is not None:
+                part += f" in flight {in_flight.value:.0f}"
+            queue_depth = QUEUE_DEPTH.children.get((component,))
+            if queue_depth is not None:
+                part += f" queued {queue_depth.value:.0f}"
+            busiest = max(
+                ((operation, histogram) for (histogram_component, operation), histogram in DURATIONS.items() if histogram_component == component),
+                key=lambda item: item[1].count, default=None
+            )
+            if busiest is not None:
+                p50, p99 = busiest[1].quantiles([0.5, 0.99])
+                part += f" {busiest[0]} p50 {format_duration(p50)} p99 {format_duration(p99)}"
+            parts.append(part)
+        ssh_sessions = SSH_SESSIONS.labels().value
+        if ssh_sessions:
+            parts.append(f"{ssh_sessions:.0f} sessions open")
+        return " | ".join(parts)
+
+    def print(self) -> None:
+        line = self.format()
+        if not line:
+            return
+        if self.stream.isatty():
+            self.stream.write(f"\r\x1b[K{line}")
+        else:
+            self.stream.write(f"{line}\n")
+        self.stream.flush()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.print()
+
+    def start(self) -> "ProgressLine":
+        self._thread = threading.Thread(target=self._run, name="metrics-progress", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.print()
+        if self.stream.isatty():
+            self.stream.write("\n")
+
+
+def format_duration(seconds: float) -> str:
+    return f"{seconds * 1000:.0f}ms" if seconds < 1 else f"{seconds:.1f}s"
+
+
+def start_from_env() -> None:
+    """Start the HTTP endpoint when METRICS_PORT is set and the progress line, until exit, when METRICS_PROGRESS is."""
+    port = os.getenv(METRICS_PORT_ENV)
+    if port:
+        start_http_server(int(port))
+    if utils.is_env_var(METRICS_PROGRESS_ENV):
+        atexit.register(ProgressLine().start().stop)
@@ -1,6 +1,7 @@
 from ruamel.yaml import YAML
 from typing import Dict, Optional, Any, List
 from pathlib import Path
+from app.inventory_writer import InventoryWriter
 
 
 yaml = YAML(typ="safe")
@@ -15,11 +16,12 @@ class NornirData:
             yaml.dump(self.data, f)
 
 class InventoryElement:
-    def __init__(self, name: Optional[str] = None, username: Optional[str] = None, password: Optional[str] = None, hostname: Optional[str] = None, platform: Optional[str] = None, groups: Optional[List[str]] = None, data: Optional[NornirData] = None) -> None:
+    def __init__(self, name: Optional[str] = None, username: Optional[str] = None, password: Optional[str] = None, hostname: Optional[str] = None, platform: Optional[str] = None, groups: Optional[List[str]] = None, data: Optional[NornirData] = None, port: Optional[int] = None) -> None:
         self.name = name
         self.username = username
         self.password = password
         self.hostname = hostname
+        self.port = port
         self.platform = platform
         self.groups = groups
         self.data = data
@@ -28,6 +30,8 @@ class InventoryElement:
         data = {}
         if self.hostname:
             data['hostname'] = self.hostname
+        if self.port:
+            data['port'] = self.port
         if self.username:
             data['username'] = self.username
         if self.password:
@@ -37,7 +41,7 @@ class InventoryElement:
         if self.groups:
             data['groups'] = self.groups
         if self.data:
-            data['data'] = self.data
+            data['data'] = self.data.data if isinstance(self.data, NornirData) else self.data
         
         return data
 
@@ -73,24 +77,14 @@ class NornirInventory:
     def contains_group(self, group_name: str) -> bool:
         return group_name in self.groups
         
-    def write_to_dir(self, dir_path: str) -> None:
-        dir_path = Path(dir_path)
+    def write_to_dir(self, dir_path: str, writer: Optional[InventoryWriter] = None) -> None:
+        if writer is None:
+            with InventoryWriter(dir_path) as writer:
+                self.write_to_dir(dir_path, writer=writer)
+            return
         if self.hosts:
-            hosts_data = {
-                host.name: host.dump() for host in self.hosts.values()
-            }
-            hosts_file_path = dir_path / "hosts.yaml"
-            with open(hosts_file_path, 'w') as f:
-                yaml.dump(hosts_data, f)
+            writer.write("hosts.yaml", {host.name: host.dump() for host in self.hosts.values()})
         if self.groups:
-            groups_data = {
-                group.name: group.dump() for group in self.groups.values()
-            }
-            groups_file_path = dir_path / "groups.yaml"
-            with open(groups_file_path, 'w') as f:
-                yaml.dump(groups_data, f)
+            writer.write("groups.yaml", {group.name: group.dump() for group in self.groups.values()})
         if self.defaults:
-            defaults_data = self.defaults.dump()
-            default_file_path = dir_path / "default.yaml"
-            with open(default_file_path, 'w') as f:
-                yaml.dump(defaults_data, f)
+            writer.write("defaults.yaml", self.defaults.dump())
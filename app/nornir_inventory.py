@@ -0,0 +1,79 @@
+import logging
+from typing import Dict, Optional
+
+from nornir.core.inventory import Defaults, Group, Groups, Host, Hosts, Inventory, ParentGroups
+from nornir.core.plugins.inventory import InventoryPluginRegister
+
+from app.constants import NORNIR_DEFAULT_VARS
+from app.lab import Lab
+from app.payloads import DEFAULT_PAYLOAD_BYTES_PER_HOST, HostPayloads, PayloadSpec, payload_group_name
+
+logger = logging.getLogger(__name__)
+
+PLUGIN_NAME = "LabInventory"
+
+
+class LabInventory:
+    """
+    Nornir inventory plugin that builds hosts, groups and defaults straight from Lab.create().
+
+    With `random_data` every distinct payload is the data of a group named after its content hash, the same groups
+    Lab.build_nornir_inventory writes, shared by the hosts of that group so `task.host["random"]` works without reading any file.
+    """
+    def __init__(
+        self,
+        random_data: bool = False,
+        bytes_per_host: int = DEFAULT_PAYLOAD_BYTES_PER_HOST,
+        shared_fraction: float = 1.0,
+        seed: int = 0,
+        lab: Optional[Lab] = None
+        ) -> None:
+        self.payload_spec = PayloadSpec(bytes_per_host=bytes_per_host, shared_fraction=shared_fraction, seed=seed) if random_data else None
+        self.lab = lab
+
+    def load(self) -> Inventory:
+        lab = self.lab or Lab.create()
+        defaults = Defaults(data={}, connection_options={}, **NORNIR_DEFAULT_VARS)
+        groups = Groups()
+        hosts = Hosts()
+        table = lab.device_table
+        payloads = HostPayloads() if self.payload_spec is None else lab.create_host_payloads(self.payload_spec)
+        digest_to_group: Dict[str, Group] = {}
+        for name, host, port, switch_name, core_router_name in zip(
+            table.names(), table.hosts(), table.ssh_ports(), table.connected_switch_names(), table.connected_core_router_names()
+        ):
+            core_router_group = groups.get(core_router_name)
+            if core_router_group is None:
+                core_router_group = groups[core_router_name] = Group(name=core_router_name, defaults=defaults)
+            switch_group = groups.get(switch_name)
+            if switch_group is None:
+                switch_group = groups[switch_name] = Group(
+                    name=switch_name,
+                    groups=ParentGroups([core_router_group]),
+                    defaults=defaults
+                )
+            parent_groups = [switch_group]
+            digest = payloads.host_to_digest.get(name)
+            if digest is not None:
+                payload_group = digest_to_group.get(digest)
+                if payload_group is None:
+                    group_name = payload_group_name(digest)
+                    payload_group = digest_to_group[digest] = groups[group_name] = Group(
+                        name=group_name,
+                        data=payloads.digest_to_payload[digest],
+                        defaults=defaults
+                    )
+                parent_groups.append(payload_group)
+            hosts[name] = Host(
+                name=name,
+                hostname=host,
+                port=port,
+                groups=ParentGroups(parent_groups),
+                defaults=defaults,
+                connection_options={}
+            )
+        logger.info("Nornir inventory with %d hosts and %d groups built from the lab", len(hosts), len(groups))
+        return Inventory(hosts=hosts, groups=groups, defaults=defaults)
+
+
+InventoryPluginRegister.register(PLUGIN_NAME, LabInventory)
@@ -0,0 +1,68 @@
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from nornir.core.inventory import Host
+from nornir.core.task import AggregatedResult, MultiResult, Task
+
+from app.collector import CommandResult, DeviceResult
+from app.results_store import ResultsStore, RunBatchWriter
+
+
+class ResultsStoreProcessor:
+    """
+    Nornir processor that writes the output of every command subtask to a new run of the results store.
+
+    A subtask is a command when it has a `command_string` parameter, as netmiko_send_command does. The results of
+    a host are written once its task instance completes, failed commands are stored with their error.
+    """
+    def __init__(self, store: Optional[ResultsStore] = None, run_id: Optional[str] = None, batch_size: int = 200) -> None:
+        self.writer = RunBatchWriter(store, run_id=run_id, batch_size=batch_size)
+        self._host_to_results: Dict[str, List[CommandResult]] = {}
+        self._starts: Dict[Tuple[str, int], float] = {}
+        # Nornir runs every host in its own thread
+        self._lock = threading.Lock()
+
+    @property
+    def run_id(self) -> str:
+        return self.writer.run_id
+
+    def task_started(self, task: Task) -> None:
+        pass
+
+    def task_completed(self, task: Task, result: AggregatedResult) -> None:
+        self.writer.flush()
+
+    def task_instance_started(self, task: Task, host: Host) -> None:
+        with self._lock:
+            self._host_to_results[host.name] = []
+            self._starts[(host.name, id(task))] = time.monotonic()
+
+    def task_instance_completed(self, task: Task, host: Host, result: MultiResult) -> None:
+        with self._lock:
+            results = self._host_to_results.pop(host.name, [])
+            start = self._starts.pop((host.name, id(task)), None)
+        duration = time.monotonic() - start if start is not None else 0.0
+        self.writer.write(DeviceResult(name=host.name, host=host.hostname, results=results, num_attempts=1, duration=duration))
+
+    def subtask_instance_started(self, task: Task, host: Host) -> None:
+        if "command_string" in task.params:
+            with self._lock:
+                self._starts[(host.name, id(task))] = time.monotonic()
+
+    def subtask_instance_completed(self, task: Task, host: Host, result: MultiResult) -> None:
+        command = task.params.get("command_string")
+        if command is None:
+            return
+        with self._lock:
+            start = self._starts.pop((host.name, id(task)), None)
+            duration = time.monotonic() - start if start is not None else 0.0
+            if result.failed:
+                error = str(result.exception or result.result)
+                command_result = CommandResult(command=command, duration=duration, error=error)
+            else:
+                command_result = CommandResult(command=command, output=result.result, duration=duration)
+            self._host_to_results.setdefault(host.name, []).append(command_result)
+
+    def close(self) -> None:
+        self.writer.close()
@@ -0,0 +1,473 @@
+import csv
+import logging
+import os
+import pickle
+import re
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Type, TYPE_CHECKING
+
+import attr
+
+from app.constants import PARSE_CACHE_PATH
+from app.render import chunked, create_process_pool
+from app.results_store import content_digest
+
+if TYPE_CHECKING:
+    from app.results_store import RunReader
+
+logger = logging.getLogger(__name__)
+
+# Bump when a parser changes its output, cached rows of other versions are parsed again
+PARSER_VERSION = 1
+PARSE_CHUNK_SIZE = 200
+# Below this many outputs to parse starting worker processes costs more than it saves
+MIN_OUTPUTS_FOR_POOL = 1000
+
+IP = r"\d+\.\d+\.\d+\.\d+"
+
+
+@attr.s(auto_attribs=True, kw_only=True, frozen=True, slots=True)
+class VersionInfo:
+    hostname: Optional[str] = None
+    version: Optional[str] = None
+    image: Optional[str] = None
+    model: Optional[str] = None
+    uptime: Optional[str] = None
+    processor_board_id: Optional[str] = None
+    config_register: Optional[str] = None
+
+
+@attr.s(auto_attribs=True, kw_only=True, frozen=True, slots=True)
+class IpInterface:
+    interface: str
+    ip_address: Optional[str]
+    ok: bool
+    method: str
+    status: str
+    protocol: str
+
+
+@attr.s(auto_attribs=True, kw_only=True, frozen=True, slots=True)
+class MemoryPool:
+    name: str
+    head: int
+    total: int
+    used: int
+    free: int
+    lowest: int
+    largest: int
+
+
+@attr.s(auto_attribs=True, kw_only=True, frozen=True, slots=True)
+class ArpEntry:
+    protocol: str
+    address: str
+    age: Optional[int]
+    mac: Optional[str]
+    type: str
+    interface: Optional[str]
+
+
+@attr.s(auto_attribs=True, kw_only=True, frozen=True, slots=True)
+class Route:
+    code: str
+    prefix: str
+    distance: Optional[int] = None
+    metric: Optional[int] = None
+    next_hop: Optional[str] = None
+    interface: Optional[str] = None
+
+
+@attr.s(auto_attribs=True, kw_only=True, frozen=True, slots=True)
+class Interface:
+    name: str
+    status: str
+    protocol: str
+    hardware: Optional[str] = None
+    mac: Optional[str] = None
+    ip_address: Optional[str] = None
+    mtu: Optional[int] = None
+    bandwidth_kbit: Optional[int] = None
+    input_packets: Optional[int] = None
+    input_bytes: Optional[int] = None
+    output_packets: Optional[int] = None
+    output_bytes: Optional[int] = None
+    input_errors: Optional[int] = None
+    output_errors: Optional[int] = None
+
+
+VERSION_PATTERNS = {
+    "version": re.compile(r", Version ([^,\s]+)"),
+    "uptime": re.compile(r"^(\S+) uptime is (.+)$", re.M),
+    "image": re.compile(r'^System image file is "([^"]+)"', re.M),
+    "model": re.compile(r"^[Cc]isco (\S+) .*processor", re.M),
+    "processor_board_id": re.compile(r"^Processor board ID (\S+)", re.M),
+    "config_register": re.compile(r"^Configuration register is (\S+)", re.M),
+}
+
+
+def parse_show_version(text: str) -> List[VersionInfo]:
+    fields = {}
+    for name, pattern in VERSION_PATTERNS.items():
+        match = pattern.search(text)
+        if match is None:
+            continue
+        if name == "uptime":
+            fields["hostname"], fields["uptime"] = match.group(1), match.group(2).strip()
+        else:
+            fields[name] = match.group(1)
+    return [VersionInfo(**fields)] if fields else []
+
+
+IP_INTERFACE_RE = re.compile(r"^(\S+)\s+(\S+)\s+(YES|NO)\s+(\S+)\s+(.+?)\s+(up|down)\s*$", re.M)
+
+
+def parse_show_ip_int_br(text: str) -> List[IpInterface]:
+    return [
+        IpInterface(
+            interface=interface,
+            ip_address=None if ip_address == "unassigned" else ip_address,
+            ok=ok == "YES",
+            method=method,
+            status=status,
+            protocol=protocol
+        )
+        for interface, ip_address, ok, method, status, protocol in IP_INTERFACE_RE.findall(text)
+    ]
+
+
+MEMORY_POOL_RE = re.compile(r"^\s*(\S.*?)\s+([0-9A-Fa-f]+)\s+(\d+)\s+(\d+)\s+(\d+)\s+(\d+)\s+(\d+)\s*$", re.M)
+
+
+def parse_show_memory_statistics(text: str) -> List[MemoryPool]:
+    return [
+        MemoryPool(
+            name=name, head=int(head, 16), total=int(total), used=int(used),
+            free=int(free), lowest=int(lowest), largest=int(largest)
+        )
+        for name, head, total, used, free, lowest, largest in MEMORY_POOL_RE.findall(text)
+    ]
+
+
+ARP_RE = re.compile(rf"^(\S+)\s+({IP})\s+(\d+|-)\s+(\S+)\s+(\S+)(?:[ \t]+(\S+))?[ \t]*$", re.M)
+
+
+def parse_show_arp(text: str) -> List[ArpEntry]:
+    return [
+        ArpEntry(
+            protocol=protocol,
+            address=address,
+            age=None if age == "-" else int(age),
+            mac=None if mac == "Incomplete" else mac,
+            type=entry_type,
+            interface=interface or None
+        )
+        for protocol, address, age, mac, entry_type, interface in ARP_RE.findall(text)
+    ]
+
+
+SUBNETTED_RE = re.compile(rf"^\s+{IP}/(\d+) is (variably )?subnetted")
+ROUTE_RE = re.compile(rf"^(?P<code>[A-Za-z*+%]+(?: [A-Z0-9*]{{1,2}})?)\s+(?P<network>{IP})(?:/(?P<prefixlen>\d+))?\s+(?P<rest>.*)$")
+NEXT_HOP_RE = re.compile(rf"^\s*\[(\d+)/(\d+)\] via ({IP})(.*)$")
+CONNECTED_RE = re.compile(r"^\s*is directly connected, (\S+)")
+AGE_RE = re.compile(r"^[\d:wdhmy]+$")
+
+
+def _next_hop_fields(rest: str) -> Optional[Dict[str, Any]]:
+    match = NEXT_HOP_RE.match(rest)
+    if match is not None:
+        distance, metric, next_hop, tail = match.groups()
+        # The tail is an optional age and an optional outgoing interface, both after a comma
+        parts = [part.strip() for part in tail.split(",") if part.strip()]
+        interface = parts[-1] if parts and not AGE_RE.match(parts[-1]) else None
+        return {"distance": int(distance), "metric": int(metric), "next_hop": next_hop, "interface": interface}
+    match = CONNECTED_RE.match(rest)
+    if match is not None:
+        return {"interface": match.group(1)}
+    return None
+
+
+def parse_show_ip_route(text: str) -> List[Route]:
+    routes = []
+    subnetted_prefixlen = None
+    last_route = None
+    for line in text.splitlines():
+        match = SUBNETTED_RE.match(line)
+        if match is not None:
+            # Older images leave the prefix length off the routes under a classful network that is not variably subnetted
+            subnetted_prefixlen = None if match.group(2) else match.group(1)
+            continue
+        match = ROUTE_RE.match(line)
+        if match is not None:
+            fields = _next_hop_fields(match.group("rest"))
+            if fields is None:
+                continue
+            prefixlen = match.group("prefixlen") or subnetted_prefixlen or "32"
+            last_route = Route(code=match.group("code"), prefix=f"{match.group('network')}/{prefixlen}", **fields)
+            routes.append(last_route)
+            continue
+        if last_route is not None and line.startswith(" "):
+            # Equal cost paths follow their route on lines of their own
+            fields = _next_hop_fields(line)
+            if fields is not None and "next_hop" in fields:
+                routes.append(Route(code=last_route.code, prefix=last_route.prefix, **fields))
+        if not line.strip():
+            subnetted_prefixlen = None
+    return routes
+
+
+INTERFACE_HEADER_RE = re.compile(r"^(\S+) is (.+?), line protocol is (\S+)")
+INTERFACE_PATTERNS: Sequence[Tuple[re.Pattern, Tuple[str, ...]]] = (
+    (re.compile(r"Hardware is ([^,]+?)(?:, address is (\S+))?(?: \(bia|$)"), ("hardware", "mac")),
+    (re.compile(r"Internet address is (\S+)"), ("ip_address",)),
+    (re.compile(r"MTU (\d+) bytes, BW (\d+) Kbit"), ("mtu", "bandwidth_kbit")),
+    (re.compile(r"^\s+(\d+) packets input, (\d+) bytes"), ("input_packets", "input_bytes")),
+    (re.compile(r"^\s+(\d+) packets output, (\d+) bytes"), ("output_packets", "output_bytes")),
+    (re.compile(r"^\s+(\d+) input errors"), ("input_errors",)),
+    (re.compile(r"^\s+(\d+) output errors"), ("output_errors",)),
+)
+INTERFACE_INT_FIELDS = frozenset(
+    ("mtu", "bandwidth_kbit", "input_packets", "input_bytes", "output_packets", "output_bytes", "input_errors", "output_errors")
+)
+
+
+def parse_show_interfaces(text: str) -> List[Interface]:
+    interfaces = []
+    fields: Optional[Dict[str, Any]] = None
+    for line in text.splitlines():
+        match = INTERFACE_HEADER_RE.match(line)
+        if match is not None:
+            if fields is not None:
+                interfaces.append(Interface(**fields))
+            fields = {"name": match.group(1), "status": match.group(2), "protocol": match.group(3)}
+            continue
+        if fields is None:
+            continue
+        for pattern, names in INTERFACE_PATTERNS:
+            match = pattern.search(line)
+            if match is None:
+                continue
+            for name, value in zip(names, match.groups()):
+                if value is not None and name not in fields:
+                    fields[name] = int(value) if name in INTERFACE_INT_FIELDS else value
+            break
+    if fields is not None:
+        interfaces.append(Interface(**fields))
+    return interfaces
+
+
+@attr.s(auto_attribs=True, kw_only=True, frozen=True)
+class TableSpec:
+    name: str
+    record_type: Type
+    parse: Callable[[str], List[Any]]
+
+
+COMMAND_TO_TABLE: Dict[str, TableSpec] = {
+    "show version": TableSpec(name="version", record_type=VersionInfo, parse=parse_show_version),
+    "show ip int br": TableSpec(name="ip_interfaces", record_type=IpInterface, parse=parse_show_ip_int_br),
+    "show memory statistics": TableSpec(name="memory_pools", record_type=MemoryPool, parse=parse_show_memory_statistics),
+    "show arp": TableSpec(name="arp", record_type=ArpEntry, parse=parse_show_arp),
+    "show ip route": TableSpec(name="routes", record_type=Route, parse=parse_show_ip_route),
+    "show interfaces": TableSpec(name="interfaces", record_type=Interface, parse=parse_show_interfaces),
+}
+
+
+def parse_output(command: str, text: str) -> List[Any]:
+    return COMMAND_TO_TABLE[command].parse(text)
+
+
+def _parse_chunk(items: List[Tuple[str, str]]) -> List[Optional[List[Any]]]:
+    results: List[Optional[List[Any]]] = []
+    for command, text in items:
+        try:
+            results.append(parse_output(command, text))
+        except Exception as exc:
+            logger.warning("Failed to parse output of %r: %r", command, exc)
+            results.append(None)
+    return results
+
+
+def _record_fields(record_type: Type) -> Tuple[str, ...]:
+    return tuple(field.name for field in attr.fields(record_type))
+
+
+class ParseCache:
+    """
+    Parsed records by (command, content hash) in SQLite, an output is only parsed again when its content changes.
+
+    Records are stored pickled, loading them is several times cheaper than parsing the output again.
+    """
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS parsed (
+        command TEXT NOT NULL,
+        digest TEXT NOT NULL,
+        version INTEGER NOT NULL,
+        records BLOB NOT NULL,
+        PRIMARY KEY (command, digest)
+    ) WITHOUT ROWID;
+    """
+
+    def __init__(self, path: str = PARSE_CACHE_PATH) -> None:
+        self.path = Path(path)
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.path))
+        conn.executescript(self.SCHEMA)
+        return conn
+
+    def load(self, keys: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], List[Any]]:
+        key_set = set(keys)
+        if not key_set or not self.path.exists():
+            return {}
+        result = {}
+        conn = self._connect()
+        try:
+            for digests in chunked(sorted({digest for _, digest in key_set}), 500):
+                for command, digest, records in conn.execute(
+                    f"SELECT command, digest, records FROM parsed WHERE version = ? AND digest IN ({','.join('?' * len(digests))})",
+                    (PARSER_VERSION, *digests)
+                ):
+                    if (command, digest) in key_set:
+                        result[(command, digest)] = pickle.loads(records)
+        finally:
+            conn.close()
+        return result
+
+    def save(self, key_to_records: Dict[Tuple[str, str], List[Any]]) -> None:
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO parsed VALUES (?, ?, ?, ?)",
+                    (
+                        (command, digest, PARSER_VERSION, pickle.dumps(records, pickle.HIGHEST_PROTOCOL))
+                        for (command, digest), records in key_to_records.items()
+                    )
+                )
+        finally:
+            conn.close()
+
+
+@attr.s(auto_attribs=True, kw_only=True)
+class ParseStats:
+    num_outputs: int = 0
+    num_distinct: int = 0
+    num_cached: int = 0
+    num_parsed: int = 0
+    num_failed: int = 0
+    duration: float = 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.num_outputs} outputs, {self.num_distinct} distinct, {self.num_cached} cached, "
+            f"{self.num_parsed} parsed, {self.num_failed} failed in {self.duration:.2f} seconds"
+        )
+
+
+@attr.s(auto_attribs=True, kw_only=True)
+class ParsedTables:
+    """Records per table name and device."""
+    tables: Dict[str, Dict[str, List[Any]]] = attr.ib(factory=dict)
+    stats: ParseStats = attr.ib(factory=ParseStats)
+
+    def rows(self, table_name: str) -> Iterator[Tuple[str, Any]]:
+        for device, records in self.tables.get(table_name, {}).items():
+            for record in records:
+                yield device, record
+
+    def write_csv(self, dir_path: str) -> None:
+        """One <table>.csv per table with a device column in front of the record fields."""
+        Path(dir_path).mkdir(parents=True, exist_ok=True)
+        for spec in COMMAND_TO_TABLE.values():
+            if spec.name not in self.tables:
+                continue
+            with open(os.path.join(dir_path, f"{spec.name}.csv"), "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(("device", *_record_fields(spec.record_type)))
+                writer.writerows((device, *attr.astuple(record)) for device, record in self.rows(spec.name))
+
+
+class ParseEngine:
+    """
+    Turns command outputs into ParsedTables.
+
+    Outputs are identified by command and content hash. Each distinct one not in the cache is parsed once,
+    in a process pool when there are many of them, and the new rows are added to the cache.
+    """
+    def __init__(
+        self,
+        cache: Optional[ParseCache] = None,
+        processes: Optional[int] = None,
+        chunk_size: int = PARSE_CHUNK_SIZE
+        ) -> None:
+        self.cache = cache or ParseCache()
+        self.processes = processes or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+
+    def parse_run(self, reader: "RunReader") -> ParsedTables:
+        """Parse a stored run, outputs found in the cache are never read from the segment."""
+        keys = [
+            (stored.device, stored.command, stored.digest)
+            for stored in reader.index.values()
+            if stored.error is None and stored.command in COMMAND_TO_TABLE
+        ]
+        return self._parse(keys, lambda device, command: reader.get(device, command).output)
+
+    def parse_outputs(self, outputs: Iterable[Tuple[str, str, str]]) -> ParsedTables:
+        """Parse (device, command, output) triples."""
+        keys = []
+        device_command_to_text = {}
+        for device, command, text in outputs:
+            if command not in COMMAND_TO_TABLE:
+                continue
+            device_command_to_text[(device, command)] = text
+            keys.append((device, command, content_digest(text.encode())))
+        return self._parse(keys, lambda device, command: device_command_to_text[(device, command)])
+
+    def _parse(self, keys: List[Tuple[str, str, str]], load_text: Callable[[str, str], str]) -> ParsedTables:
+        start_time = time.monotonic()
+        stats = ParseStats(num_outputs=len(keys))
+        # One device per distinct output is enough to read its text
+        key_to_device: Dict[Tuple[str, str], str] = {}
+        for device, command, digest in keys:
+            key_to_device.setdefault((command, digest), device)
+        stats.num_distinct = len(key_to_device)
+
+        key_to_records = self.cache.load(key_to_device)
+        stats.num_cached = len(key_to_records)
+        missing = [key for key in key_to_device if key not in key_to_records]
+        parsed = self._parse_missing(missing, key_to_device, load_text)
+        stats.num_failed = sum(records is None for records in parsed.values())
+        new_records = {key: records for key, records in parsed.items() if records is not None}
+        stats.num_parsed = len(new_records)
+        if new_records:
+            self.cache.save(new_records)
+        key_to_records.update(new_records)
+
+        result = ParsedTables(stats=stats)
+        for device, command, digest in keys:
+            records = key_to_records.get((command, digest))
+            if records is not None:
+                result.tables.setdefault(COMMAND_TO_TABLE[command].name, {})[device] = records
+        stats.duration = time.monotonic() - start_time
+        logger.info("Parsed command outputs: %s", stats)
+        return result
+
+    def _parse_missing(
+        self,
+        missing: List[Tuple[str, str]],
+        key_to_device: Dict[Tuple[str, str], str],
+        load_text: Callable[[str, str], str]
+        ) -> Dict[Tuple[str, str], Optional[List[Any]]]:
+        items = ((command, load_text(key_to_device[(command, digest)], command)) for command, digest in missing)
+        chunks = chunked(items, self.chunk_size)
+        if self.processes > 1 and len(missing) >= MIN_OUTPUTS_FOR_POOL:
+            with create_process_pool(self.processes) as pool:
+                results = [records for chunk_results in pool.map(_parse_chunk, chunks) for records in chunk_results]
+        else:
+            results = [records for chunk in chunks for records in _parse_chunk(chunk)]
+        return dict(zip(missing, results))
@@ -0,0 +1,78 @@
+import hashlib
+import json
+import random
+from typing import Any, Dict, Iterable, List
+
+import attr
+
+PAYLOAD_GROUP_PREFIX = "payload_"
+SHARED_PAYLOAD_KEY = "shared"
+# Length of one payload item as serialised: 32 hex digits, quotes, a comma and a space
+PAYLOAD_ITEM_SIZE = 36
+DEFAULT_PAYLOAD_BYTES_PER_HOST = 40000
+
+
+@attr.s(auto_attribs=True, kw_only=True, frozen=True)
+class PayloadSpec:
+    """Host vars payload to generate: roughly `bytes_per_host` of data, identical for `shared_fraction` of the hosts."""
+    bytes_per_host: int = DEFAULT_PAYLOAD_BYTES_PER_HOST
+    shared_fraction: float = 1.0
+    seed: int = 0
+
+
+@attr.s(auto_attribs=True, kw_only=True)
+class HostPayloads:
+    """Payloads by content hash, and the hash each host refers to."""
+    host_to_digest: Dict[str, str] = attr.ib(factory=dict)
+    digest_to_payload: Dict[str, Dict[str, Any]] = attr.ib(factory=dict)
+
+    def add(self, host_name: str, payload: Dict[str, Any]) -> str:
+        digest = payload_digest(payload)
+        self.digest_to_payload.setdefault(digest, payload)
+        self.host_to_digest[host_name] = digest
+        return digest
+
+    def digest_to_hosts(self) -> Dict[str, List[str]]:
+        result: Dict[str, List[str]] = {}
+        for host_name, digest in self.host_to_digest.items():
+            result.setdefault(digest, []).append(host_name)
+        return result
+
+
+def payload_digest(payload: Dict[str, Any]) -> str:
+    content = json.dumps(payload, sort_keys=True, separators=(",", ":")).encode()
+    return hashlib.blake2b(content, digest_size=8).hexdigest()
+
+
+def payload_group_name(digest: str) -> str:
+    return f"{PAYLOAD_GROUP_PREFIX}{digest}"
+
+
+def assign_payload_keys(host_names: Iterable[str], spec: PayloadSpec) -> Dict[str, str]:
+    """Map every host to the key of its payload, hosts sharing the payload get SHARED_PAYLOAD_KEY, others their own name."""
+    host_names = list(host_names)
+    rng = random.Random(spec.seed)
+    shared_hosts = set(rng.sample(host_names, round(len(host_names) * spec.shared_fraction)))
+    return {
+        host_name: SHARED_PAYLOAD_KEY if host_name in shared_hosts else host_name
+        for host_name in host_names
+    }
+
+
+def make_payload(spec: PayloadSpec, key: str) -> Dict[str, Any]:
+    # Seeded by key, so any payload can be generated on its own and is the same on every run
+    rng = random.Random(f"{spec.seed}:{key}")
+    num_items = max(1, spec.bytes_per_host // PAYLOAD_ITEM_SIZE)
+    return {"random": [f"{rng.getrandbits(128):032x}" for _ in range(num_items)]}
+
+
+def generate_payloads(host_names: Iterable[str], spec: PayloadSpec) -> HostPayloads:
+    payloads = HostPayloads()
+    key_to_digest: Dict[str, str] = {}
+    for host_name, key in assign_payload_keys(host_names, spec).items():
+        digest = key_to_digest.get(key)
+        if digest is None:
+            digest = key_to_digest[key] = payloads.add(host_name, make_payload(spec, key))
+        else:
+            payloads.host_to_digest[host_name] = digest
+    return payloads
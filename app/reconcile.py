@@ -0,0 +1,263 @@
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple, TYPE_CHECKING
+import attr
+
+from app.constants import GNS3_PROVISION_MAX_IN_FLIGHT
+from app.device import Vector
+from app.gns3_link import GNS3Link
+from app import tracing
+from app import metrics
+
+if TYPE_CHECKING:
+    from app.device import Device
+    from app.gns3_node import GNS3Node
+    from app.gns3_project import GNS3Project
+    from jinja2.environment import Template
+
+logger = logging.getLogger(__name__)
+
+
+@attr.s(auto_attribs=True, kw_only=True, frozen=True)
+class Action(ABC):
+    key: str
+    depends_on: Tuple[str, ...] = ()
+
+    @abstractmethod
+    async def run(self, project: "GNS3Project") -> None:
+        ...
+
+
+@attr.s(auto_attribs=True, kw_only=True, frozen=True)
+class CreateNode(Action):
+    hostname: str
+    coordinates: Vector
+
+    async def run(self, project: "GNS3Project") -> None:
+        temp_router = await project.add_router_from_template(self.coordinates, hostname=self.hostname)
+        await project.rename_and_move_router(node=temp_router, hostname=self.hostname, coordinates=self.coordinates)
+
+
+@attr.s(auto_attribs=True, kw_only=True, frozen=True)
+class UpdateNode(Action):
+    node_name: str
+    hostname: str
+    coordinates: Vector
+
+    async def run(self, project: "GNS3Project") -> None:
+        node = project.name_to_node[self.node_name]
+        await project.rename_and_move_router(node=node, hostname=self.hostname, coordinates=self.coordinates)
+
+
+@attr.s(auto_attribs=True, kw_only=True, frozen=True)
+class AddLink(Action):
+    hostname: str
+    switch_name: str
+    switch_port_num: int
+
+    async def run(self, project: "GNS3Project") -> None:
+        router = project.name_to_node[self.hostname]
+        switch = project.name_to_node[self.switch_name]
+        link = project.create_link_between_router_and_switch(router, switch, self.switch_port_num)
+        await project.add_link_to_switch(link)
+
+
+@attr.s(auto_attribs=True, kw_only=True, frozen=True)
+class RemoveLink(Action):
+    link: GNS3Link
+
+    async def run(self, project: "GNS3Project") -> None:
+        await project.delete_link(self.link)
+
+
+@attr.s(auto_attribs=True, kw_only=True, frozen=True)
+class PushConfig(Action):
+    device: "Device"
+    template: "Template"
+
+    async def run(self, project: "GNS3Project") -> None:
+        node = project.name_to_node[self.device.hostname]
+        with tracing.span("render", "render"):
+            router_config = self.template.render(device=self.device)
+        await project.update_node_config(node=node, config=router_config)
+
+
+@attr.s(auto_attribs=True, kw_only=True, frozen=True)
+class DeleteNode(Action):
+    node_name: str
+    node_id: str
+
+    async def run(self, project: "GNS3Project") -> None:
+        await project.delete_node(node_name=self.node_name, node_id=self.node_id)
+
+
+@attr.s(auto_attribs=True, kw_only=True)
+class Plan:
+    actions: List[Action] = attr.ib(factory=list)
+
+    def add(self, action: Action) -> Action:
+        self.actions.append(action)
+        return action
+
+    def __len__(self) -> int:
+        return len(self.actions)
+
+    def __iter__(self):
+        return iter(self.actions)
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.actions
+
+    def summary(self) -> Dict[str, int]:
+        return dict(Counter(action.__class__.__name__ for action in self.actions))
+
+
+@attr.s(auto_attribs=True, kw_only=True)
+class ReconcileResult:
+    succeeded: List[str] = attr.ib(factory=list)
+    failed: Dict[str, Exception] = attr.ib(factory=dict)
+    skipped: List[str] = attr.ib(factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.failed and not self.skipped
+
+
+def plan_reconcile(
+    devices: Iterable["Device"],
+    project: "GNS3Project",
+    template: "Template",
+    update_configs: bool = False,
+    prune: bool = False,
+    ) -> Plan:
+    """
+    Compare the desired devices against a fetched project snapshot and return the actions needed to converge.
+
+    Configs are pushed for newly created or adopted routers, or for every router when `update_configs` is set.
+    With `prune`, routers cabled to a switch that are not part of `devices` are deleted.
+    """
+    plan = Plan()
+    desired_names: Set[str] = set()
+    placements: List[Tuple["Device", "GNS3Node", Optional["GNS3Node"]]] = []
+    link_index = project.link_index
+    for device in devices:
+        switch = device.find_switch(project.name_to_node)
+        cabled_node = project.id_to_node.get(link_index.node_at_switch_port(switch.id, device.seq_num_in_group))
+        placements.append((device, switch, cabled_node))
+        desired_names.add(device.hostname)
+    removed_link_keys: Set[str] = set()
+    node_id_to_delete_key: Dict[str, str] = {}
+
+    if prune:
+        # Stale routers cabled to the port of a desired router that does not exist yet are renamed, not deleted
+        adopted_ids = {
+            cabled_node.id for device, _, cabled_node in placements
+            if cabled_node is not None and cabled_node.name not in desired_names and device.hostname not in project.name_to_node
+        }
+        for switch in project.nodes:
+            if not switch.is_switch:
+                continue
+            for port_num, node in project.get_switch_port_to_node(switch).items():
+                if port_num == 0 or node.name in desired_names or node.id in adopted_ids or node.id in node_id_to_delete_key:
+                    continue
+                action = plan.add(DeleteNode(key=f"delete:{node.name}", node_name=node.name, node_id=node.id))
+                node_id_to_delete_key[node.id] = action.key
+
+    def remove_link(link: GNS3Link) -> str:
+        key = f"unlink:{link.id}"
+        if key not in removed_link_keys:
+            removed_link_keys.add(key)
+            plan.add(RemoveLink(key=key, link=link))
+        return key
+
+    for device, switch, cabled_node in placements:
+        hostname = device.hostname
+        coordinates = device.calculate_coordinates(switch)
+        node = project.name_to_node.get(hostname)
+        node_deps: Tuple[str, ...] = ()
+        created = False
+        adopted = False
+
+        if node is None and cabled_node is not None and cabled_node.name not in desired_names:
+            action = plan.add(UpdateNode(key=f"update:{hostname}", node_name=cabled_node.name, hostname=hostname, coordinates=coordinates))
+            node_deps = (action.key,)
+            node = cabled_node
+            # It still holds the startup-config of the device it was cabled as
+            adopted = True
+        elif node is None:
+            action = plan.add(CreateNode(key=f"create:{hostname}", hostname=hostname, coordinates=coordinates))
+            node_deps = (action.key,)
+            created = True
+        elif Vector(node.x, node.y) != coordinates:
+            action = plan.add(UpdateNode(key=f"update:{hostname}", node_name=hostname, hostname=hostname, coordinates=coordinates))
+            node_deps = (action.key,)
+
+        if created or cabled_node is None or cabled_node.id != node.id:
+            link_deps = node_deps
+            # Free up both ends before cabling the router to its switch port, deleting a node removes its links
+            if cabled_node is not None and cabled_node.id in node_id_to_delete_key:
+                link_deps += (node_id_to_delete_key[cabled_node.id],)
+            elif cabled_node is not None:
+                link_deps += (remove_link(link_index.link_at(switch.id, 0, device.seq_num_in_group)),)
+            router_link = None if created else project.get_link_at(node)
+            if router_link is not None:
+                link_deps += (remove_link(router_link),)
+            plan.add(AddLink(key=f"link:{hostname}", depends_on=link_deps, hostname=hostname, switch_name=switch.name, switch_port_num=device.seq_num_in_group))
+
+        if created or adopted or update_configs:
+            plan.add(PushConfig(key=f"config:{hostname}", depends_on=node_deps, device=device, template=template))
+
+    logger.info("Reconcile plan: %s", plan.summary() or "nothing to do")
+    return plan
+
+
+async def execute_plan(plan: Plan, project: "GNS3Project", max_in_flight: Optional[int] = GNS3_PROVISION_MAX_IN_FLIGHT) -> ReconcileResult:
+    """
+    Run the plan as a dependency DAG, with at most `max_in_flight` actions talking to the controller at once.
+
+    Actions whose dependencies failed are skipped rather than attempted.
+    """
+    result = ReconcileResult()
+    semaphore = asyncio.BoundedSemaphore(max_in_flight or 1)
+    key_to_task: Dict[str, "asyncio.Task[bool]"] = {}
+    queue_depth = metrics.QUEUE_DEPTH.labels("reconcile")
+    in_flight = metrics.IN_FLIGHT.labels("reconcile")
+
+    async def run(action: Action) -> bool:
+        for dep_key in action.depends_on:
+            if not await key_to_task[dep_key]:
+                logger.warning("Skipping %r as %r did not succeed", action.key, dep_key)
+                result.skipped.append(action.key)
+                return False
+        # Keys are <kind>:<hostname or link id>, the actions of a router follow each other on its timeline row
+        with tracing.span(action.__class__.__name__, "reconcile", track=action.key.partition(":")[2]) as span:
+            queued_at = time.perf_counter()
+            queue_depth.inc()
+            async with semaphore:
+                queue_depth.dec()
+                span.add_phase("queue_wait", queued_at, time.perf_counter())
+                in_flight.inc()
+                start = time.perf_counter()
+                try:
+                    await action.run(project)
+                except Exception as exc:
+                    logger.error("Action %r has failed: %r", action.key, exc)
+                    result.failed[action.key] = exc
+                    return False
+                finally:
+                    in_flight.dec()
+                    metrics.observe("reconcile", action.__class__.__name__, time.perf_counter() - start, ok=action.key not in result.failed)
+        result.succeeded.append(action.key)
+        return True
+
+    # Plan actions are always added after their dependencies
+    for action in plan:
+        key_to_task[action.key] = asyncio.create_task(run(action))
+    await asyncio.gather(*key_to_task.values())
+
+    logger.info("Executed %d actions: %d succeeded, %d failed, %d skipped", len(plan), len(result.succeeded), len(result.failed), len(result.skipped))
+    return result
@@ -0,0 +1,225 @@
+import asyncio
+import concurrent.futures
+import functools
+import logging
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Deque, Iterable, Iterator, List, Optional, Tuple, TypeVar, Union, TYPE_CHECKING
+
+from jinja2 import Environment, PackageLoader, Template
+
+from app import tracing
+from app.device_table import with_hostnames
+
+if TYPE_CHECKING:
+    from app.device import Device
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+logger = logging.getLogger(__name__)
+
+RENDER_CHUNK_SIZE = 500
+# Rendered chunks allowed to wait for a slow consumer of stream_rendered before rendering pauses
+RENDER_MAX_CHUNKS_AHEAD = 4
+# Below this many devices starting worker processes costs more than it saves
+MIN_DEVICES_FOR_POOL = 2000
+
+
+@functools.lru_cache(maxsize=None)
+def get_jinja_env() -> Environment:
+    # Templates ship with the package, there is no need to stat them on every lookup
+    return Environment(loader=PackageLoader('app', 'templates'), auto_reload=False)
+
+
+@functools.lru_cache(maxsize=None)
+def get_template(template_name: str) -> Template:
+    return get_jinja_env().get_template(template_name)
+
+
+def create_process_pool(max_workers: int) -> ProcessPoolExecutor:
+    """
+    Pool whose workers start from a fresh forkserver process, or are spawned where there is none.
+
+    Forking the caller would copy the locks of its other threads (metrics server, HTTP clients, the event loop's
+    executor) in whatever state they happen to be, which can deadlock the workers.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        mp_context = multiprocessing.get_context("forkserver")
+        # Imported once in the server, workers forked from it start with the templates and parsers loaded
+        mp_context.set_forkserver_preload(["app.render", "app.parsers"])
+    else:
+        mp_context = multiprocessing.get_context("spawn")
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context)
+
+
+def imap_bounded(executor: Executor, func: Callable[[T], R], items: Iterable[T], max_pending: int) -> Iterator[R]:
+    """Like `executor.map`, with at most `max_pending` calls submitted ahead of the consumer instead of all of them."""
+    pending: Deque["Future[R]"] = deque()
+    for item in items:
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+        pending.append(executor.submit(func, item))
+    while pending:
+        yield pending.popleft().result()
+
+
+def chunked(items: Iterable["Device"], chunk_size: int) -> Iterator[List["Device"]]:
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _render_chunk(template_name: str, items: List[Tuple[str, "Device"]]) -> List[Tuple[str, str]]:
+    template = get_template(template_name)
+    return [(hostname, template.render(device=device)) for hostname, device in items]
+
+
+def _render_chunk_to_dir(template_name: str, dir_path: str, items: List[Tuple[str, "Device"]]) -> int:
+    template = get_template(template_name)
+    for hostname, device in items:
+        with open(os.path.join(dir_path, f"{hostname}.cfg"), "w") as f:
+            f.write(template.render(device=device))
+    return len(items)
+
+
+class RenderEngine:
+    """
+    Renders one template for many devices.
+
+    The template is compiled once per process, workers compile their own copy. Large device sets are split into chunks and rendered in a
+    process pool, results are yielded chunk by chunk in device order so callers can consume them as they come.
+    """
+    def __init__(self, template_name: str, processes: Optional[int] = None, chunk_size: int = RENDER_CHUNK_SIZE) -> None:
+        self.template_name = template_name
+        self.processes = processes or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+
+    @property
+    def template(self) -> Template:
+        return get_template(self.template_name)
+
+    def render(self, device: "Device") -> str:
+        return self.template.render(device=device)
+
+    def _use_pool(self, items: List[Tuple[str, "Device"]]) -> bool:
+        return self.processes > 1 and len(items) >= MIN_DEVICES_FOR_POOL
+
+    def render_many(self, devices: Iterable["Device"]) -> Iterator[Tuple[str, str]]:
+        """Yield (hostname, config) pairs in device order."""
+        for rendered in self.render_chunks(devices):
+            yield from rendered
+
+    def render_chunks(self, devices: Iterable["Device"]) -> Iterator[List[Tuple[str, str]]]:
+        """Yield lists of (hostname, config) pairs in device order, workers stay at most two chunks each ahead of the consumer."""
+        items = with_hostnames(devices)
+        chunks = chunked(items, self.chunk_size)
+        tracer = tracing.get_tracer()
+        if not self._use_pool(items):
+            for chunk in chunks:
+                with tracer.span("render_chunk", "render", template=self.template_name, devices=len(chunk)):
+                    rendered = _render_chunk(self.template_name, chunk)
+                yield rendered
+            return
+        render_chunk = functools.partial(tracing.timed_call, _render_chunk, self.template_name)
+        with create_process_pool(self.processes) as pool:
+            for pid, start, end, rendered in imap_bounded(pool, render_chunk, chunks, max_pending=2 * self.processes):
+                tracer.record("render_chunk", "render", start, end, pid=pid, template=self.template_name, devices=len(rendered))
+                yield rendered
+
+    def render_to_dir(self, devices: Iterable["Device"], dir_path: str) -> int:
+        """Write <hostname>.cfg files into `dir_path`, workers write their own chunks so configs never cross processes."""
+        Path(dir_path).mkdir(parents=True, exist_ok=True)
+        items = with_hostnames(devices)
+        chunks = chunked(items, self.chunk_size)
+        tracer = tracing.get_tracer()
+        num_rendered = 0
+        if not self._use_pool(items):
+            for chunk in chunks:
+                with tracer.span("render_chunk", "render", template=self.template_name, devices=len(chunk)):
+                    num_rendered += _render_chunk_to_dir(self.template_name, dir_path, chunk)
+            return num_rendered
+        render_chunk = functools.partial(tracing.timed_call, _render_chunk_to_dir, self.template_name, dir_path)
+        with create_process_pool(self.processes) as pool:
+            for pid, start, end, num_written in pool.map(render_chunk, chunks):
+                tracer.record("render_chunk", "render", start, end, pid=pid, template=self.template_name, devices=num_written)
+                num_rendered += num_written
+        return num_rendered
+
+
+def render_many(template: Union[Template, RenderEngine], devices: Iterable["Device"]) -> Iterator[Tuple[str, str]]:
+    if isinstance(template, RenderEngine):
+        return template.render_many(devices)
+    return ((hostname, template.render(device=device)) for hostname, device in with_hostnames(devices))
+
+
+def render_chunks(template: Union[Template, RenderEngine], devices: Iterable["Device"]) -> Iterator[List[Tuple[str, str]]]:
+    if isinstance(template, RenderEngine):
+        return template.render_chunks(devices)
+    return (_render_items(template, chunk) for chunk in chunked(with_hostnames(devices), RENDER_CHUNK_SIZE))
+
+
+def _render_items(template: Template, items: List[Tuple[str, "Device"]]) -> List[Tuple[str, str]]:
+    return [(hostname, template.render(device=device)) for hostname, device in items]
+
+
+_DONE = object()
+
+
+async def stream_rendered(
+    template: Union[Template, RenderEngine],
+    devices: Iterable["Device"],
+    max_chunks_ahead: int = RENDER_MAX_CHUNKS_AHEAD
+    ) -> AsyncIterator[Tuple[str, str]]:
+    """
+    Yield (hostname, config) pairs in device order as they are rendered, in a worker thread so the event loop keeps running.
+
+    Rendering pauses while `max_chunks_ahead` chunks are waiting for the consumer, so memory does not grow with the device count.
+    """
+    loop = asyncio.get_running_loop()
+    queue: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=max_chunks_ahead)
+    stopped = threading.Event()
+
+    def put(item: Any) -> bool:
+        future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+        while True:
+            try:
+                future.result(timeout=0.1)
+                return True
+            except concurrent.futures.TimeoutError:
+                if stopped.is_set():
+                    future.cancel()
+                    return False
+
+    def produce() -> None:
+        try:
+            for chunk in render_chunks(template, devices):
+                if not put(chunk):
+                    return
+        except Exception as exc:
+            put(exc)
+        else:
+            put(_DONE)
+
+    producer = loop.run_in_executor(None, produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is _DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            for pair in item:
+                yield pair
+    finally:
+        # Unblocks a producer waiting on a full queue, it stops after the chunk it is rendering
+        stopped.set()
+        await producer
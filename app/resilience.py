@@ -0,0 +1,156 @@
+import asyncio
+import email.utils
+import functools
+import logging
+import random
+import time
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Optional, Tuple, Type, TypeVar
+import attr
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+
+@attr.s(auto_attribs=True, kw_only=True, frozen=True)
+class RetryPolicy:
+    max_retries: int = 5
+    base_delay: float = 0.5
+    max_delay: float = 30.0
+    delay_multiplier: float = 2.0
+    # A 409 from the controller is usually a transient lock on the project, not a real conflict
+    retry_statuses: FrozenSet[int] = frozenset({409, 429, 500, 502, 503, 504})
+    retry_exceptions: Tuple[Type[BaseException], ...] = ()
+
+    def backoff(self, attempt_num: int) -> float:
+        # Full jitter keeps retrying tasks from hitting the controller in lockstep
+        ceiling = min(self.max_delay, self.base_delay * self.delay_multiplier ** attempt_num)
+        return random.uniform(0, ceiling)
+
+    def retry_after(self, headers: Any) -> Optional[float]:
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            delay = float(value)
+        except ValueError:
+            try:
+                retry_at = email.utils.parsedate_to_datetime(value)
+            except (TypeError, ValueError):
+                return None
+            delay = retry_at.timestamp() - time.time()
+        return min(self.max_delay, max(0.0, delay))
+
+
+class BreakerState(Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures.
+
+    While open, callers of `wait()` are paused instead of failing, so they do not hold request slots
+    that healthy endpoints could use. After `reset_timeout` a single probe is let through: success closes
+    the breaker, failure opens it again. A probe that ends without either, e.g. cancelled, must be handed
+    back with `release_probe()` so a waiting caller can send the next one.
+    """
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 10.0) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = BreakerState.CLOSED
+        self.num_failures = 0
+        self._opened_at = 0.0
+        self._closed = asyncio.Event()
+        self._closed.set()
+        self._probe_in_flight = False
+
+    async def wait(self) -> bool:
+        """Return once a request may be sent, True when it is the half-open probe."""
+        while True:
+            if self.state is BreakerState.CLOSED:
+                return False
+            if self.state is BreakerState.OPEN:
+                remaining = self._opened_at + self.reset_timeout - time.monotonic()
+                if remaining > 0:
+                    await asyncio.sleep(remaining)
+                    continue
+                self.state = BreakerState.HALF_OPEN
+            if not self._probe_in_flight:
+                self._probe_in_flight = True
+                # A released probe woke every waiter, the others have to wait for this one
+                self._closed.clear()
+                return True
+            await self._closed.wait()
+
+    def release_probe(self) -> None:
+        """Hand back a probe whose outcome was not recorded, no-op once it was."""
+        if self.state is BreakerState.HALF_OPEN and self._probe_in_flight:
+            self._probe_in_flight = False
+            self._closed.set()
+
+    def record_success(self) -> None:
+        if self.state is not BreakerState.CLOSED:
+            logger.info("Circuit %r is closed again", self.name)
+        self.state = BreakerState.CLOSED
+        self.num_failures = 0
+        self._probe_in_flight = False
+        self._closed.set()
+
+    def record_failure(self) -> None:
+        self.num_failures += 1
+        if self.state is BreakerState.HALF_OPEN or self.num_failures >= self.failure_threshold:
+            if self.state is not BreakerState.OPEN:
+                logger.warning("Circuit %r is open for %.1fs after %d failures", self.name, self.reset_timeout, self.num_failures)
+            self.state = BreakerState.OPEN
+            self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+            self._closed.clear()
+
+
+class CircuitBreakers:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 10.0) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.name_to_breaker: Dict[str, CircuitBreaker] = {}
+
+    def get(self, name: str) -> CircuitBreaker:
+        if name not in self.name_to_breaker:
+            self.name_to_breaker[name] = CircuitBreaker(name, failure_threshold=self.failure_threshold, reset_timeout=self.reset_timeout)
+        return self.name_to_breaker[name]
+
+
+def async_retry(policy: RetryPolicy, breaker: Optional[CircuitBreaker] = None) -> Callable[[Callable[..., Awaitable[T]]], Callable[..., Awaitable[T]]]:
+    """
+    Retry the decorated coroutine function on `policy.retry_exceptions` using jittered exponential backoff.
+    """
+    def wrapper(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        @functools.wraps(func)
+        async def wrapped(*args: Any, **kwargs: Any) -> T:
+            attempt_num = 0
+            while True:
+                is_probe = breaker is not None and await breaker.wait()
+                try:
+                    result = await func(*args, **kwargs)
+                except policy.retry_exceptions as exc:
+                    if breaker is not None:
+                        breaker.record_failure()
+                    if attempt_num >= policy.max_retries:
+                        raise
+                    delay = policy.backoff(attempt_num)
+                    attempt_num += 1
+                    logger.warning("%s failed with %r, retry attempt #%d/%d in %.1f seconds", func.__qualname__, exc, attempt_num, policy.max_retries, delay)
+                    await asyncio.sleep(delay)
+                else:
+                    if breaker is not None:
+                        breaker.record_success()
+                    return result
+                finally:
+                    if is_probe:
+                        breaker.release_probe()
+        return wrapped
+    return wrapper
@@ -0,0 +1,324 @@
+import asyncio
+import hashlib
+import logging
+import mmap
+import sqlite3
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import attr
+
+from app.collector import CommandResult, DeviceResult, ResultSink
+from app.constants import RESULTS_STORE_PATH
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE_NAME = "index.sqlite"
+COMPRESSION_LEVEL = 6
+# Stored in PRAGMA user_version, 1 added outputs.digest
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    segment TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS outputs (
+    run_id TEXT NOT NULL,
+    device TEXT NOT NULL,
+    command TEXT NOT NULL,
+    host TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    raw_length INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    duration REAL NOT NULL,
+    error TEXT,
+    PRIMARY KEY (run_id, device, command)
+) WITHOUT ROWID;
+"""
+
+
+@attr.s(auto_attribs=True, kw_only=True, frozen=True)
+class StoredOutput:
+    device: str
+    command: str
+    host: str
+    offset: int
+    length: int
+    raw_length: int
+    digest: str
+    duration: float
+    error: Optional[str]
+
+
+def content_digest(raw: bytes) -> str:
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+
+class ResultsStore:
+    """
+    Command outputs of collection runs, one append-only segment file per run.
+
+    Every output is compressed on its own, so any single one can be read back without the rest of the segment.
+    Where each output sits is recorded in an SQLite index keyed by (run, device, command), along with a hash of
+    its content, so consumers can tell unchanged outputs apart without decompressing them.
+    """
+    def __init__(self, dir_path: str = RESULTS_STORE_PATH) -> None:
+        self.dir_path = Path(dir_path)
+
+    def connect(self) -> sqlite3.Connection:
+        self.dir_path.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.dir_path / INDEX_FILE_NAME), check_same_thread=False)
+        conn.executescript(SCHEMA)
+        if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            self._migrate(conn)
+        return conn
+
+    def _migrate(self, conn: sqlite3.Connection) -> None:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have migrated the index while we waited for the lock
+            if conn.execute("PRAGMA user_version").fetchone()[0] < 1:
+                columns = {row[1] for row in conn.execute("PRAGMA table_info(outputs)")}
+                if "digest" not in columns:
+                    conn.execute("ALTER TABLE outputs ADD COLUMN digest TEXT NOT NULL DEFAULT ''")
+                    self._backfill_digests(conn)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _backfill_digests(self, conn: sqlite3.Connection) -> None:
+        num_updated = 0
+        for run_id, segment in conn.execute("SELECT run_id, segment FROM runs").fetchall():
+            try:
+                f = open(self.dir_path / segment, "rb")
+            except FileNotFoundError:
+                logger.warning("Segment %s of run %r is missing, its outputs keep an empty digest", segment, run_id)
+                continue
+            with f:
+                rows = conn.execute("SELECT device, command, offset, length FROM outputs WHERE run_id = ?", (run_id,)).fetchall()
+                updates = []
+                for device, command, offset, length in rows:
+                    f.seek(offset)
+                    raw = zlib.decompress(f.read(length)) if length else b""
+                    updates.append((content_digest(raw), run_id, device, command))
+            conn.executemany("UPDATE outputs SET digest = ? WHERE run_id = ? AND device = ? AND command = ?", updates)
+            num_updated += len(updates)
+        logger.info("Results index %s migrated, digests of %d outputs computed", self.dir_path, num_updated)
+
+    def runs(self) -> List[str]:
+        conn = self.connect()
+        try:
+            return [row[0] for row in conn.execute("SELECT run_id FROM runs ORDER BY started_at")]
+        finally:
+            conn.close()
+
+    def latest_run(self) -> Optional[str]:
+        runs = self.runs()
+        return runs[-1] if runs else None
+
+    def create_run(self, run_id: Optional[str] = None) -> "RunWriter":
+        run_id = run_id or datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        return RunWriter(self, run_id)
+
+    def open_run(self, run_id: Optional[str] = None) -> "RunReader":
+        run_id = run_id or self.latest_run()
+        if run_id is None:
+            raise KeyError(f"No runs in {self.dir_path}")
+        return RunReader(self, run_id)
+
+
+class RunWriter:
+    def __init__(self, store: ResultsStore, run_id: str) -> None:
+        self.store = store
+        self.run_id = run_id
+        self.segment_path = store.dir_path / f"{run_id}.seg"
+        self._conn = store.connect()
+        with self._conn:
+            self._conn.execute(
+                "INSERT INTO runs (run_id, segment, started_at) VALUES (?, ?, ?)",
+                (run_id, self.segment_path.name, time.time())
+            )
+        self._file = open(self.segment_path, "ab")
+        self._offset = self._file.tell()
+
+    def write_batch(self, device_results: List[DeviceResult]) -> None:
+        blocks = []
+        rows = []
+        for device_result in device_results:
+            for result in device_result.results:
+                raw = (result.output or "").encode()
+                block = zlib.compress(raw, COMPRESSION_LEVEL)
+                rows.append((
+                    self.run_id, device_result.name, result.command, device_result.host,
+                    self._offset, len(block), len(raw), content_digest(raw), result.duration, result.error
+                ))
+                blocks.append(block)
+                self._offset += len(block)
+        self._file.write(b"".join(blocks))
+        # Data first, so the index never points past the end of the segment
+        self._file.flush()
+        with self._conn:
+            # Columns by name, indexes migrated from version 0 have digest last
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO outputs (run_id, device, command, host, offset, length, raw_length, digest, duration, error) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+
+    def close(self) -> None:
+        self._file.close()
+        with self._conn:
+            self._conn.execute("UPDATE runs SET finished_at = ? WHERE run_id = ?", (time.time(), self.run_id))
+        self._conn.close()
+
+
+class RunReader:
+    """Random access to the outputs of one run through a memory map of its segment."""
+    def __init__(self, store: ResultsStore, run_id: str) -> None:
+        self.store = store
+        self.run_id = run_id
+        conn = store.connect()
+        try:
+            row = conn.execute("SELECT segment FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+            if row is None:
+                raise KeyError(f"Run {run_id!r} is not in {store.dir_path}")
+            self.index: Dict[Tuple[str, str], StoredOutput] = {}
+            self.device_to_commands: Dict[str, List[str]] = {}
+            for row_values in conn.execute(
+                "SELECT device, command, host, offset, length, raw_length, digest, duration, error FROM outputs WHERE run_id = ? ORDER BY offset",
+                (run_id,)
+            ):
+                stored = StoredOutput(**dict(zip(attr.fields_dict(StoredOutput), row_values)))
+                self.index[(stored.device, stored.command)] = stored
+                self.device_to_commands.setdefault(stored.device, []).append(stored.command)
+        finally:
+            conn.close()
+        self._file = open(store.dir_path / row[0], "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self._file.seek(0, 2) else None
+
+    def __enter__(self) -> "RunReader":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.close()
+
+    @property
+    def devices(self) -> List[str]:
+        return list(self.device_to_commands)
+
+    def get(self, device: str, command: str) -> Optional[CommandResult]:
+        stored = self.index.get((device, command))
+        if stored is None:
+            return None
+        output = None
+        if stored.error is None:
+            output = zlib.decompress(self._mmap[stored.offset:stored.offset + stored.length]).decode() if stored.length else ""
+        return CommandResult(command=command, output=output, duration=stored.duration, error=stored.error)
+
+    def iter_device(self, device: str) -> Iterator[CommandResult]:
+        for command in self.device_to_commands.get(device, []):
+            yield self.get(device, command)
+
+    def export_text(self, dir_path: str) -> int:
+        """Write one <device>.txt per device in the `=== command ===` format of the collectors, return the number of files."""
+        path = Path(dir_path)
+        path.mkdir(parents=True, exist_ok=True)
+        for device in self.devices:
+            with open(path / f"{device}.txt", "w") as f:
+                for result in self.iter_device(device):
+                    f.write(f"=== {result.command} ===\n{result.output if result.ok else f'ERROR: {result.error}'}\n\n")
+        return len(self.devices)
+
+
+class RunBatchWriter:
+    """
+    Thread-safe, synchronous writer of a new run of `store`, results are written in batches of `batch_size` devices.
+
+    For frameworks that report results from their own threads or callbacks, such as Nornir processors and Ansible
+    callback plugins, where ResultsStoreSink cannot be awaited.
+    """
+    def __init__(self, store: Optional[ResultsStore] = None, run_id: Optional[str] = None, batch_size: int = 200) -> None:
+        self.writer = (store or ResultsStore()).create_run(run_id)
+        self.batch_size = batch_size
+        self._batch: List[DeviceResult] = []
+        self._lock = threading.Lock()
+
+    @property
+    def run_id(self) -> str:
+        return self.writer.run_id
+
+    def write(self, device_result: DeviceResult) -> None:
+        with self._lock:
+            self._batch.append(device_result)
+            if len(self._batch) >= self.batch_size:
+                self._flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        batch, self._batch = self._batch, []
+        if batch:
+            self.writer.write_batch(batch)
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush()
+            self.writer.close()
+        logger.info("Results stored as run %r", self.run_id)
+
+
+class ResultsStoreSink(ResultSink):
+    """
+    Collector sink that appends to a new run of `store`.
+
+    Results are written in batches of `batch_size` devices on a dedicated thread, while the next batch fills up.
+    """
+    def __init__(self, store: Optional[ResultsStore] = None, run_id: Optional[str] = None, batch_size: int = 200) -> None:
+        self.writer = (store or ResultsStore()).create_run(run_id)
+        self.batch_size = batch_size
+        self._batch: List[DeviceResult] = []
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._pending: Optional[asyncio.Future] = None
+
+    @property
+    def run_id(self) -> str:
+        return self.writer.run_id
+
+    async def write(self, device_result: DeviceResult) -> None:
+        self._batch.append(device_result)
+        if len(self._batch) >= self.batch_size:
+            await self._flush()
+
+    async def _flush(self) -> None:
+        # At most one batch is being written, the await only blocks when the writer thread falls behind
+        if self._pending is not None:
+            await self._pending
+        batch, self._batch = self._batch, []
+        if batch:
+            self._pending = asyncio.get_running_loop().run_in_executor(self._executor, self.writer.write_batch, batch)
+
+    async def close(self) -> None:
+        await self._flush()
+        if self._pending is not None:
+            await self._pending
+        await asyncio.get_running_loop().run_in_executor(self._executor, self.writer.close)
+        self._executor.shutdown()
+        logger.info("Results stored as run %r", self.run_id)
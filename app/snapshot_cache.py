@@ -0,0 +1,156 @@
+import logging
+import sqlite3
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple, TYPE_CHECKING
+
+from app.constants import GNS3_SNAPSHOT_CACHE_PATH
+from app.gns3_node import GNS3Node, NodeStatus
+from app.gns3_link import GNS3Link, GNS3Port
+from app.gns3_stream import Validator
+
+if TYPE_CHECKING:
+    from app.gns3_project import GNS3Project
+
+logger = logging.getLogger(__name__)
+
+Snapshot = Tuple[Dict[str, GNS3Node], Dict[Tuple[Any, ...], GNS3Link]]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    project_id TEXT PRIMARY KEY,
+    saved_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS nodes (
+    project_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    type TEXT NOT NULL,
+    x INTEGER NOT NULL,
+    y INTEGER NOT NULL,
+    z INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    PRIMARY KEY (project_id, id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS links (
+    project_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    first_node_id TEXT NOT NULL,
+    first_adapter_num INTEGER NOT NULL,
+    first_port_num INTEGER NOT NULL,
+    second_node_id TEXT NOT NULL,
+    second_adapter_num INTEGER NOT NULL,
+    second_port_num INTEGER NOT NULL,
+    PRIMARY KEY (project_id, id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS validators (
+    project_id TEXT NOT NULL,
+    listing TEXT NOT NULL,
+    etag TEXT,
+    digest TEXT,
+    PRIMARY KEY (project_id, listing)
+) WITHOUT ROWID;
+"""
+
+
+class SnapshotCache:
+    """
+    SQLite copy of the nodes and links of GNS3 projects, so scripts can start without waiting for the controller.
+
+    Saving only writes the rows that changed since the stored snapshot.
+    """
+    def __init__(self, path: str = GNS3_SNAPSHOT_CACHE_PATH) -> None:
+        self.path = Path(path)
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.path))
+        conn.executescript(SCHEMA)
+        return conn
+
+    def load(self, project_id: str) -> Optional[Snapshot]:
+        if not self.path.exists():
+            return None
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT saved_at FROM snapshots WHERE project_id = ?", (project_id,)).fetchone()
+            if row is None:
+                return None
+            name_to_node: Dict[str, GNS3Node] = {}
+            for node_id, name, node_type, x, y, z, status in conn.execute(
+                "SELECT id, name, type, x, y, z, status FROM nodes WHERE project_id = ?", (project_id,)
+            ):
+                name_to_node[name] = GNS3Node(id=sys.intern(node_id), type=sys.intern(node_type), name=name, x=x, y=y, z=z, status=NodeStatus(status))
+            alt_id_to_link: Dict[Tuple[Any, ...], GNS3Link] = {}
+            for link_id, first_node_id, first_adapter_num, first_port_num, second_node_id, second_adapter_num, second_port_num in conn.execute(
+                "SELECT id, first_node_id, first_adapter_num, first_port_num, second_node_id, second_adapter_num, second_port_num "
+                "FROM links WHERE project_id = ?", (project_id,)
+            ):
+                ports = [
+                    GNS3Port(node_id=sys.intern(first_node_id), adapter_num=first_adapter_num, port_num=first_port_num),
+                    GNS3Port(node_id=sys.intern(second_node_id), adapter_num=second_adapter_num, port_num=second_port_num)
+                ]
+                link = GNS3Link(id=link_id, ports=ports)
+                alt_id_to_link[link.alt_id] = link
+        finally:
+            conn.close()
+        logger.info("Loaded %d nodes and %d links of project %r cached %.0f seconds ago", len(name_to_node), len(alt_id_to_link), project_id, time.time() - row[0])
+        return name_to_node, alt_id_to_link
+
+    def load_validators(self, project_id: str) -> Dict[str, Validator]:
+        """Validators of the listings the stored snapshot was last refreshed from."""
+        if not self.path.exists():
+            return {}
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT listing, etag, digest FROM validators WHERE project_id = ?", (project_id,)).fetchall()
+        finally:
+            conn.close()
+        return {listing: Validator(etag=etag, digest=digest) for listing, etag, digest in rows}
+
+    def save(self, project: "GNS3Project") -> None:
+        node_rows = {
+            node.id: (node.name, node.type, node.x, node.y, node.z, node.status.value)
+            for node in project.nodes
+        }
+        link_rows = {
+            link.id: (*link.first_port[:3], *link.second_port[:3])
+            for link in project.links
+            if link.id is not None
+        }
+        conn = self._connect()
+        try:
+            with conn:
+                num_nodes_changed = self._apply(conn, "nodes", ("name", "type", "x", "y", "z", "status"), project.id, node_rows)
+                num_links_changed = self._apply(
+                    conn, "links",
+                    ("first_node_id", "first_adapter_num", "first_port_num", "second_node_id", "second_adapter_num", "second_port_num"),
+                    project.id, link_rows
+                )
+                conn.executemany(
+                    "INSERT OR REPLACE INTO validators (project_id, listing, etag, digest) VALUES (?, ?, ?, ?)",
+                    [(project.id, listing, validator.etag, validator.digest) for listing, validator in project.validators.items()]
+                )
+                conn.execute("INSERT OR REPLACE INTO snapshots (project_id, saved_at) VALUES (?, ?)", (project.id, time.time()))
+        finally:
+            conn.close()
+        logger.info("Saved project %r snapshot, %d nodes and %d links changed", project.id, num_nodes_changed, num_links_changed)
+
+    @staticmethod
+    def _apply(conn: sqlite3.Connection, table: str, columns: Iterable[str], project_id: str, rows: Dict[str, Tuple[Any, ...]]) -> int:
+        columns = tuple(columns)
+        stored_rows = {
+            row_id: tuple(values)
+            for row_id, *values in conn.execute(f"SELECT id, {', '.join(columns)} FROM {table} WHERE project_id = ?", (project_id,))
+        }
+        removed_ids = [(project_id, row_id) for row_id in stored_rows.keys() - rows.keys()]
+        changed_rows = [
+            (project_id, row_id, *values)
+            for row_id, values in rows.items()
+            if stored_rows.get(row_id) != values
+        ]
+        conn.executemany(f"DELETE FROM {table} WHERE project_id = ? AND id = ?", removed_ids)
+        placeholders = ", ".join("?" * (len(columns) + 2))
+        conn.executemany(f"INSERT OR REPLACE INTO {table} (project_id, id, {', '.join(columns)}) VALUES ({placeholders})", changed_rows)
+        return len(removed_ids) + len(changed_rows)
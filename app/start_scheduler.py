@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Iterable, Optional, Sequence, TYPE_CHECKING
+
+from app.constants import GNS3_COMPUTE_ID
+from app.gns3_node import GNS3Node, NodeStatus
+from app import tracing
+from app import metrics
+
+if TYPE_CHECKING:
+    from app.gns3_project import GNS3Project
+
+logger = logging.getLogger(__name__)
+
+
+class StartScheduler:
+    """
+    Start nodes while keeping at most `max_in_flight` of them booting.
+
+    A slot is held from the start call until the node is booted: the controller reports it as started
+    and, when its management IP is known, one of `probe_ports` accepts a TCP connection.
+    New starts are spaced by the average measured boot time divided by the number of slots, and held back
+    while the compute CPU usage is above `max_cpu_percent`.
+    """
+    def __init__(
+        self,
+        project: "GNS3Project",
+        name_to_host: Optional[Dict[str, str]] = None,
+        max_in_flight: int = 25,
+        expected_boot_time: float = 60.0,
+        boot_timeout: float = 600.0,
+        max_cpu_percent: Optional[float] = None,
+        compute_id: str = GNS3_COMPUTE_ID,
+        probe_ports: Sequence[int] = (22, 23),
+        poll_interval: float = 2.0,
+        ) -> None:
+        self.project = project
+        self.name_to_host = name_to_host or {}
+        self.max_in_flight = max_in_flight
+        self.avg_boot_time = expected_boot_time
+        self.boot_timeout = boot_timeout
+        self.max_cpu_percent = max_cpu_percent
+        self.compute_id = compute_id
+        self.probe_ports = probe_ports
+        self.poll_interval = poll_interval
+        self.num_booted = 0
+        self._semaphore = asyncio.BoundedSemaphore(max_in_flight)
+        self._pace_lock = asyncio.Lock()
+        self._last_start = 0.0
+
+    @property
+    def start_interval(self) -> float:
+        return self.avg_boot_time / self.max_in_flight
+
+    async def run(self, nodes: Iterable[GNS3Node]) -> Dict[str, Exception]:
+        failures: Dict[str, Exception] = {}
+
+        in_flight = metrics.IN_FLIGHT.labels("boot")
+
+        async def start(node: GNS3Node) -> None:
+            try:
+                with tracing.span("boot", "gns3", track=node.name) as span:
+                    queued_at = time.perf_counter()
+                    async with self._semaphore:
+                        span.add_phase("queue_wait", queued_at, time.perf_counter())
+                        in_flight.inc()
+                        start = time.perf_counter()
+                        try:
+                            await self._start_and_wait(node, span)
+                        finally:
+                            in_flight.dec()
+                            metrics.observe("boot", "node", time.perf_counter() - start, ok=node.name not in failures)
+            except Exception as exc:
+                logger.error("Node %r failed to boot: %r", node.name, exc)
+                failures[node.name] = exc
+
+        nodes = list(nodes)
+        start_time = time.monotonic()
+        await asyncio.gather(*(start(node) for node in nodes))
+        logger.info(
+            "%d/%d nodes booted in %.1f seconds, average boot time %.1f seconds",
+            len(nodes) - len(failures), len(nodes), time.monotonic() - start_time, self.avg_boot_time
+        )
+        return failures
+
+    async def _start_and_wait(self, node: GNS3Node, span: tracing.AnySpan = tracing.NULL_SPAN) -> None:
+        with span.phase("pace"):
+            await self._pace()
+        start_time = time.monotonic()
+        deadline = start_time + self.boot_timeout
+        await self.project.start_node(node)
+        with span.phase("wait_started"):
+            await self._wait_until_started(node, deadline)
+        host = self.name_to_host.get(node.name)
+        if host:
+            with span.phase("wait_reachable"):
+                await self._wait_until_reachable(host, deadline)
+        boot_time = time.monotonic() - start_time
+        self._record_boot_time(boot_time)
+        logger.info("Node %r booted in %.1f seconds", node.name, boot_time)
+
+    async def _pace(self) -> None:
+        async with self._pace_lock:
+            delay = self._last_start + self.start_interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if self.max_cpu_percent is not None:
+                while await self.project.get_compute_cpu_usage(self.compute_id) > self.max_cpu_percent:
+                    await asyncio.sleep(self.poll_interval)
+            self._last_start = time.monotonic()
+
+    def _record_boot_time(self, boot_time: float) -> None:
+        self.num_booted += 1
+        # Running mean for the first samples, then an exponential average that follows drift
+        weight = max(1 / self.num_booted, 0.1)
+        self.avg_boot_time += weight * (boot_time - self.avg_boot_time)
+
+    async def _wait_until_started(self, node: GNS3Node, deadline: float) -> None:
+        while await self.project.get_node_status(node) is not NodeStatus.STARTED:
+            if time.monotonic() > deadline:
+                raise asyncio.TimeoutError(f"Node {node.name!r} is not started after {self.boot_timeout} seconds")
+            await asyncio.sleep(self.poll_interval)
+
+    async def _wait_until_reachable(self, host: str, deadline: float) -> None:
+        while not await self._is_reachable(host):
+            if time.monotonic() > deadline:
+                raise asyncio.TimeoutError(f"{host} is not reachable after {self.boot_timeout} seconds")
+            await asyncio.sleep(self.poll_interval)
+
+    async def _is_reachable(self, host: str) -> bool:
+        for port in self.probe_ports:
+            try:
+                _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout=self.poll_interval)
+            except (OSError, asyncio.TimeoutError):
+                continue
+            writer.close()
+            return True
+        return False
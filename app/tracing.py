@@ -0,0 +1,260 @@
+"""
+Span tracing of controller calls, device sessions and template rendering.
+
+Tracing is off unless TRACE_PATH is set, spans are then kept in memory and written as Chrome trace JSON
+to that path when the process exits. Open the file in https://ui.perfetto.dev or chrome://tracing to see
+the run as a timeline with one row per device.
+
+Spans carry the time spent in their phases as args, in seconds: `queue_wait` (waiting for a limiter,
+semaphore or per-host slot), `connect` (session setup) and `service` (the request or commands themselves).
+"""
+import atexit
+import json
+import logging
+import os
+import time
+from contextvars import ContextVar
+from itertools import count
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar, Union
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+TRACE_PATH_ENV = "TRACE_PATH"
+# About 200 bytes each, a 10k device gather with its commands and phases stays well below the limit
+TRACE_MAX_EVENTS = 2_000_000
+
+# Track (timeline row) of the innermost span with an explicit one, inherited by the spans and tasks started under it
+_current_track: ContextVar[Optional[str]] = ContextVar("trace_track", default=None)
+
+# span id, parent span id, name, category, track, pid, start, end, args
+Event = Tuple[int, Optional[int], str, str, Optional[str], int, float, float, Dict[str, Any]]
+
+
+class Span:
+    """Context manager timing one operation, see `Tracer.span`."""
+    __slots__ = ("tracer", "id", "name", "category", "track", "args", "start", "parent", "phase_name", "_token")
+
+    def __init__(
+        self,
+        tracer: "Tracer",
+        name: str,
+        category: str,
+        track: Optional[str],
+        args: Dict[str, Any],
+        parent: Optional["Span"] = None,
+        phase_name: Optional[str] = None
+        ) -> None:
+        self.tracer = tracer
+        self.id = next(tracer._ids)
+        self.name = name
+        self.category = category
+        self.track = track
+        self.args = args
+        self.start = 0.0
+        self.parent = parent
+        self.phase_name = phase_name
+        self._token = None
+
+    def __enter__(self) -> "Span":
+        if self.track is None:
+            self.track = _current_track.get()
+        elif self.parent is None:
+            self._token = _current_track.set(self.track)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        end = time.perf_counter()
+        if self._token is not None:
+            _current_track.reset(self._token)
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        if self.parent is not None:
+            self.parent._add_duration(self.phase_name, end - self.start)
+        self.tracer._add((self.id, self.parent.id if self.parent else None, self.name, self.category, self.track, os.getpid(), self.start, end, self.args))
+
+    def phase(self, name: str, label: Optional[str] = None, **args: Any) -> "Span":
+        """Child span whose duration adds up into the `name` arg, shown as `label` when given."""
+        return Span(self.tracer, label or name, self.category, self.track, args, parent=self, phase_name=name)
+
+    def add_phase(self, name: str, start: float, end: float) -> None:
+        """A phase timed by the caller, with `time.perf_counter()` values."""
+        self._add_duration(name, end - start)
+        self.tracer._add((next(self.tracer._ids), self.id, name, self.category, self.track, os.getpid(), start, end, {}))
+
+    def tag(self, **args: Any) -> None:
+        self.args.update(args)
+
+    def _add_duration(self, name: str, duration: float) -> None:
+        self.args[name] = self.args.get(name, 0.0) + duration
+
+
+class NullSpan:
+    """Stands in for spans while tracing is off, every method is a no-op."""
+    __slots__ = ()
+
+    def __enter__(self) -> "NullSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+    def phase(self, name: str, label: Optional[str] = None, **args: Any) -> "NullSpan":
+        return self
+
+    def add_phase(self, name: str, start: float, end: float) -> None:
+        pass
+
+    def tag(self, **args: Any) -> None:
+        pass
+
+
+NULL_SPAN = NullSpan()
+AnySpan = Union[Span, NullSpan]
+
+
+class Tracer:
+    """
+    Collects finished spans in memory, at most `max_events` of them, later ones are counted and dropped.
+
+    Spans sharing a track are drawn on the same timeline row, overlapping ones are spread over extra rows
+    when the trace is exported.
+    """
+    enabled = True
+
+    def __init__(self, max_events: int = TRACE_MAX_EVENTS) -> None:
+        self.max_events = max_events
+        self.origin = time.perf_counter()
+        self.num_dropped = 0
+        self._events: List[Event] = []
+        self._ids = count(1)
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def span(self, name: str, category: str, track: Optional[str] = None, **args: Any) -> Span:
+        return Span(self, name, category, track, args)
+
+    def record(
+        self,
+        name: str,
+        category: str,
+        start: float,
+        end: float,
+        track: Optional[str] = None,
+        pid: Optional[int] = None,
+        **args: Any
+        ) -> None:
+        """A span timed elsewhere, possibly in a forked worker whose `time.perf_counter()` shares our clock."""
+        self._add((next(self._ids), None, name, category, track or _current_track.get(), pid or os.getpid(), start, end, args))
+
+    def _add(self, event: Event) -> None:
+        # list.append is atomic, spans may finish in worker threads
+        if len(self._events) < self.max_events:
+            self._events.append(event)
+        else:
+            self.num_dropped += 1
+
+    def chrome_events(self) -> List[Dict[str, Any]]:
+        span_to_lane: Dict[int, Tuple[int, str]] = {}
+        # Ends of the spans still open on every row of a track, innermost last
+        track_to_lanes: Dict[Tuple[int, str], List[List[float]]] = {}
+        # Enclosing spans end after the ones they contain, sorting by start time puts them first
+        events = sorted(self._events, key=lambda event: (event[6], -event[7]))
+        for span_id, parent_id, _, category, track, pid, start, end, _ in events:
+            if parent_id is not None and parent_id in span_to_lane:
+                span_to_lane[span_id] = span_to_lane[parent_id]
+                continue
+            track_name = track or category
+            lanes = track_to_lanes.setdefault((pid, track_name), [])
+            for lane_num, open_ends in enumerate(lanes):
+                while open_ends and open_ends[-1] <= start:
+                    open_ends.pop()
+                # A row can only hold spans that nest
+                if not open_ends or end <= open_ends[-1]:
+                    open_ends.append(end)
+                    break
+            else:
+                lane_num = len(lanes)
+                lanes.append([end])
+            span_to_lane[span_id] = (pid, track_name if not lane_num else f"{track_name} ({lane_num + 1})")
+
+        lane_to_tid: Dict[Tuple[int, str], int] = {}
+        result: List[Dict[str, Any]] = []
+        for span_id, _, name, category, _, _, start, end, args in events:
+            lane = span_to_lane[span_id]
+            tid = lane_to_tid.get(lane)
+            if tid is None:
+                tid = lane_to_tid[lane] = len(lane_to_tid) + 1
+            result.append({
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": round((start - self.origin) * 1e6, 1),
+                "dur": round((end - start) * 1e6, 1),
+                "pid": lane[0],
+                "tid": tid,
+                "args": {key: round(value, 6) if isinstance(value, float) else value for key, value in args.items()}
+            })
+        main_pid = os.getpid()
+        for pid in {pid for pid, _ in lane_to_tid}:
+            result.append({"name": "process_name", "ph": "M", "pid": pid, "args": {"name": "main" if pid == main_pid else f"worker {pid}"}})
+        for (pid, lane_name), tid in lane_to_tid.items():
+            result.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": lane_name}})
+            result.append({"name": "thread_sort_index", "ph": "M", "pid": pid, "tid": tid, "args": {"sort_index": tid}})
+        return result
+
+    def write(self, path: str) -> None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.chrome_events(), "displayTimeUnit": "ms", "otherData": {"dropped_spans": self.num_dropped}}, f)
+        logger.info("Trace of %d spans written to %s, %d dropped", len(self), path, self.num_dropped)
+
+
+class NullTracer(Tracer):
+    enabled = False
+
+    def __init__(self) -> None:
+        super().__init__(max_events=0)
+
+    def span(self, name: str, category: str, track: Optional[str] = None, **args: Any) -> NullSpan:  # type: ignore[override]
+        return NULL_SPAN
+
+    def record(self, name: str, category: str, start: float, end: float, track: Optional[str] = None, pid: Optional[int] = None, **args: Any) -> None:
+        pass
+
+
+NULL_TRACER = NullTracer()
+_tracer: Optional[Tracer] = None
+
+
+def get_tracer() -> Tracer:
+    """The process tracer, enabled and written at exit when TRACE_PATH is set."""
+    global _tracer
+    if _tracer is None:
+        path = os.getenv(TRACE_PATH_ENV)
+        if path:
+            _tracer = Tracer()
+            atexit.register(_tracer.write, path)
+        else:
+            _tracer = NULL_TRACER
+    return _tracer
+
+
+def set_tracer(tracer: Tracer) -> None:
+    global _tracer
+    _tracer = tracer
+
+
+def span(name: str, category: str, track: Optional[str] = None, **args: Any) -> AnySpan:
+    return get_tracer().span(name, category, track=track, **args)
+
+
+def timed_call(func: Callable[..., T], *args: Any) -> Tuple[int, float, float, T]:
+    """Run `func` and return (pid, start, end, result), for timing work done in a process pool."""
+    start = time.perf_counter()
+    result = func(*args)
+    return os.getpid(), start, time.perf_counter(), result
@@ -80,6 +80,6 @@ def retry(exceptions: Union[Type[Exception], Tuple[Type[Exception], ...]], max_r
     return wrapper
 
 def create_random_data() -> Dict[str, Any]:
-        random_data = [str(uuid.uuid4() for i in range(1000))]
+        random_data = [str(uuid.uuid4()) for i in range(1000)]
         host_vars: Dict[str, Any] = {"random": random_data}
         return host_vars
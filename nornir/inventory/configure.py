@@ -1,31 +1,62 @@
 import logging.config
-from typing import List
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
 
 from nornir import InitNornir
 from nornir.core.filter import F
 from nornir_netmiko.tasks import netmiko_send_config
-from nornir_utils.plugins.tasks.data import load_yaml
 from nornir_jinja2.plugins.tasks import template_file
 
 from constants import LOGGING_DICT
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+# Registers the LabInventory plugin used by config.yaml
+import app.nornir_inventory
+from app.benchmark import DeviceTiming, timings_path_from_env, write_timings
+from app import tracing
+from app import metrics
 
-def configure(task, load_data: bool = False) -> None:
-    if load_data:
-        data = task.run(task=load_yaml, file=f"inventory/host_vars/{task.host.name}.yaml").result
-        random_data = data['random'][0]
-    else:
-        random_data = None
-    
-    config = task.run(task=template_file, template='config.j2', path='templates', random_data=random_data).result #host=task.host
-    task.run(task=netmiko_send_config, config_commands= config, exit_config_mode=False, delay_factor=2)
+
+def configure(task, timings: Dict[str, DeviceTiming], load_data: bool = False) -> None:
+    timing = timings[task.host.name] = DeviceTiming(device=task.host.name, duration=0.0, ok=False)
+    start_time = time.monotonic()
+    metrics.IN_FLIGHT.labels("nornir").inc()
+    try:
+        with tracing.span("configure", "ssh", track=task.host.name) as span:
+            # Opened before the config is pushed, so connection setup is timed on its own
+            with span.phase("connect"):
+                task.host.get_connection("netmiko", task.nornir.config)
+            timing.connect_duration = time.monotonic() - start_time
+            if load_data:
+                random_data = task.host['random'][0]
+            else:
+                random_data = None
+
+            with span.phase("render"):
+                config = task.run(task=template_file, template='config.j2', path='templates', random_data=random_data).result #host=task.host
+            with span.phase("service", label="send_config"):
+                task.run(task=netmiko_send_config, config_commands= config, exit_config_mode=False, delay_factor=2)
+        timing.ok = True
+    finally:
+        timing.duration = time.monotonic() - start_time
+        metrics.IN_FLIGHT.labels("nornir").dec()
+        metrics.observe("nornir", "configure", timing.duration, ok=timing.ok)
+        if timing.connect_duration is not None:
+            timing.command_duration = timing.duration - timing.connect_duration
 
 
 def main():
     logging.config.dictConfig(LOGGING_DICT)
+    metrics.start_from_env()
     with InitNornir(config_file="config.yaml") as nr:
         nr = InitNornir(config_file="config.yaml")
-        nr.run(task=configure, load_data=False)
+        timings: Dict[str, DeviceTiming] = {}
+        nr.run(task=configure, timings=timings, load_data=False)
+    timings_path = timings_path_from_env()
+    if timings_path:
+        write_timings(timings_path, timings.values())
     
 if __name__ == '__main__':
     main()
@@ -1,31 +1,72 @@
 import logging.config
-from typing import List
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
 
 from nornir import InitNornir
 from nornir.core.filter import F
 from nornir_netmiko.tasks import netmiko_send_command
-from nornir_utils.plugins.tasks.data import load_yaml
 
 from constants import LOGGING_DICT
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+# Registers the LabInventory plugin used by config.yaml
+import app.nornir_inventory
+from app.benchmark import DeviceTiming, timings_path_from_env, write_timings
+from app.nornir_processor import ResultsStoreProcessor
+from app.results_store import ResultsStore
+from app import tracing
+from app import metrics
+from app import utils
+
 COMMANDS = ["show version", "show ip int br", "show memory statistics", "show arp", "show ip route", "show interfaces"]
 
-def gather_commands(task, commands: List[str], load_data: bool = False) -> None:
-    if load_data:
-        task.run(task=load_yaml, file=f"inventory/host_vars/{task.host.name}.yaml")
-    with open(f"output/{task.host.name}.txt", "w") as f:
-        prompt = f"{task.host.name}#"
-        for command in commands:
-            result = task.run(task=netmiko_send_command, command_string=command, expect_string=prompt)
-            f.write(f"==={command}===\n{result.result}\n\n")
+def gather_commands(task, commands: List[str], timings: Dict[str, DeviceTiming]) -> None:
+    timing = timings[task.host.name] = DeviceTiming(device=task.host.name, duration=0.0, ok=False)
+    start_time = time.monotonic()
+    metrics.IN_FLIGHT.labels("nornir").inc()
+    try:
+        with tracing.span("gather", "ssh", track=task.host.name) as span:
+            # Opened before the first command, so connection setup is timed on its own
+            with span.phase("connect"):
+                task.host.get_connection("netmiko", task.nornir.config)
+            timing.connect_duration = time.monotonic() - start_time
+            # Outputs are stored by ResultsStoreProcessor
+            prompt = f"{task.host.name}#"
+            for command in commands:
+                command_start = time.monotonic()
+                with span.phase("service", label=command):
+                    task.run(task=netmiko_send_command, command_string=command, expect_string=prompt)
+                metrics.observe("ssh", "command", time.monotonic() - command_start)
+        timing.ok = True
+    finally:
+        timing.duration = time.monotonic() - start_time
+        metrics.IN_FLIGHT.labels("nornir").dec()
+        metrics.observe("nornir", "gather", timing.duration, ok=timing.ok)
+        if timing.connect_duration is not None:
+            timing.command_duration = timing.duration - timing.connect_duration
 
 def main():
     logging.config.dictConfig(LOGGING_DICT)
+    metrics.start_from_env()
+    store = ResultsStore()
+    processor = ResultsStoreProcessor(store)
     with InitNornir(config_file="config.yaml") as nr:
         nr = InitNornir(config_file="config.yaml")
         #nr_sw1 = nr.filter(F(has_parent_group="Switch1"))
         #nr_sw1.run(task=gather_commands, commands=COMMANDS)
-        nr.run(task=gather_commands, commands=COMMANDS, load_data=True)
+        timings: Dict[str, DeviceTiming] = {}
+        try:
+            nr.with_processors([processor]).run(task=gather_commands, commands=COMMANDS, timings=timings)
+        finally:
+            processor.close()
+    if utils.is_env_var("EXPORT_TEXT"):
+        with store.open_run(processor.run_id) as reader:
+            reader.export_text("output")
+    timings_path = timings_path_from_env()
+    if timings_path:
+        write_timings(timings_path, timings.values())
     
 if __name__ == '__main__':
     main()
\ No newline at end of file
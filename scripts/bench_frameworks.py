@@ -0,0 +1,307 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import attr
+
+from app.benchmark import BENCH_TIMINGS_ENV, DeviceTiming, load_timings, percentile
+
+logger = logging.getLogger(__name__)
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+REPORT_DIR = ROOT_DIR / "output" / "bench"
+
+
+@attr.s(auto_attribs=True, kw_only=True, frozen=True)
+class Variant:
+    name: str
+    framework: str
+    action: str
+    cwd: Path
+    argv: Sequence[str]
+
+
+VARIANTS = [
+    Variant(name="ansible-gather", framework="ansible", action="gather", cwd=ROOT_DIR / "ansible", argv=["ansible-playbook", "gather_commands.yaml"]),
+    Variant(name="asyncio-gather", framework="asyncio", action="gather", cwd=ROOT_DIR, argv=[sys.executable, "scripts/gather_commands_asyncio.py"]),
+    Variant(name="nornir-gather", framework="nornir", action="gather", cwd=ROOT_DIR / "nornir", argv=[sys.executable, "inventory/gather_commands.py"]),
+    Variant(name="ansible-configure", framework="ansible", action="configure", cwd=ROOT_DIR / "ansible", argv=["ansible-playbook", "configure.yaml"]),
+    Variant(name="nornir-configure", framework="nornir", action="configure", cwd=ROOT_DIR / "nornir", argv=[sys.executable, "inventory/configure.py"]),
+]
+NAME_TO_VARIANT = {variant.name: variant for variant in VARIANTS}
+
+
+@attr.s(auto_attribs=True, kw_only=True)
+class RunReport:
+    variant: str
+    framework: str
+    action: str
+    repeat_num: int
+    returncode: int
+    wall_time: float
+    cpu_time: float
+    cpu_percent: float
+    # ru_maxrss of the run, the largest single process of its tree and not their sum
+    peak_rss_mb: float
+    # Peak of the RSS summed over the whole process tree, sampled from /proc, None where there is no /proc
+    peak_tree_rss_mb: Optional[float] = None
+    devices_ok: int
+    devices_failed: int
+    device_p50: Optional[float]
+    device_p95: Optional[float]
+    device_p99: Optional[float]
+    connect_p50: Optional[float]
+    connect_p95: Optional[float]
+    command_p50: Optional[float]
+    command_p95: Optional[float]
+
+
+def variant_env(num_devices: Optional[int], timings_path: str, fake_fleet: Optional[str] = None) -> Dict[str, str]:
+    env = dict(os.environ)
+    env[BENCH_TIMINGS_ENV] = timings_path
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(ROOT_DIR), env.get("PYTHONPATH")]))
+    # Ansible 2.11 renamed the whitelist setting, set both so either version loads the timing and results callbacks
+    env["ANSIBLE_CALLBACKS_ENABLED"] = env["ANSIBLE_CALLBACK_WHITELIST"] = "bench_timings,results_store"
+    if num_devices is not None:
+        env["LAB_NUM_DEVICES"] = str(num_devices)
+    if fake_fleet:
+        env["LAB_FAKE_FLEET"] = fake_fleet
+    return env
+
+
+class TreeRssSampler:
+    """
+    Peak RSS summed over a process and all its descendants, Ansible forks and process pools included.
+
+    Sampled from /proc every `interval` seconds on a thread, so children living shorter than that can be missed.
+    """
+    def __init__(self, pid: int, interval: float = 0.1) -> None:
+        self.pid = pid
+        self.interval = interval
+        self.peak_bytes = 0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @staticmethod
+    def _read_processes() -> Dict[int, Tuple[int, int]]:
+        """pid -> (parent pid, rss bytes) of every process."""
+        page_size = os.sysconf("SC_PAGE_SIZE")
+        processes = {}
+        for stat_path in Path("/proc").glob("[0-9]*/stat"):
+            try:
+                stat = stat_path.read_text()
+            except OSError:
+                continue
+            # The command name is in parentheses and may hold spaces, the fields after it are fixed
+            fields = stat.rpartition(")")[2].split()
+            processes[int(stat_path.parent.name)] = (int(fields[1]), int(fields[21]) * page_size)
+        return processes
+
+    def sample(self) -> int:
+        processes = self._read_processes()
+        children: Dict[int, List[int]] = {}
+        for pid, (ppid, _) in processes.items():
+            children.setdefault(ppid, []).append(pid)
+        total = 0
+        pending = [self.pid]
+        while pending:
+            pid = pending.pop()
+            if pid in processes:
+                total += processes[pid][1]
+            pending.extend(children.get(pid, []))
+        self.peak_bytes = max(self.peak_bytes, total)
+        return total
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self.sample()
+            self._stopped.wait(self.interval)
+
+    def start(self) -> "TreeRssSampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> Optional[float]:
+        self._stopped.set()
+        self._thread.join()
+        return self.peak_bytes / (1024 * 1024)
+
+    @staticmethod
+    def is_supported() -> bool:
+        return Path("/proc/self/stat").exists()
+
+
+def run_variant(variant: Variant, num_devices: Optional[int], repeat_num: int, fake_fleet: Optional[str] = None) -> RunReport:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        timings_path = os.path.join(tmp_dir, "timings.jsonl")
+        start = time.perf_counter()
+        process = subprocess.Popen(variant.argv, cwd=variant.cwd, env=variant_env(num_devices, timings_path, fake_fleet))
+        sampler = TreeRssSampler(process.pid).start() if TreeRssSampler.is_supported() else None
+        # wait4 reports the usage of this run only, its waited-for children included
+        _, status, usage = os.wait4(process.pid, 0)
+        wall_time = time.perf_counter() - start
+        peak_tree_rss_mb = sampler.stop() if sampler is not None else None
+        returncode = process.returncode = os.waitstatus_to_exitcode(status)
+        timings = load_timings(timings_path)
+    return summarize(variant, repeat_num, returncode, wall_time, usage, timings, peak_tree_rss_mb)
+
+
+def start_fake_fleet(mode: str, num_devices: Optional[int], fleet_args: Sequence[str]) -> subprocess.Popen:
+    argv = [sys.executable, "scripts/fake_fleet.py", "--mode", mode, *fleet_args]
+    if num_devices is not None:
+        argv += ["--devices", str(num_devices)]
+    process = subprocess.Popen(argv, cwd=ROOT_DIR, env=variant_env(num_devices, os.devnull), stdout=subprocess.PIPE, text=True)
+    # The fleet logs to stdout as well, skip its log lines until it reports ready
+    for line in process.stdout:
+        if line.startswith("ready"):
+            break
+    else:
+        process.kill()
+        raise RuntimeError(f"Fake fleet exited with {process.wait()} before accepting connections")
+    logger.info("Fake fleet started: %s", line.strip())
+    # Keep draining the pipe so a chatty fleet never blocks on a full one
+    threading.Thread(target=shutil.copyfileobj, args=(process.stdout, sys.stdout), daemon=True).start()
+    return process
+
+
+def summarize(
+    variant: Variant,
+    repeat_num: int,
+    returncode: int,
+    wall_time: float,
+    usage,
+    timings: List[DeviceTiming],
+    peak_tree_rss_mb: Optional[float] = None
+    ) -> RunReport:
+    ok_timings = [timing for timing in timings if timing.ok]
+    durations = [timing.duration for timing in ok_timings]
+    connect_durations = [timing.connect_duration for timing in ok_timings if timing.connect_duration is not None]
+    command_durations = [timing.command_duration for timing in ok_timings if timing.command_duration is not None]
+    cpu_time = usage.ru_utime + usage.ru_stime
+    return RunReport(
+        variant=variant.name,
+        framework=variant.framework,
+        action=variant.action,
+        repeat_num=repeat_num,
+        returncode=returncode,
+        wall_time=wall_time,
+        cpu_time=cpu_time,
+        cpu_percent=100 * cpu_time / wall_time if wall_time else 0.0,
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        peak_rss_mb=usage.ru_maxrss / (1024 * 1024 if platform.system() == "Darwin" else 1024),
+        peak_tree_rss_mb=peak_tree_rss_mb,
+        devices_ok=len(ok_timings),
+        devices_failed=len(timings) - len(ok_timings),
+        device_p50=percentile(durations, 50),
+        device_p95=percentile(durations, 95),
+        device_p99=percentile(durations, 99),
+        connect_p50=percentile(connect_durations, 50),
+        connect_p95=percentile(connect_durations, 95),
+        command_p50=percentile(command_durations, 50),
+        command_p95=percentile(command_durations, 95),
+    )
+
+
+def format_seconds(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.3f}"
+
+
+def format_mb(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.1f}"
+
+
+def print_table(reports: List[RunReport], baseline: Dict[str, RunReport]) -> None:
+    header = (
+        f"{'variant':<18} {'#':>2} {'rc':>3} {'wall s':>9} {'cpu %':>6} {'tree MB':>8} {'proc MB':>8} {'ok':>6} {'fail':>5} "
+        f"{'p50 s':>8} {'p95 s':>8} {'p99 s':>8} {'conn p50':>8} {'cmd p50':>8}"
+    )
+    if baseline:
+        header += f" {'wall Δ':>8} {'p95 Δ':>8}"
+    print(header)
+    for report in reports:
+        line = (
+            f"{report.variant:<18} {report.repeat_num:>2} {report.returncode:>3} {report.wall_time:>9.2f} "
+            f"{report.cpu_percent:>6.1f} {format_mb(report.peak_tree_rss_mb):>8} {report.peak_rss_mb:>8.1f} "
+            f"{report.devices_ok:>6} {report.devices_failed:>5} "
+            f"{format_seconds(report.device_p50):>8} {format_seconds(report.device_p95):>8} {format_seconds(report.device_p99):>8} "
+            f"{format_seconds(report.connect_p50):>8} {format_seconds(report.command_p50):>8}"
+        )
+        base = baseline.get(report.variant)
+        if base is not None:
+            line += f" {relative_change(report.wall_time, base.wall_time):>8} {relative_change(report.device_p95, base.device_p95):>8}"
+        print(line)
+
+
+def relative_change(value: Optional[float], base: Optional[float]) -> str:
+    if value is None or not base:
+        return "-"
+    return f"{100 * (value - base) / base:+.1f}%"
+
+
+def load_baseline(path: str) -> Dict[str, RunReport]:
+    """The first run of every variant in a previous report."""
+    with open(path) as f:
+        runs = json.load(f)["runs"]
+    baseline: Dict[str, RunReport] = {}
+    for run in runs:
+        baseline.setdefault(run["variant"], RunReport(**run))
+    return baseline
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the Ansible, asyncio and Nornir scripts against the same lab devices and compare them")
+    parser.add_argument("--variants", nargs="+", choices=list(NAME_TO_VARIANT), default=[variant.name for variant in VARIANTS])
+    parser.add_argument("--devices", type=int, help="run against the first N lab devices, all of them by default")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--output", help=f"report path, {REPORT_DIR}/frameworks-<time>.json by default")
+    parser.add_argument("--baseline", help="previous report to compare wall time and p95 against")
+    parser.add_argument("--fake-fleet", choices=["loopback", "ports"], help="run against a fake IOS fleet started for the benchmark")
+    parser.add_argument("--fleet-args", default="", help="extra scripts/fake_fleet.py arguments, latency and failure injection")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    started_at = datetime.now()
+    baseline = load_baseline(args.baseline) if args.baseline else {}
+    fleet_process = start_fake_fleet(args.fake_fleet, args.devices, args.fleet_args.split()) if args.fake_fleet else None
+    reports = []
+    try:
+        for repeat_num in range(1, args.repeat + 1):
+            for name in args.variants:
+                logger.info("Running %s, repeat %d/%d", name, repeat_num, args.repeat)
+                reports.append(run_variant(NAME_TO_VARIANT[name], args.devices, repeat_num, args.fake_fleet))
+    finally:
+        if fleet_process is not None:
+            fleet_process.terminate()
+            fleet_process.wait()
+
+    output_path = Path(args.output) if args.output else REPORT_DIR / f"frameworks-{started_at:%Y%m%d-%H%M%S}.json"
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w") as f:
+        json.dump({
+            "started_at": started_at.isoformat(timespec="seconds"),
+            "num_devices": args.devices,
+            "fake_fleet": args.fake_fleet,
+            "fleet_args": args.fleet_args,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "runs": [attr.asdict(report) for report in reports],
+        }, f, indent=2)
+    print_table(reports, baseline)
+    print("tree MB: peak RSS summed over the process tree, proc MB: peak RSS of its largest single process")
+    print(f"Report written to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import argparse
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+from ruamel.yaml import YAML
+
+from app.addressing import GroupAddressAllocator
+from app.device_table import DeviceTable
+from app.lab import Lab
+from app.payloads import DEFAULT_PAYLOAD_BYTES_PER_HOST, PayloadSpec, generate_payloads
+
+HOST_COUNTS = [500, 10000]
+
+
+def make_lab(num_hosts: int) -> Lab:
+    allocator = GroupAddressAllocator(supernet="10.0.0.0/8", first_subnet_num=0)
+    name_to_device = DeviceTable.from_sequence_nums(range(1, num_hosts + 1), allocator=allocator)
+    return Lab(name_to_device=name_to_device, allocator=allocator)
+
+
+def build_legacy(lab: Lab, dir_path: Path, payload_spec: PayloadSpec) -> None:
+    # The previous emitter: ruamel for every file, a new YAML instance and a full payload copy per host_vars file
+    payloads = generate_payloads((device.name for device in lab.devices), payload_spec)
+    hosts = {"all": {"hosts": {device.name: {"ansible_host": device.mgmt_int_ip} for device in lab.devices}}}
+    yaml = YAML()
+    yaml.default_flow_style = False
+    with open(dir_path / "hosts.yaml", "w") as f:
+        yaml.dump(hosts, f)
+    (dir_path / "host_vars").mkdir()
+    for device in lab.devices:
+        yaml = YAML(typ="safe")
+        yaml.default_flow_style = False
+        with open(dir_path / f"host_vars/{device.name}.yaml", "w") as f:
+            yaml.dump(payloads.digest_to_payload[payloads.host_to_digest[device.name]], f)
+
+
+def build_ansible(lab: Lab, dir_path: Path, payload_spec: PayloadSpec) -> None:
+    lab.build_ansible_inventories(str(dir_path), payload_spec=payload_spec)
+
+
+def build_nornir(lab: Lab, dir_path: Path, payload_spec: PayloadSpec) -> None:
+    lab.build_nornir_inventory(str(dir_path), payload_spec=payload_spec)
+
+
+def dir_size(dir_path: Path) -> int:
+    return sum(path.stat().st_size for path in dir_path.rglob("*") if path.is_file())
+
+
+BUILDERS: Dict[str, Callable[[Lab, Path, PayloadSpec], None]] = {
+    "legacy-ruamel": build_legacy,
+    "ansible": build_ansible,
+    "nornir": build_nornir,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure inventory generation time as done by scripts/build_inventories.py")
+    parser.add_argument("--hosts", type=int, nargs="+", default=HOST_COUNTS)
+    parser.add_argument("--bytes-per-host", type=int, default=DEFAULT_PAYLOAD_BYTES_PER_HOST)
+    parser.add_argument("--shared-fraction", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-legacy", type=int, default=2000, help="Skip the legacy emitter above this many hosts, it takes minutes")
+    args = parser.parse_args()
+
+    payload_spec = PayloadSpec(bytes_per_host=args.bytes_per_host, shared_fraction=args.shared_fraction, seed=args.seed)
+    print(f"{payload_spec}")
+    print(f"{'hosts':>8} {'builder':>14} {'cold, s':>10} {'warm, s':>10} {'size, MB':>10}")
+    for num_hosts in args.hosts:
+        lab = make_lab(num_hosts)
+        for builder_name, builder in BUILDERS.items():
+            if builder_name == "legacy-ruamel" and num_hosts > args.max_legacy:
+                continue
+            dir_path = Path(tempfile.mkdtemp())
+            try:
+                start = time.perf_counter()
+                builder(lab, dir_path, payload_spec)
+                cold = time.perf_counter() - start
+                if builder_name == "legacy-ruamel":
+                    warm_str = "-"
+                else:
+                    start = time.perf_counter()
+                    builder(lab, dir_path, payload_spec)
+                    warm_str = f"{time.perf_counter() - start:.2f}"
+                size_mb = dir_size(dir_path) / 1024 / 1024
+            finally:
+                shutil.rmtree(dir_path)
+            print(f"{num_hosts:>8} {builder_name:>14} {cold:>10.2f} {warm_str:>10} {size_mb:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
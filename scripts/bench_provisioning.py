@@ -0,0 +1,79 @@
+import argparse
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, List
+
+from app.constants import NUM_DEVICES_PER_SWITCH, ROUTER_CONFIG_TEMPLATE, GNS3_PROVISION_MAX_IN_FLIGHT
+from app.device import Device
+from app.gns3_fake import FAKE_ROOT_API, EndpointProfile, FakeGNS3Controller
+from app.gns3_project import GNS3Project
+from app.concurrency import AdaptiveLimiter
+from app.lab import Lab
+
+logger = logging.getLogger(__name__)
+
+DEVICE_COUNTS = [100, 500, 5000]
+PROJECT_ID = "bench-project"
+
+
+def create_controller(num_devices: int, latency: float, jitter: float, max_concurrency: int, error_rate: float) -> FakeGNS3Controller:
+    profile = EndpointProfile(latency=latency, jitter=jitter, max_concurrency=max_concurrency, error_rate=error_rate)
+    controller = FakeGNS3Controller(PROJECT_ID, default_profile=profile, seed=0)
+    num_switches = (num_devices - 1) // NUM_DEVICES_PER_SWITCH + 1
+    for switch_num in range(1, num_switches + 1):
+        controller.add_node(f"Switch{switch_num}", node_type="ethernet_switch", x=switch_num * 1000, y=0, status="started")
+    return controller
+
+
+def report(phase: str, num_devices: int, elapsed: float, controller: FakeGNS3Controller, project: GNS3Project) -> None:
+    print(
+        f"{phase:<12} {num_devices:>6} devices {elapsed:>8.2f}s {num_devices / elapsed:>9.1f} routers/s "
+        f"window={project.limiter.limit}"
+    )
+    for endpoint, stats in sorted(controller.stats.items()):
+        print(
+            f"    {endpoint:<22} calls={len(stats.durations):<6} errors={stats.num_errors:<4} "
+            f"p50={stats.percentile(50) * 1000:>7.1f}ms p99={stats.percentile(99) * 1000:>7.1f}ms"
+        )
+    controller.reset_stats()
+
+
+async def timed(phase: str, num_devices: int, controller: FakeGNS3Controller, project: GNS3Project, coro_factory: Callable[[], Awaitable]) -> None:
+    start = time.perf_counter()
+    result = await coro_factory()
+    if result:
+        print(f"{phase}: {len(result)} devices failed")
+    report(phase, num_devices, time.perf_counter() - start, controller, project)
+
+
+async def run_benchmark(num_devices: int, args: argparse.Namespace) -> None:
+    controller = create_controller(num_devices, args.latency, args.jitter, args.max_concurrency, args.error_rate)
+    devices: List[Device] = [Device.from_sequence_num(num) for num in range(1, num_devices + 1)]
+    template = Lab({}).get_template(ROUTER_CONFIG_TEMPLATE)
+
+    async with controller.create_http_client() as http_client:
+        project = await GNS3Project.fetch_from_id(PROJECT_ID, http_client=http_client, root_api=FAKE_ROOT_API, limiter=AdaptiveLimiter())
+        controller.reset_stats()
+        await timed("add_routers", num_devices, controller, project, lambda: project.add_routers(devices, template=template, max_in_flight=args.max_in_flight))
+        await timed("start", num_devices, controller, project, lambda: project.staggered_start(expected_boot_time=0))
+        await timed("teardown", num_devices, controller, project, lambda: project.delete_nodes(device.hostname for device in devices))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure GNS3Project provisioning throughput against a fake controller")
+    parser.add_argument("--devices", type=int, nargs="+", default=DEVICE_COUNTS)
+    parser.add_argument("--latency", type=float, default=0.02, help="Per-call controller latency, seconds")
+    parser.add_argument("--jitter", type=float, default=0.01, help="Random extra latency per call, seconds")
+    parser.add_argument("--max-concurrency", type=int, default=50, help="Calls served in parallel per endpoint")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--max-in-flight", type=int, default=GNS3_PROVISION_MAX_IN_FLIGHT, help="Devices provisioned concurrently")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    for num_devices in args.devices:
+        asyncio.run(run_benchmark(num_devices, args))
+
+
+if __name__ == "__main__":
+    main()
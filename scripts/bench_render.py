@@ -0,0 +1,80 @@
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from ipaddress import IPv4Address, IPv4Interface
+from typing import List
+
+from jinja2 import Environment, PackageLoader
+
+from app.constants import ROUTER_CONFIG_TEMPLATE
+from app.device import Device
+from app.render import RenderEngine
+
+DEVICE_COUNTS = [500, 10000, 100000]
+# MGMT_IP_TEMPLATE runs out of octets past 255 switches, benchmark devices get consecutive /24s of 10.0.0.0/8 instead
+BASE_ADDRESS = int(IPv4Address("10.0.0.0"))
+
+
+def make_devices(num_devices: int) -> List[Device]:
+    return [
+        Device(num=num, mgmt_int=IPv4Interface((BASE_ADDRESS + (num - 1) // 250 * 256 + (num - 1) % 250 + 1, 24)))
+        for num in range(1, num_devices + 1)
+    ]
+
+
+def render_uncached(devices: List[Device]) -> int:
+    # What Lab.get_template used to do: a new Environment, and a recompiled template, for every lookup
+    for device in devices:
+        template = Environment(loader=PackageLoader('app', 'templates')).get_template(ROUTER_CONFIG_TEMPLATE)
+        template.render(device=device)
+    return len(devices)
+
+
+def render_cached(devices: List[Device]) -> int:
+    return sum(1 for _ in RenderEngine(ROUTER_CONFIG_TEMPLATE, processes=1).render_many(devices))
+
+
+def render_pool(devices: List[Device]) -> int:
+    return sum(1 for _ in RenderEngine(ROUTER_CONFIG_TEMPLATE).render_many(devices))
+
+
+def render_pool_to_dir(devices: List[Device]) -> int:
+    dir_path = tempfile.mkdtemp()
+    try:
+        return RenderEngine(ROUTER_CONFIG_TEMPLATE).render_to_dir(devices, dir_path)
+    finally:
+        shutil.rmtree(dir_path)
+
+
+RENDERERS = {
+    "uncached": render_uncached,
+    "cached": render_cached,
+    "pool": render_pool,
+    "pool-to-dir": render_pool_to_dir,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure router config rendering throughput")
+    parser.add_argument("--devices", type=int, nargs="+", default=DEVICE_COUNTS)
+    parser.add_argument("--renderers", nargs="+", choices=RENDERERS, default=list(RENDERERS))
+    parser.add_argument("--max-uncached", type=int, default=10000, help="Skip the uncached renderer above this many devices")
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs")
+    print(f"{'devices':>8} {'renderer':>12} {'time, s':>10} {'configs/s':>12}")
+    for num_devices in args.devices:
+        devices = make_devices(num_devices)
+        for renderer_name in args.renderers:
+            if renderer_name == "uncached" and num_devices > args.max_uncached:
+                continue
+            start = time.perf_counter()
+            num_rendered = RENDERERS[renderer_name](devices)
+            elapsed = time.perf_counter() - start
+            print(f"{num_devices:>8} {renderer_name:>12} {elapsed:>10.2f} {num_rendered / elapsed:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
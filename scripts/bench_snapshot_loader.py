@@ -0,0 +1,183 @@
+import argparse
+import functools
+import os
+import shutil
+import tempfile
+import json
+import multiprocessing
+import resource
+import time
+import uuid
+from typing import Any, Dict, Iterator, List, Tuple
+
+from app.gns3_project import GNS3Project
+from app.gns3_node import GNS3Node
+from app.gns3_link import GNS3Link
+from app import gns3_stream
+from app.snapshot_cache import SnapshotCache
+
+NODE_COUNTS = [1000, 10000, 50000]
+CHUNK_SIZE = 64 * 1024
+PROJECT_ID = "bench-project"
+
+
+def make_node(num: int, node_id: str) -> Dict[str, Any]:
+    # Mirrors the shape of a dynamips node returned by the controller
+    return {
+        "compute_id": "local",
+        "console": 5000 + num,
+        "console_auto_start": False,
+        "console_host": "0.0.0.0",
+        "console_type": "telnet",
+        "command_line": "",
+        "custom_adapters": [],
+        "first_port_name": None,
+        "height": 45,
+        "label": {"rotation": 0, "style": "font-family: TypeWriter;font-size: 10.0;font-weight: bold;fill: #000000;fill-opacity: 1.0;", "text": f"{num}", "x": 13, "y": -25},
+        "locked": False,
+        "name": f"{num}",
+        "node_directory": f"/opt/gns3/projects/project-files/dynamips/{node_id}",
+        "node_id": node_id,
+        "node_type": "dynamips",
+        "port_name_format": "Ethernet{0}",
+        "port_segment_size": 0,
+        "ports": [
+            {"adapter_number": adapter, "data_link_types": {"Ethernet": "DLT_EN10MB"}, "link_type": "ethernet", "name": f"FastEthernet{adapter}/0", "port_number": 0, "short_name": f"f{adapter}/0"}
+            for adapter in range(3)
+        ],
+        "project_id": "1cd5351d-f1f8-4ace-9c8a-d2d52ea5ed9f",
+        "properties": {"auto_delete_disks": True, "chassis": "", "disk0": 0, "disk1": 0, "exec_area": 64, "idlemax": 500, "idlepc": "0x6026ffb8", "idlesleep": 30, "image": "c7200-adventerprisek9-mz.124-24.T5.image", "mac_addr": "ca01.0000.0000", "nvram": 512, "platform": "c7200", "ram": 512, "slot0": "C7200-IO-FE", "slot1": "PA-FE-TX", "slot2": "PA-FE-TX", "sparsemem": True, "system_id": "FTX0945W0MY"},
+        "status": "started",
+        "symbol": ":/symbols/affinity/circle/blue/router.svg",
+        "width": 66,
+        "x": num % 1000,
+        "y": num // 1000,
+        "z": 1
+    }
+
+
+def make_link(num: int, node_id: str, switch_id: str) -> Dict[str, Any]:
+    return {
+        "capture_compute_id": None,
+        "capture_file_name": None,
+        "capture_file_path": None,
+        "capturing": False,
+        "filters": {},
+        "link_id": str(uuid.UUID(int=num)),
+        "link_type": "ethernet",
+        "nodes": [
+            {"adapter_number": 0, "label": {"rotation": 0, "style": "font-size: 10; font-style: Verdana", "text": "f0/0", "x": 54, "y": 69}, "node_id": node_id, "port_number": 0},
+            {"adapter_number": 0, "label": {"rotation": 0, "style": "font-size: 10; font-style: Verdana", "text": f"e{num}", "x": -4, "y": -40}, "node_id": switch_id, "port_number": num}
+        ],
+        "project_id": "1cd5351d-f1f8-4ace-9c8a-d2d52ea5ed9f",
+        "suspend": False
+    }
+
+
+def generate_payload(num_nodes: int) -> Iterator[Tuple[str, bytes]]:
+    """Yield ("nodes" | "links", encoded JSON fragment) pieces, so the payload itself never sits in memory."""
+    switch_id = str(uuid.UUID(int=0))
+    for kind, make in (("nodes", make_node), ("links", make_link)):
+        yield kind, b"["
+        for num in range(1, num_nodes + 1):
+            node_id = str(uuid.UUID(int=num))
+            item = make(num, node_id) if kind == "nodes" else make(num, node_id, switch_id)
+            prefix = b"," if num > 1 else b""
+            yield kind, prefix + json.dumps(item).encode()
+        yield kind, b"]"
+
+
+def chunked(pieces: Iterator[bytes]) -> Iterator[bytes]:
+    buffer = bytearray()
+    for piece in pieces:
+        buffer += piece
+        if len(buffer) >= CHUNK_SIZE:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+def load_full(num_nodes: int) -> int:
+    bodies: Dict[str, bytes] = {"nodes": b"", "links": b""}
+    parts: Dict[str, List[bytes]] = {"nodes": [], "links": []}
+    for kind, piece in generate_payload(num_nodes):
+        parts[kind].append(piece)
+    for kind in parts:
+        bodies[kind] = b"".join(parts[kind])
+    parts.clear()
+    name_to_node, _ = GNS3Project.parse_nodes_data(json.loads(bodies["nodes"]))
+    alt_id_to_link = GNS3Project.parse_links_data(json.loads(bodies["links"]))
+    return len(name_to_node) + len(alt_id_to_link)
+
+
+def load_streaming(num_nodes: int) -> int:
+    name_to_node = {}
+    alt_id_to_link = {}
+    nodes_pieces = (piece for kind, piece in generate_payload(num_nodes) if kind == "nodes")
+    for node_data in gns3_stream.iter_json_array(chunked(nodes_pieces)):
+        node = GNS3Node.load(node_data)
+        name_to_node[node.name] = node
+    links_pieces = (piece for kind, piece in generate_payload(num_nodes) if kind == "links")
+    for link_data in gns3_stream.iter_json_array(chunked(links_pieces)):
+        link = GNS3Link.load(link_data)
+        alt_id_to_link[link.alt_id] = link
+    return len(name_to_node) + len(alt_id_to_link)
+
+
+def load_cache(num_nodes: int, cache_path: str) -> int:
+    snapshot = SnapshotCache(cache_path).load(PROJECT_ID)
+    name_to_node, alt_id_to_link = snapshot
+    return len(name_to_node) + len(alt_id_to_link)
+
+
+def prepare_cache(num_nodes: int, cache_path: str) -> None:
+    name_to_node = {}
+    alt_id_to_link = {}
+    for kind, piece in generate_payload(num_nodes):
+        if piece in (b"[", b"]"):
+            continue
+        data = json.loads(piece.lstrip(b","))
+        if kind == "nodes":
+            node = GNS3Node.load(data)
+            name_to_node[node.name] = node
+        else:
+            link = GNS3Link.load(data)
+            alt_id_to_link[link.alt_id] = link
+    SnapshotCache(cache_path).save(GNS3Project(id=PROJECT_ID, name_to_node=name_to_node, alt_id_to_link=alt_id_to_link))
+
+
+def run_case(loader_name: str, num_nodes: int) -> Tuple[float, float]:
+    if loader_name == "cache":
+        cache_dir = tempfile.mkdtemp()
+        cache_path = os.path.join(cache_dir, "snapshot.sqlite")
+        prepare_cache(num_nodes, cache_path)
+        loader = functools.partial(load_cache, cache_path=cache_path)
+    else:
+        loader = {"full": load_full, "streaming": load_streaming}[loader_name]
+    start = time.perf_counter()
+    loader(num_nodes)
+    elapsed = time.perf_counter() - start
+    if loader_name == "cache":
+        shutil.rmtree(cache_dir)
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return elapsed, peak_rss_mb
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare full, streaming and warm-cache GNS3 project snapshot loading")
+    parser.add_argument("--nodes", type=int, nargs="+", default=NODE_COUNTS)
+    args = parser.parse_args()
+
+    # Every case runs in a fresh interpreter so peak RSS is not shared between cases
+    ctx = multiprocessing.get_context("spawn")
+    print(f"{'nodes':>8} {'loader':>10} {'time, s':>10} {'peak RSS, MB':>14}")
+    for num_nodes in args.nodes:
+        for loader_name in ("full", "streaming", "cache"):
+            with ctx.Pool(1) as pool:
+                elapsed, peak_rss_mb = pool.apply(run_case, (loader_name, num_nodes))
+            print(f"{num_nodes:>8} {loader_name:>10} {elapsed:>10.2f} {peak_rss_mb:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,38 @@
 import asyncio
-import aiofiles
-from itertools import groupby
-from operator import attrgetter
 import logging
 import logging.config
-from ipaddress import IPv4Network
-from jinja2 import Environment, PackageLoader
 from app.gns3_project import GNS3Project
-from app.device import Device
-from app.constants import START_ROUTER_NUM, END_ROUTER_NUM, PROJECT_ID, LOGGING_DICT, ROUTER_CONFIG_TEMPLATE
-from typing import List, Tuple, TYPE_CHECKING
+from app.lab import Lab
+from app.reconcile import plan_reconcile, execute_plan
+from app.constants import PROJECT_ID, LOGGING_DICT, ROUTER_CONFIG_TEMPLATE
+from app import utils
+from app import metrics
 
 logger = logging.getLogger(__name__)
 
 async def main():
-    jinja_env = Environment(
-        loader=PackageLoader('app', 'templates')
-    )
-    devices = [Device.from_sequence_num(i) for i in range (START_ROUTER_NUM, END_ROUTER_NUM + 1)]   
-
-    # dhcp_template = jinja_env.get_template(DHCP_CONFIG_TEMPLATE)
-    # await generate_dhcp_config(devices, template=dhcp_template)
-    
-    router_config_template = jinja_env.get_template(ROUTER_CONFIG_TEMPLATE)
-    gns3_project = await GNS3Project.fetch_from_id(PROJECT_ID)
+    lab = Lab.create()
+    router_config_template = lab.get_template(ROUTER_CONFIG_TEMPLATE)
     
-    await gns3_project.add_routers(devices=devices, template=router_config_template)
+    async with await GNS3Project.load_cached(PROJECT_ID) as gns3_project:
+        # Planning needs the live state rather than the cached snapshot
+        await gns3_project.wait_refreshed()
+        plan = plan_reconcile(
+            lab.devices,
+            gns3_project,
+            template=router_config_template,
+            update_configs=utils.is_env_var("ALWAYS_UPDATE_ROUTER_CFG"),
+            prune=utils.is_env_var("PRUNE_ROUTERS"),
+        )
+        if plan.is_empty:
+            logger.info("Topology is already converged")
+            return
+        
+        result = await execute_plan(plan, gns3_project)
+        if not result.ok:
+            logger.error("Failed actions: %s", ", ".join(sorted(result.failed)))
         
 if __name__ == "__main__":
     logging.config.dictConfig(LOGGING_DICT)
+    metrics.start_from_env()
     asyncio.run(main())
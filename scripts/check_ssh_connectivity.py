@@ -6,20 +6,26 @@ from netmiko import ConnectHandler
 from app.constants import LOGGING_DICT, DEVICE_USERNAME, DEVICE_PASSWORD
 from app.lab import Lab
 from app.device import Device
+from app import tracing
 
 logger = logging.getLogger(__name__)
 
 
 def check_ssh_connectivity(device: Device):
     params = {
-        'host': device.mgmt_int_ip,
+        'host': device.host,
+        'port': device.ssh_port,
         'username': DEVICE_USERNAME,
         'password': DEVICE_PASSWORD,
         'device_type': 'cisco_ios'
     }
     logger.info("Attempting to connect to %r", device.name)
-    with ConnectHandler(**params) as conn:
-        _ = conn.find_prompt()
+    with tracing.span("check_ssh", "ssh", track=device.name) as span:
+        with span.phase("connect"):
+            conn = ConnectHandler(**params)
+        with conn:
+            with span.phase("service", label="find_prompt"):
+                _ = conn.find_prompt()
         
 
 def main():
@@ -11,16 +11,16 @@ logger = logging.getLogger(__name__)
 
 async def main():
     # devices = [Device.from_sequence_num(i) for i in range (START_ROUTER_NUM, END_ROUTER_NUM + 1)]
-    gns3_project = await GNS3Project.fetch_from_id(PROJECT_ID)
-    switch_ids = {node.id for node in gns3_project.nodes if node.name.startswith('Switch')}
-    # await gns3_project.delete_nodes(device.hostname for device in devices)
-    for link in gns3_project.links:
-        if link.first_port.node_id in switch_ids and link.first_port.port_num != 0:
-            node_id = link.second_port.node_id
-            await gns3_project.delete_node(node_id=node_id)
-        elif link.second_port.node_id in switch_ids and link.second_port.port_num != 0:
-            node_id = link.first_port.node_id
-            await gns3_project.delete_node(node_id=node_id)
+    async with await GNS3Project.load_cached(PROJECT_ID) as gns3_project:
+        await gns3_project.wait_refreshed()
+        # await gns3_project.delete_nodes(device.hostname for device in devices)
+        routers = [
+            router
+            for switch in list(gns3_project.nodes) if switch.is_switch
+            for port_num, router in gns3_project.get_switch_port_to_node(switch).items() if port_num != 0
+        ]
+        for router in routers:
+            await gns3_project.delete_node(node_name=router.name, node_id=router.id)
             
 if __name__ == '__main__':
     logging.config.dictConfig(LOGGING_DICT)
@@ -0,0 +1,31 @@
+import argparse
+import logging
+import logging.config
+
+from app.constants import LOGGING_DICT, RESULTS_STORE_PATH
+from app.results_store import ResultsStore
+
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export a stored collection run to one text file per device")
+    parser.add_argument("--run", help="run id, the latest run by default")
+    parser.add_argument("--store", default=RESULTS_STORE_PATH)
+    parser.add_argument("--dir", default="output/routers")
+    parser.add_argument("--list", action="store_true", help="list the stored runs and exit")
+    args = parser.parse_args()
+
+    store = ResultsStore(args.store)
+    if args.list:
+        for run_id in store.runs():
+            print(run_id)
+        return
+    with store.open_run(args.run) as reader:
+        num_files = reader.export_text(args.dir)
+    logger.info("Exported %d devices of run %r to %s", num_files, reader.run_id, args.dir)
+
+
+if __name__ == "__main__":
+    logging.config.dictConfig(LOGGING_DICT)
+    main()
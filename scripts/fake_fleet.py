@@ -0,0 +1,61 @@
+import argparse
+import asyncio
+import logging
+import logging.config
+
+from app.constants import LOGGING_DICT
+from app.fake_ios import FakeIosFleet, FleetMode, FleetProfile
+from app.lab import Lab
+
+logger = logging.getLogger(__name__)
+
+
+async def serve(args: argparse.Namespace) -> None:
+    lab = Lab.create(num_devices=args.devices)
+    profile = FleetProfile(
+        login_latency=args.login_latency,
+        command_latency=args.command_latency,
+        jitter=args.jitter,
+        connect_error_rate=args.connect_error_rate,
+        disconnect_rate=args.disconnect_rate,
+        hang_rate=args.hang_rate,
+        max_sessions_per_device=args.max_sessions,
+        ssh_enabled=not args.ssh_disabled
+    )
+    fleet = FakeIosFleet(lab.devices, mode=FleetMode(args.mode), profile=profile, seed=args.seed)
+    await fleet.start(ssh=not args.no_ssh, telnet=not args.no_telnet)
+    # Read by scripts/bench_frameworks.py to know the fleet accepts connections
+    print(f"ready {len(fleet)} devices", flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        logger.info("Fake fleet stats: %s", fleet.stats)
+        await fleet.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve the lab devices as fake IOS routers over SSH and telnet on loopback")
+    parser.add_argument("--mode", choices=[mode.value for mode in FleetMode], default=FleetMode.LOOPBACK.value)
+    parser.add_argument("--devices", type=int, help="serve the first N lab devices, LAB_NUM_DEVICES or all of them by default")
+    parser.add_argument("--login-latency", type=float, default=0.0, help="seconds")
+    parser.add_argument("--command-latency", type=float, default=0.0, help="seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random extra latency, seconds")
+    parser.add_argument("--connect-error-rate", type=float, default=0.0)
+    parser.add_argument("--disconnect-rate", type=float, default=0.0)
+    parser.add_argument("--hang-rate", type=float, default=0.0)
+    parser.add_argument("--max-sessions", type=int, default=5, help="concurrent sessions per device")
+    parser.add_argument("--ssh-disabled", action="store_true", help="start with SSH reported disabled until crypto keys are generated")
+    parser.add_argument("--no-ssh", action="store_true")
+    parser.add_argument("--no-telnet", action="store_true")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    logging.config.dictConfig(LOGGING_DICT)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
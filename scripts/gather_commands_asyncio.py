@@ -1,48 +1,45 @@
 import asyncio
-import aiofiles
+import logging
+import logging.config
+import attr
 import uvloop
-import netdev
 import netdev.exceptions
 
 from app.lab import Lab
+from app.constants import LOGGING_DICT, COLLECTOR_MAX_IN_FLIGHT
+from app.benchmark import TimingSink, timings_path_from_env
+from app.collector import COLLECTOR_RETRY_POLICY, CommandCollector, NetdevConnector, TeeSink
+from app.results_store import ResultsStore, ResultsStoreSink
+from app import metrics
 from app import utils
-from app import constants
-
-COMMANDS = ['show version', 'show ip int br', 'show memory statistics', 'show arp', 'show ip route', 'show interfaces']
-
-async def _gather_commands(device, params) -> None:
-    async with netdev.create(**params) as conn:
-        async with aiofiles.open(f"output/routers/{device.name}.txt", 'w') as f:
-            for command in COMMANDS:
-                output = await conn.send_command(command)
-                await f.write(f"=== {command} ===\n{output}\n\n")
 
+NETDEV_RETRY_POLICY = attr.evolve(
+    COLLECTOR_RETRY_POLICY,
+    retry_exceptions=COLLECTOR_RETRY_POLICY.retry_exceptions + (netdev.exceptions.TimeoutError,)
+)
 
-async def gather_commands(device) -> None:
-    params = {
-        'username': constants.DEVICE_USERNAME,
-        'password': constants.DEVICE_PASSWORD,
-        'device_type': 'cisco_ios',
-        'host': device.mgmt_int_ip,
-        'timeout': 90
-    }
-    try:
-        await _gather_commands(device, params)
-    except netdev.exceptions.TimeoutError:
-        await _gather_commands(device, params)
+COMMANDS = ['show version', 'show ip int br', 'show memory statistics', 'show arp', 'show ip route', 'show interfaces']
 
 
 async def main():
     lab = Lab.create()
-    devices = list(lab.devices)
-    sema = asyncio.BoundedSemaphore(100)
-    gather_commands_with_sema = utils.with_semaphore(sema)(gather_commands)
-    tasks = [
-        asyncio.create_task(gather_commands_with_sema(device))
-        for device in devices
-    ]
-    await asyncio.gather(*tasks)
-    
+    store = ResultsStore()
+    sink = ResultsStoreSink(store)
+    timings_path = timings_path_from_env()
+    collector = CommandCollector(
+        connector=NetdevConnector(),
+        sink=TeeSink(sink, TimingSink(timings_path)) if timings_path else sink,
+        max_in_flight=COLLECTOR_MAX_IN_FLIGHT,
+        retry_policy=NETDEV_RETRY_POLICY
+    )
+    await collector.run(lab.devices, COMMANDS)
+    if utils.is_env_var("EXPORT_TEXT"):
+        with store.open_run(sink.run_id) as reader:
+            reader.export_text("output/routers")
+
+
 if __name__ == '__main__':
+    logging.config.dictConfig(LOGGING_DICT)
+    metrics.start_from_env()
     uvloop.install()
     asyncio.run(main())
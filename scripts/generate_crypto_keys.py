@@ -10,6 +10,7 @@ from app.constants import LOGGING_DICT, DEVICE_USERNAME, DEVICE_PASSWORD
 from app.lab import Lab
 from app.device import Device
 from app import utils
+from app import tracing
 
 logger = logging.getLogger(__name__)
 
@@ -24,24 +25,28 @@ def is_ssh_enabled(conn: BaseConnection, device_name: str) -> bool:
 @utils.retry((NetMikoTimeoutException, OSError, ValueError), max_retries=2)
 def generate_crypto_key(device: Device):
     params = {
-        'host': device.mgmt_int_ip,
+        'host': device.host,
+        'port': device.telnet_port,
         'username': DEVICE_USERNAME,
         'password': DEVICE_PASSWORD,
         'device_type': 'cisco_ios_telnet'
     }
     # logger.info("Attempting to connect to %r", device.name)
-    with ConnectHandler(**params) as conn:
-        if is_ssh_enabled(conn, device.name):
-            logger.info("Router %r - SSH v2 is already enabled, skipping", device.name)
-        else:
-            prompt = f"{device.name}#"
-            #prompt = conn.find_prompt()
-            conn.send_config_set("crypto key gen rsa mod 2048")
-            conn.send_command("write mem\n\n", expect_string=prompt)
+    with tracing.span("generate_crypto_key", "telnet", track=device.name) as span:
+        with span.phase("connect"):
+            conn = ConnectHandler(**params)
+        with conn, span.phase("service"):
             if is_ssh_enabled(conn, device.name):
-                logger.info("Enabled SSHv2 on %r", device.name)
+                logger.info("Router %r - SSH v2 is already enabled, skipping", device.name)
             else:
-                logger.error("Failed to enable SSHv2 on %r", device.name)
+                prompt = f"{device.name}#"
+                #prompt = conn.find_prompt()
+                conn.send_config_set("crypto key gen rsa mod 2048")
+                conn.send_command("write mem\n\n", expect_string=prompt)
+                if is_ssh_enabled(conn, device.name):
+                    logger.info("Enabled SSHv2 on %r", device.name)
+                else:
+                    logger.error("Failed to enable SSHv2 on %r", device.name)
 
         
         # if "SSH Disabled - version 2.0" in sh_ip_ssh_output:
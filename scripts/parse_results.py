@@ -0,0 +1,29 @@
+import argparse
+import logging
+import logging.config
+
+from app.constants import LOGGING_DICT, RESULTS_STORE_PATH
+from app.parsers import ParseEngine
+from app.results_store import ResultsStore
+
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Parse the show command outputs of a stored run into CSV tables")
+    parser.add_argument("--run", help="run id, the latest run by default")
+    parser.add_argument("--store", default=RESULTS_STORE_PATH)
+    parser.add_argument("--dir", default="output/parsed")
+    parser.add_argument("--processes", type=int, help="worker processes, the number of CPUs by default")
+    args = parser.parse_args()
+
+    engine = ParseEngine(processes=args.processes)
+    with ResultsStore(args.store).open_run(args.run) as reader:
+        tables = engine.parse_run(reader)
+    tables.write_csv(args.dir)
+    logger.info("Run %r: %s, tables written to %s", reader.run_id, tables.stats, args.dir)
+
+
+if __name__ == "__main__":
+    logging.config.dictConfig(LOGGING_DICT)
+    main()
@@ -3,8 +3,10 @@ import logging
 import logging.config
 from typing import TYPE_CHECKING
 
-from app.constants import LOGGING_DICT, PROJECT_ID
+from app.constants import LOGGING_DICT, PROJECT_ID, GNS3_START_MAX_CPU_PERCENT
 from app.gns3_project import GNS3Project
+from app.lab import Lab
+from app import metrics
 
 if TYPE_CHECKING:
     from jinja2.environment import Template
@@ -12,10 +14,17 @@ if TYPE_CHECKING:
 logger = logging.getLogger(__name__)
 
 async def main():
-    gns3_project = await GNS3Project.fetch_from_id(PROJECT_ID)
-    #await gns3_project.start_all_nodes()
-    await gns3_project.staggered_start()
+    lab = Lab.create()
+    name_to_host = {device.hostname: device.mgmt_int_ip for device in lab.devices}
+    async with await GNS3Project.load_cached(PROJECT_ID) as gns3_project:
+        # Statuses in the cached snapshot may be stale, a node stopped since would never be started
+        await gns3_project.wait_refreshed()
+        #await gns3_project.start_all_nodes()
+        failures = await gns3_project.staggered_start(name_to_host=name_to_host, max_cpu_percent=GNS3_START_MAX_CPU_PERCENT)
+        if failures:
+            logger.error("Failed to boot %d nodes: %s", len(failures), ", ".join(sorted(failures)))
     
 if __name__ == '__main__':
     logging.config.dictConfig(LOGGING_DICT)
+    metrics.start_from_env()
     asyncio.run(main())
\ No newline at end of file
@@ -12,8 +12,10 @@ if TYPE_CHECKING:
 logger = logging.getLogger(__name__)
 
 async def main():
-    gns3_project = await GNS3Project.fetch_from_id(PROJECT_ID)
-    await gns3_project.stop_all_nodes()
+    async with await GNS3Project.load_cached(PROJECT_ID) as gns3_project:
+        # A refresh finishing after the stop could save pre-stop statuses into the snapshot
+        await gns3_project.wait_refreshed()
+        await gns3_project.stop_all_nodes()
     
 if __name__ == '__main__':
     logging.config.dictConfig(LOGGING_DICT)
@@ -6,6 +6,10 @@ from app import constants
 from app.constants import LOGGING_DICT, PROJECT_ID
 from app.lab import Lab
 from app.gns3_project import GNS3Project
+from app.config_sync import sync_configs
+from app.render import RenderEngine
+from app import utils
+from app import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -13,14 +17,16 @@ logger = logging.getLogger(__name__)
 async def main():
     lab = Lab.create()
     
-    gns3_project = await GNS3Project.fetch_from_id(PROJECT_ID)
-    template = lab.get_template(constants.ROUTER_CONFIG_TEMPLATE)
-    for device in lab.devices:
-        gns3_node = gns3_project.get_node(device.name)
-        node_cfg = template.render(device=device)
-        await gns3_project.update_node_config(gns3_node, config=node_cfg)
+    async with await GNS3Project.load_cached(PROJECT_ID) as gns3_project:
+        # Configs are uploaded by node ID, those of nodes recreated since the snapshot would 404
+        await gns3_project.wait_refreshed()
+        template = RenderEngine(constants.ROUTER_CONFIG_TEMPLATE)
+        report = await sync_configs(gns3_project, lab.devices, template=template, force=utils.is_env_var("FORCE_CONFIG_PUSH"))
+        for node_name, exc in report.failed.items():
+            logger.error("Node %r config push has failed: %r", node_name, exc)
         
 
 if __name__ == '__main__':
     logging.config.dictConfig(LOGGING_DICT)
-    asyncio.run(main())
\ No newline at end of file
+    metrics.start_from_env()
+    asyncio.run(main())
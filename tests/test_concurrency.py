@@ -0,0 +1,38 @@
+import asyncio
+import unittest
+
+from app.concurrency import AdaptiveLimiter
+
+
+class AdaptiveLimiterTest(unittest.IsolatedAsyncioTestCase):
+    async def test_cancelled_waiter_dropped_by_release(self) -> None:
+        limiter = AdaptiveLimiter(initial_limit=1, min_limit=1, max_limit=1)
+        await limiter.acquire()
+        waiter_task = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        waiter_task.cancel()
+        # Runs before the cancelled task resumes, so the waiter is popped from the queue first
+        limiter.release()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter_task
+        self.assertEqual(limiter.in_flight, 0)
+        self.assertEqual(limiter.queue_depth, 0)
+        await asyncio.wait_for(limiter.acquire(), timeout=1)
+        self.assertEqual(limiter.in_flight, 1)
+
+    async def test_slot_handed_to_cancelled_waiter_is_passed_on(self) -> None:
+        limiter = AdaptiveLimiter(initial_limit=1, min_limit=1, max_limit=1)
+        await limiter.acquire()
+        first = asyncio.create_task(limiter.acquire())
+        second = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        limiter.release()
+        first.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await first
+        await asyncio.wait_for(second, timeout=1)
+        self.assertEqual(limiter.in_flight, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import os
+import tempfile
+import unittest
+
+from jinja2 import Template
+
+from app.concurrency import AdaptiveLimiter
+from app.config_sync import ConfigHashStore, sync_configs
+from app.device import Device
+from app.gns3_fake import FAKE_ROOT_API, FakeGNS3Controller
+from app.gns3_project import GNS3Project
+
+PROJECT_ID = "test-project"
+NUM_DEVICES = 1200
+
+
+class CountingTemplate(Template):
+    num_rendered = 0
+
+    def render(self, *args, **kwargs) -> str:
+        type(self).num_rendered += 1
+        return super().render(*args, **kwargs)
+
+
+class SyncConfigsTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = ConfigHashStore(os.path.join(self.tmp_dir.name, "snapshots.sqlite"))
+        self.controller = FakeGNS3Controller(PROJECT_ID)
+        self.devices = [Device.from_sequence_num(num) for num in range(1, NUM_DEVICES + 1)]
+        for device in self.devices:
+            self.controller.add_node(device.hostname)
+        self.project = await GNS3Project.fetch_from_id(
+            PROJECT_ID,
+            http_client=self.controller.create_http_client(),
+            root_api=FAKE_ROOT_API,
+            limiter=AdaptiveLimiter()
+        )
+        self.template = CountingTemplate("hostname {{ device.hostname }}")
+        CountingTemplate.num_rendered = 0
+
+    async def asyncTearDown(self) -> None:
+        await self.project.http_client.aclose()
+        self.tmp_dir.cleanup()
+
+    async def test_pushes_while_rendering(self) -> None:
+        rendered_at_push = []
+        update_node_config = self.project.update_node_config
+
+        async def record_and_update(node, config):
+            rendered_at_push.append(CountingTemplate.num_rendered)
+            await update_node_config(node, config)
+
+        self.project.update_node_config = record_and_update
+        report = await sync_configs(self.project, self.devices, self.template, store=self.store, max_in_flight=4)
+
+        self.assertEqual(len(report.changed), NUM_DEVICES)
+        self.assertLess(rendered_at_push[0], NUM_DEVICES)
+        node_id = self.project.get_node("7").id
+        self.assertEqual(self.controller.configs[node_id], "hostname 7")
+
+    async def test_unchanged_configs_are_skipped(self) -> None:
+        await sync_configs(self.project, self.devices, self.template, store=self.store)
+        self.devices[0] = Device.from_sequence_num(NUM_DEVICES + 1)
+        report = await sync_configs(self.project, self.devices, self.template, store=self.store)
+        self.assertEqual((len(report.changed), len(report.skipped), report.missing), (0, NUM_DEVICES - 1, [str(NUM_DEVICES + 1)]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+
+from app.constants import NUM_DEVICES_PER_SWITCH
+from app.device import Endpoint
+from app.device_table import DeviceTable
+from app.gns3_node import GNS3Node
+
+
+class BatchAccessorTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.table = DeviceTable.from_sequence_nums(range(1, 3 * NUM_DEVICES_PER_SWITCH + 1))
+        self.table["7"].set_endpoint(Endpoint("127.0.0.1", 2207, 2307))
+        self.devices = list(self.table.values())
+
+    def test_columns_match_device_properties(self) -> None:
+        table, devices = self.table, self.devices
+        self.assertEqual(table.hostnames(), [device.hostname for device in devices])
+        self.assertEqual(table.hosts(), [device.host for device in devices])
+        self.assertEqual(table.ssh_ports(), [device.ssh_port for device in devices])
+        self.assertEqual(table.mgmt_macs(), [device.mgmt_mac for device in devices])
+        self.assertEqual(table.mgmt_int_nets(), [device.mgmt_int_net for device in devices])
+        self.assertEqual(table.default_gw_ips(), [device.default_gw_ip for device in devices])
+        self.assertEqual(table.mgmt_int_masks(), [device.mgmt_int_mask for device in devices])
+        self.assertEqual(table.connected_switch_names(), [device.connected_switch_name for device in devices])
+        self.assertEqual(table.connected_core_router_names(), [device.connected_core_router_name for device in devices])
+
+    def test_coordinates_match_device(self) -> None:
+        name_to_node = {
+            f"Switch{num}": GNS3Node(id=str(num), type="ethernet_switch", name=f"Switch{num}", x=num * 1000, y=-num * 100, z=0, status="started")
+            for num in range(1, 4)
+        }
+        expected = [device.calculate_coordinates(name_to_node[device.connected_switch_name]) for device in self.devices]
+        self.assertEqual(self.table.coordinates(name_to_node), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
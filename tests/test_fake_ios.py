@@ -0,0 +1,48 @@
+import asyncio
+import time
+import unittest
+
+from app.constants import DEVICE_PASSWORD, DEVICE_USERNAME
+from app.device import Device
+from app.fake_ios import FakeIosDevice, FakeIosFleet, FleetMode, IosSession, fleet_endpoint
+
+
+class IosSessionTest(unittest.TestCase):
+    def test_hostname_changes_prompt(self) -> None:
+        session = IosSession(FakeIosDevice(Device.from_sequence_num(1), ssh_enabled=True, started_at=time.time()))
+        session.execute("configure terminal")
+        self.assertTrue(session.respond("hostname EDGE1").endswith("EDGE1(config)#"))
+        session.execute("end")
+        self.assertEqual(session.prompt, "EDGE1#")
+        self.assertIn("EDGE1 uptime is", session.execute("show version"))
+
+
+class FakeIosFleetTest(unittest.IsolatedAsyncioTestCase):
+    async def test_close_awaits_sessions(self) -> None:
+        loop_errors = []
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: loop_errors.append(context))
+        device = Device.from_sequence_num(1)
+        endpoint = fleet_endpoint(device.num, FleetMode.PORTS)
+        fleet = FakeIosFleet([device], mode=FleetMode.PORTS)
+        await fleet.start(ssh=False)
+        # One session waiting at the login prompt, one logged in
+        idle_reader, idle_writer = await asyncio.open_connection(endpoint.host, endpoint.telnet_port)
+        reader, writer = await asyncio.open_connection(endpoint.host, endpoint.telnet_port)
+        writer.write(f"{DEVICE_USERNAME}\r\n{DEVICE_PASSWORD}\r\n".encode())
+        await asyncio.wait_for(reader.readuntil(b"1#"), timeout=5)
+        self.assertEqual(len(fleet._handler_tasks), 2)
+
+        await asyncio.wait_for(fleet.close(), timeout=5)
+        self.assertEqual(fleet._handler_tasks, set())
+        await asyncio.sleep(0)
+        self.assertEqual(loop_errors, [])
+        # Both connections are closed by the fleet
+        await asyncio.wait_for(reader.read(), timeout=5)
+        await asyncio.wait_for(idle_reader.read(), timeout=5)
+        self.assertTrue(reader.at_eof() and idle_reader.at_eof())
+        writer.close()
+        idle_writer.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+
+from app.gns3_index import LinkIndex
+from app.gns3_link import GNS3Link, GNS3Port
+
+
+def make_link(link_id: str, router_id: str, switch_port: GNS3Port) -> GNS3Link:
+    return GNS3Link(id=link_id, ports=[GNS3Port(node_id=router_id, adapter_num=0, port_num=0), switch_port])
+
+
+class LinkIndexTest(unittest.TestCase):
+    def test_switch_ports_are_keyed_by_adapter(self) -> None:
+        index = LinkIndex(switch_ids=["switch"])
+        index.add_link(make_link("a", "R1", GNS3Port(node_id="switch", adapter_num=0, port_num=1)))
+        index.add_link(make_link("b", "R2", GNS3Port(node_id="switch", adapter_num=1, port_num=1)))
+        self.assertEqual(index.node_at_switch_port("switch", 1), "R1")
+        self.assertEqual(index.node_at_switch_port("switch", 1, adapter_num=1), "R2")
+        self.assertEqual(index.free_switch_ports("switch", 3, adapter_num=1), [0, 2])
+
+    def test_removing_stale_link_keeps_recabled_port(self) -> None:
+        index = LinkIndex(switch_ids=["switch"])
+        port = GNS3Port(node_id="switch", adapter_num=0, port_num=1)
+        old_link = make_link("old", "R1", port)
+        index.add_link(old_link)
+        new_link = make_link("new", "R2", port)
+        index.add_link(new_link)
+        index.remove_link(old_link)
+        self.assertEqual(index.node_at_switch_port("switch", 1), "R2")
+        self.assertIs(index.link_at("switch", 0, 1), new_link)
+        index.remove_link(new_link)
+        self.assertIsNone(index.node_at_switch_port("switch", 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
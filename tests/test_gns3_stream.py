@@ -0,0 +1,52 @@
+import json
+import unittest
+
+from app.gns3_stream import JsonArrayReader, iter_json_array
+
+
+class CountingDecoder(json.JSONDecoder):
+    num_calls = 0
+
+    def raw_decode(self, s, idx=0):
+        self.num_calls += 1
+        return super().raw_decode(s, idx)
+
+
+def split(data: bytes, chunk_size: int):
+    return [data[start:start + chunk_size] for start in range(0, len(data), chunk_size)]
+
+
+class JsonArrayReaderTest(unittest.TestCase):
+    def test_number_split_across_chunks(self) -> None:
+        self.assertEqual(list(iter_json_array([b"[1, 12", b"3, 4]"])), [1, 123, 4])
+
+    def test_number_at_end_of_stream(self) -> None:
+        reader = JsonArrayReader()
+        self.assertEqual(reader.feed(b"[12"), [])
+        self.assertEqual(reader.feed(b"]") + reader.close(), [12])
+
+    def test_byte_by_byte(self) -> None:
+        value = [{"name": "R1", "ports": [0, 1.5, -2e3]}, "été", None, True, 42, []]
+        data = json.dumps(value, ensure_ascii=False).encode()
+        self.assertEqual(list(iter_json_array(split(data, 1))), value)
+
+    def test_large_element_is_not_decoded_per_chunk(self) -> None:
+        value = [{"data": "x" * 1_000_000}, 1]
+        reader = JsonArrayReader()
+        reader._decoder = CountingDecoder()
+        items = []
+        for chunk in split(json.dumps(value).encode(), 1024):
+            items.extend(reader.feed(chunk))
+        items.extend(reader.close())
+        self.assertEqual(items, value)
+        self.assertLess(reader._decoder.num_calls, 40)
+
+    def test_unterminated_array(self) -> None:
+        reader = JsonArrayReader()
+        reader.feed(b"[1, 2")
+        with self.assertRaises(ValueError):
+            reader.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
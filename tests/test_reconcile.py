@@ -0,0 +1,72 @@
+import unittest
+
+from app.concurrency import AdaptiveLimiter
+from app.constants import ROUTER_CONFIG_TEMPLATE
+from app.device import Device
+from app.gns3_fake import FAKE_ROOT_API, FakeGNS3Controller
+from app.gns3_project import GNS3Project
+from app.reconcile import DeleteNode, execute_plan, plan_reconcile
+from app.render import get_template
+
+PROJECT_ID = "test-project"
+
+
+class ReconcileTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.controller = FakeGNS3Controller(PROJECT_ID)
+        self.switch = self.controller.add_node("Switch1", node_type="ethernet_switch")
+        self.project = await GNS3Project.fetch_from_id(
+            PROJECT_ID,
+            http_client=self.controller.create_http_client(),
+            root_api=FAKE_ROOT_API,
+            limiter=AdaptiveLimiter()
+        )
+
+    async def asyncTearDown(self) -> None:
+        await self.project.http_client.aclose()
+
+    def cable(self, node_id: str, switch_port_num: int, router_port_num: int = 0) -> None:
+        self.controller.add_link((node_id, 0, router_port_num), (self.switch["node_id"], 0, switch_port_num))
+
+    def node_at_switch_port(self, port_num: int) -> str:
+        for link in self.controller.id_to_link.values():
+            ports = {(port["node_id"], port["port_number"]) for port in link["nodes"]}
+            if (self.switch["node_id"], port_num) in ports:
+                (node_id, _), = ports - {(self.switch["node_id"], port_num)}
+                return self.controller.id_to_node[node_id]["name"]
+        raise AssertionError(f"Switch port {port_num} is not cabled")
+
+    async def test_prune_stale_router_on_desired_port(self) -> None:
+        stale = self.controller.add_node("stale")
+        # Cabled to the port of router 1 and, through another interface, to a second switch port
+        self.cable(stale["node_id"], 1)
+        self.cable(stale["node_id"], 5, router_port_num=1)
+        router = self.controller.add_node("1")
+        self.cable(router["node_id"], 7)
+        await self.project.refresh()
+
+        devices = [Device.from_sequence_num(1)]
+        plan = plan_reconcile(devices, self.project, get_template(ROUTER_CONFIG_TEMPLATE), prune=True)
+        self.assertEqual(sum(isinstance(action, DeleteNode) for action in plan), 1)
+        result = await execute_plan(plan, self.project)
+
+        self.assertTrue(result.ok, result)
+        self.assertNotIn(stale["node_id"], self.controller.id_to_node)
+        self.assertEqual(self.node_at_switch_port(1), "1")
+
+    async def test_adopted_router_gets_config(self) -> None:
+        stale = self.controller.add_node("stale")
+        self.cable(stale["node_id"], 2)
+        await self.project.refresh()
+
+        devices = [Device.from_sequence_num(2)]
+        plan = plan_reconcile(devices, self.project, get_template(ROUTER_CONFIG_TEMPLATE), prune=True)
+        result = await execute_plan(plan, self.project)
+
+        self.assertTrue(result.ok, result)
+        self.assertEqual(self.controller.id_to_node[stale["node_id"]]["name"], "2")
+        self.assertIn("hostname 2", self.controller.configs[stale["node_id"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+import asyncio
+import unittest
+
+from jinja2 import Template
+
+from app.device import Device
+from app.render import stream_rendered
+
+NUM_DEVICES = 2000
+
+
+class CountingTemplate(Template):
+    num_rendered = 0
+
+    def render(self, *args, **kwargs) -> str:
+        type(self).num_rendered += 1
+        return super().render(*args, **kwargs)
+
+
+class StreamRenderedTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.template = CountingTemplate("hostname {{ device.hostname }}")
+        CountingTemplate.num_rendered = 0
+        self.devices = [Device.from_sequence_num(num) for num in range(1, NUM_DEVICES + 1)]
+
+    async def test_yields_in_device_order(self) -> None:
+        rendered = [pair async for pair in stream_rendered(self.template, self.devices)]
+        self.assertEqual(rendered, [(device.hostname, f"hostname {device.hostname}") for device in self.devices])
+
+    async def test_rendering_waits_for_consumer(self) -> None:
+        stream = stream_rendered(self.template, self.devices, max_chunks_ahead=1)
+        await stream.__anext__()
+        await asyncio.sleep(0.2)
+        # The chunk being consumed, one queued and one blocked on the full queue
+        self.assertLessEqual(CountingTemplate.num_rendered, 3 * 500)
+        await stream.aclose()
+        num_rendered = CountingTemplate.num_rendered
+        await asyncio.sleep(0.2)
+        self.assertEqual(CountingTemplate.num_rendered, num_rendered)
+
+
+if __name__ == "__main__":
+    unittest.main()
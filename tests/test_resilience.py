@@ -0,0 +1,93 @@
+import asyncio
+import unittest
+
+import httpx
+
+from app.concurrency import AdaptiveLimiter
+from app.device import Vector
+from app.gns3_fake import FAKE_ROOT_API, EndpointProfile, FakeGNS3Controller
+from app.gns3_project import GNS3Project
+from app.resilience import BreakerState, CircuitBreaker, RetryPolicy, async_retry
+
+PROJECT_ID = "test-project"
+
+
+async def open_breaker(breaker: CircuitBreaker) -> None:
+    breaker.record_failure()
+    await asyncio.sleep(breaker.reset_timeout)
+
+
+class CircuitBreakerTest(unittest.IsolatedAsyncioTestCase):
+    async def test_cancelled_probe_is_released(self) -> None:
+        breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0.01)
+        await open_breaker(breaker)
+
+        @async_retry(RetryPolicy(retry_exceptions=(OSError,)), breaker=breaker)
+        async def hang() -> None:
+            await asyncio.sleep(10)
+
+        probe_task = asyncio.create_task(hang())
+        await asyncio.sleep(0)
+        waiter_task = asyncio.create_task(breaker.wait())
+        await asyncio.sleep(0)
+        self.assertFalse(waiter_task.done())
+        probe_task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await probe_task
+        self.assertTrue(await asyncio.wait_for(waiter_task, timeout=1))
+        self.assertIs(breaker.state, BreakerState.HALF_OPEN)
+
+    async def test_released_probe_goes_to_a_single_waiter(self) -> None:
+        breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0.01)
+        await open_breaker(breaker)
+        self.assertTrue(await breaker.wait())
+        waiter_tasks = [asyncio.create_task(breaker.wait()) for _ in range(3)]
+        await asyncio.sleep(0)
+        breaker.release_probe()
+        await asyncio.sleep(0.01)
+        self.assertEqual([task.done() for task in waiter_tasks].count(True), 1)
+        breaker.record_success()
+        self.assertEqual(await asyncio.gather(*waiter_tasks), [True, False, False])
+
+
+class GNS3RequestTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.controller = FakeGNS3Controller(PROJECT_ID)
+        self.project = GNS3Project(
+            id=PROJECT_ID,
+            name_to_node={},
+            alt_id_to_link={},
+            http_client=self.controller.create_http_client(),
+            root_api=FAKE_ROOT_API,
+            limiter=AdaptiveLimiter()
+        )
+
+    async def asyncTearDown(self) -> None:
+        await self.project.http_client.aclose()
+
+    async def test_cancelled_half_open_request_releases_probe(self) -> None:
+        url = f"{FAKE_ROOT_API}/computes/local"
+        breaker = self.project.breakers.get("get_compute")
+        breaker.reset_timeout = 0.01
+        breaker.failure_threshold = 1
+        await open_breaker(breaker)
+        self.controller.profiles["get_compute"] = EndpointProfile(latency=10)
+        probe_task = asyncio.create_task(self.project._request("get_compute", "GET", url))
+        await asyncio.sleep(0.01)
+        probe_task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await probe_task
+        self.controller.profiles["get_compute"] = EndpointProfile()
+        response = await asyncio.wait_for(self.project._request("get_compute", "GET", url), timeout=1)
+        self.assertEqual(response.status_code, 200)
+        self.assertIs(breaker.state, BreakerState.CLOSED)
+
+    async def test_failed_node_creation_is_not_retried(self) -> None:
+        self.controller.profiles["create_from_template"] = EndpointProfile(error_rate=1.0, error_status=500)
+        with self.assertRaises(httpx.HTTPStatusError):
+            await self.project.add_router_from_template(Vector(0, 0), "R1")
+        self.assertEqual(len(self.controller.stats["create_from_template"].durations), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
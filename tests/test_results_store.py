@@ -0,0 +1,93 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+import zlib
+
+from app.collector import CommandResult, DeviceResult
+from app.results_store import INDEX_FILE_NAME, ResultsStore, RunBatchWriter, content_digest
+
+COMMANDS = ["show version", "show arp"]
+
+
+def device_result(num: int) -> DeviceResult:
+    return DeviceResult(
+        name=str(num),
+        host=f"10.0.0.{num}",
+        results=[CommandResult(command=command, output=f"{command} of {num}") for command in COMMANDS]
+    )
+
+
+class RunBatchWriterTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = ResultsStore(self.tmp_dir.name)
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_writes_from_threads(self) -> None:
+        writer = RunBatchWriter(self.store, batch_size=7)
+        threads = [
+            threading.Thread(target=lambda start=start: [writer.write(device_result(num)) for num in range(start, start + 25)])
+            for start in range(1, 101, 25)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        writer.close()
+
+        with self.store.open_run(writer.run_id) as reader:
+            self.assertEqual(len(reader.devices), 100)
+            self.assertEqual(reader.get("42", "show arp").output, "show arp of 42")
+
+
+VERSION_0_SCHEMA = """
+CREATE TABLE runs (run_id TEXT PRIMARY KEY, segment TEXT NOT NULL, started_at REAL NOT NULL, finished_at REAL);
+CREATE TABLE outputs (
+    run_id TEXT NOT NULL, device TEXT NOT NULL, command TEXT NOT NULL, host TEXT NOT NULL, offset INTEGER NOT NULL,
+    length INTEGER NOT NULL, raw_length INTEGER NOT NULL, duration REAL NOT NULL, error TEXT,
+    PRIMARY KEY (run_id, device, command)
+) WITHOUT ROWID;
+"""
+
+
+class MigrationTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = ResultsStore(self.tmp_dir.name)
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def create_version_0_index(self) -> None:
+        raw = b"Cisco IOS Software"
+        block = zlib.compress(raw)
+        with open(os.path.join(self.tmp_dir.name, "old.seg"), "wb") as f:
+            f.write(block)
+        conn = sqlite3.connect(os.path.join(self.tmp_dir.name, INDEX_FILE_NAME))
+        conn.executescript(VERSION_0_SCHEMA)
+        with conn:
+            conn.execute("INSERT INTO runs VALUES ('old', 'old.seg', 1.0, 2.0)")
+            conn.execute("INSERT INTO outputs VALUES ('old', '1', 'show version', '10.0.0.1', 0, ?, ?, 0.5, NULL)", (len(block), len(raw)))
+        conn.close()
+
+    def test_old_index_is_migrated(self) -> None:
+        self.create_version_0_index()
+        with self.store.open_run("old") as reader:
+            self.assertEqual(reader.index[("1", "show version")].digest, content_digest(b"Cisco IOS Software"))
+            self.assertEqual(reader.get("1", "show version").output, "Cisco IOS Software")
+
+        writer = self.store.create_run("new")
+        writer.write_batch([device_result(1)])
+        writer.close()
+        with self.store.open_run("new") as reader:
+            stored = reader.index[("1", "show arp")]
+            self.assertEqual((stored.host, stored.digest), ("10.0.0.1", content_digest(b"show arp of 1")))
+            self.assertEqual(reader.get("1", "show arp").output, "show arp of 1")
+
+
+if __name__ == "__main__":
+    unittest.main()
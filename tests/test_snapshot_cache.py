@@ -0,0 +1,79 @@
+import os
+import tempfile
+import unittest
+
+from app.concurrency import AdaptiveLimiter
+from app.gns3_fake import FAKE_ROOT_API, FakeGNS3Controller
+from app.gns3_node import NodeStatus
+from app.gns3_project import GNS3Project
+from app.snapshot_cache import SnapshotCache
+
+PROJECT_ID = "test-project"
+
+
+class SnapshotRefreshTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = SnapshotCache(os.path.join(self.tmp_dir.name, "snapshots.sqlite"))
+        self.controller = FakeGNS3Controller(PROJECT_ID)
+        switch = self.controller.add_node("Switch1", node_type="ethernet_switch", status="started")
+        for num in range(1, 4):
+            router = self.controller.add_node(str(num), status="started")
+            self.controller.add_link((router["node_id"], 0, 0), (switch["node_id"], 0, num))
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    async def load(self, refresh: bool = True) -> GNS3Project:
+        return await GNS3Project.load_cached(
+            PROJECT_ID,
+            cache=self.cache,
+            refresh=refresh,
+            http_client=self.controller.create_http_client(),
+            root_api=FAKE_ROOT_API,
+            limiter=AdaptiveLimiter()
+        )
+
+    async def test_unchanged_project_is_revalidated(self) -> None:
+        async with await self.load():
+            pass
+        with self.assertLogs("app.gns3_project", "INFO") as logs:
+            async with await self.load() as project:
+                await project.wait_refreshed()
+        self.assertTrue(any("unchanged since the last refresh" in line for line in logs.output))
+        self.assertEqual(len(project.nodes), 4)
+        self.assertEqual(len(project.links), 3)
+
+    async def test_changes_are_merged(self) -> None:
+        async with await self.load():
+            pass
+        removed_id = next(node_id for node_id, node in self.controller.id_to_node.items() if node["name"] == "3")
+        self.controller._delete_node(None, removed_id)
+        self.controller.add_node("4")
+        async with await self.load() as project:
+            await project.wait_refreshed()
+            self.assertEqual(sorted(project.name_to_node), ["1", "2", "4", "Switch1"])
+            self.assertEqual(len(project.links), 2)
+            self.assertEqual(len(project.link_index.switch_ports(project.name_to_node["Switch1"].id)), 2)
+
+    async def test_merge_keeps_local_changes(self) -> None:
+        project = await self.load()
+        await project.wait_refreshed()
+        fetched = dict(project.name_to_node)
+        local_node = project.name_to_node["1"]
+        project._remove_node(local_node.id)
+        project.merge(name_to_node=fetched, keep_node_ids={local_node.id})
+        self.assertNotIn("1", project.name_to_node)
+        await project.http_client.aclose()
+
+    async def test_stop_is_saved_in_snapshot(self) -> None:
+        async with await self.load() as project:
+            await project.wait_refreshed()
+            await project.stop_all_nodes()
+        async with await self.load(refresh=False) as project:
+            statuses = {node.name: node.status for node in project.nodes}
+        self.assertEqual(statuses, {"Switch1": NodeStatus.STARTED, "1": NodeStatus.STOPPED, "2": NodeStatus.STOPPED, "3": NodeStatus.STOPPED})
+
+
+if __name__ == "__main__":
+    unittest.main()